@@ -2,50 +2,86 @@ import tkinter as tk
 import os
 from tkinter import font as tkfont
 from tkinter import ttk, messagebox, filedialog
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Optional
 import json
 from datetime import datetime, timedelta, timezone
-import requests
-import io
 import shutil
 import uuid
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
 import winsound
 
 import win32event # pyright: ignore[reportMissingModuleSource]
 import win32api # pyright: ignore[reportMissingModuleSource]
 from winerror import ERROR_ALREADY_EXISTS # pyright: ignore[reportMissingModuleSource]
 
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
-from google.cloud.firestore_v1 import ArrayUnion
-
 # --- Constants ---
 CONFIG_FILE = 'config.json'
 SECRETS_DIR = 'secrets'
 USERS_COLLECTION = 'users'
 ROLE_PARENT = 'Parent'
 ROLE_KID = 'Kid'
+LOG_PAGE_SIZE = 100  # Session log rows fetched per page in the parent dashboard
 
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-from PIL import Image, ImageTk
 import threading
-import pystray
-from PIL import Image as PILImage
 from tkinter import simpledialog
 import logging
 import random
 
+from models.session import SESSION_TIME_FORMAT, new_session_record, parse_session_time, seconds_to_duration, session_log_entry
+from services.firebase_service import (
+    UsernameTakenError, add_session, create_user_profile, delete_all_sessions, delete_session, delete_user_profile,
+    get_daily_usage, get_username_owner, list_user_profiles, new_session_id, query_sessions,
+    query_sessions_page, read_counter, session_document, start_daily_usage_block, update_session, update_user_profile,
+)
+from services.avatar_cache import AVATAR_CACHE_DIR, AVATAR_SIZES, AvatarCache
+from services.avatar_gc import AvatarSweeper, CloudinaryAvatarStore, DirectoryAvatarStore
+from services.avatar_uploads import AVATAR_UPLOAD_INDEX_FILE, AvatarUploadQueue, public_id_from_url, upload_to_cloudinary
+from services.email_outbox import EMAIL_OUTBOX_FILE, EmailDispatcher, EmailOutbox
+from services.http_client import ResponseTooLarge, fetch
+from services.local_store import LOCAL_STORE_FILE, LocalStore, LocalSync
+from services.session_journal import SESSION_JOURNAL_FILE, SessionJournal, SessionUploader
+from services.thumbnail_cache import GALLERY_THUMBNAIL_DIR, ThumbnailCache
+from utils.config import get_app_data_dir
+from utils.image_utils import load_thumbnail, open_image, resample_filter, resize
+from utils.lazy_import import LazyModule, preload
+from utils.startup_profiler import StartupProfiler
+
+# --- Deferred Imports ---
+# Firebase, Cloudinary, email, HTTP, imaging and tray libraries are imported on
+# first use, so none of them delay the first paint of the window.
+firebase_admin = LazyModule('firebase_admin')
+credentials = LazyModule('firebase_admin.credentials')
+firestore = LazyModule('firebase_admin.firestore')
+api_exceptions = LazyModule('google.api_core.exceptions')
+cloudinary = LazyModule('cloudinary')
+requests = LazyModule('requests')
+Image = LazyModule('PIL.Image')
+ImageTk = LazyModule('PIL.ImageTk')
+pystray = LazyModule('pystray')
+# Needed soon after startup; import them in the background once the first view is up.
+WARM_UP_MODULES = ('PIL.ImageTk', 'cloudinary.uploader')
+
 # --- Basic Logging Setup ---
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Local replica of users and sessions; every read is served from here so the UI never waits on the network.
+local_store = LocalStore(os.path.join(get_app_data_dir(), LOCAL_STORE_FILE))
+# Timer starts/stops are journaled to disk before anything else, so a crash or a network outage never loses a session.
+session_journal = SessionJournal(os.path.join(get_app_data_dir(), SESSION_JOURNAL_FILE))
+# Email notifications are queued on disk and sent in the background, so they survive restarts and offline periods.
+email_outbox = EmailOutbox(os.path.join(get_app_data_dir(), EMAIL_OUTBOX_FILE))
+# Avatar thumbnails on disk and PhotoImages in memory, so building a view doesn't download avatars again.
+avatar_cache = AvatarCache(os.path.join(get_app_data_dir(), AVATAR_CACHE_DIR))
+# Thumbnails of the built-in avatar gallery, so opening it doesn't decode every picture again.
+gallery_thumbnails = ThumbnailCache(os.path.join(get_app_data_dir(), GALLERY_THUMBNAIL_DIR))
+# New avatars are uploaded in the background; a picture that was uploaded before reuses its existing URL.
+avatar_uploads = AvatarUploadQueue(upload_to_cloudinary, os.path.join(get_app_data_dir(), AVATAR_UPLOAD_INDEX_FILE))
+GALLERY_THUMBNAIL_SIZE = 100
+# How often a running timer notes in the journal that it is still running.
+JOURNAL_HEARTBEAT_SECONDS = 60
+# A journaled timer is resumed on launch if it was last seen running this recently; older ones are closed.
+JOURNAL_RESUME_SECONDS = 120
+
 # Load session end messages from messages.json
 with open('messages.json', 'r', encoding='utf-8') as f:
     _messages = json.load(f)
@@ -62,12 +98,17 @@ class GameSentryApp(tk.Tk):
     This class sets up the main window.
     """
     def __init__(self):
-        super().__init__()
+        # Times each launch phase; the report is written once the first view is up
+        self.startup_profiler = StartupProfiler()
+        with self.startup_profiler.phase('tk_init'):
+            super().__init__()
 
         # --- Single Instance Check ---
-        mutex_name = "GameSentryMutex"
-        self.mutex = win32event.CreateMutex(None, 1, mutex_name)
-        if win32api.GetLastError() == ERROR_ALREADY_EXISTS:
+        with self.startup_profiler.phase('mutex'):
+            mutex_name = "GameSentryMutex"
+            self.mutex = win32event.CreateMutex(None, 1, mutex_name)
+            already_running = win32api.GetLastError() == ERROR_ALREADY_EXISTS
+        if already_running:
             messagebox.showerror("Already Running", "An instance of Game Sentry is already running.")
             self.destroy()
             return
@@ -105,7 +146,8 @@ class GameSentryApp(tk.Tk):
         # Tray setting (must be before load_config)
         self.close_to_tray_enabled = tk.BooleanVar(value=True)
         self.sound_notifications_enabled = tk.BooleanVar(value=True)
-        self._load_tray_setting()
+        with self.startup_profiler.phase('config'):
+            self._load_tray_setting()
 
         # --- View State (must be before load_config) ---
         self.current_view = ROLE_PARENT
@@ -116,7 +158,8 @@ class GameSentryApp(tk.Tk):
         self.kid_view_avatar_image = None
         self.kid_view_placeholder_image = None
 
-        self.current_theme = self.load_config()
+        with self.startup_profiler.phase('config'):
+            self.current_theme = self.load_config()
         self.theme_colors = {}
         self.button_colors = {}
         
@@ -129,20 +172,36 @@ class GameSentryApp(tk.Tk):
         # Track whether a kid has confirmed having lunch today
         self.lunch_confirmed_today = {} # {user_id: date}
  
-        # --- Initialize Firebase ---
-        self.db = initialize_firebase()
-        if not self.db:
-            messagebox.showerror("Firebase Error", "Could not initialize Firebase. The application will close.")
-            self.destroy()
-            return
+        # --- Backend State ---
+        # Firebase, the local store sync and the session uploader are started in the
+        # background (see _start_backend) so the window can paint straight away.
+        self.db = None
+        self.backend_ready = False
+        self.first_view_shown = False
+        self.local_sync: Optional[LocalSync] = None
+        # Stopped sessions and play block starts are uploaded from the journal in the background, retrying until they land.
+        # They can be queued before Firebase is up; uploading starts in _on_backend_ready.
+        self.session_uploader = SessionUploader(
+            session_journal,
+            upload=lambda user_id, session_id, session_log, block_start_ts: add_session(
+                self.db, user_id, session_log, session_id=session_id, block_start_ts=block_start_ts),
+            start_block=lambda user_id, day, block_start_ts: start_daily_usage_block(self.db, user_id, day, block_start_ts),
+            on_uploaded=local_store.mark_session_synced,
+        )
+        self.avatar_sweeper: Optional[AvatarSweeper] = None
+        self.email_dispatcher: Optional[EmailDispatcher] = None
+        self.kid_timer_running = False
+        self.kid_timer_start_time: Optional[datetime] = None
+        self.kid_timer_session_id: Optional[str] = None
+        self.kid_timer_user_id: Optional[str] = None
+        self.kid_timer_last_heartbeat: Optional[datetime] = None
+        self.kid_timer_job = None
         
         # --- Apply Theme and Styles ---
-        # This must be done after Firebase init but before creating widgets
-        # so that all components are created with the correct theme.
-        self.apply_theme(self.current_theme)
-
-        # --- Initialize to last view and user ---
-        self._initialize_to_last_view()
+        # This must be done before creating widgets so that all components
+        # are created with the correct theme.
+        with self.startup_profiler.phase('theme'):
+            self.apply_theme(self.current_theme)
 
         # --- Create necessary directories ---
         # Ensure the 'avatars' directory exists for storing user profile images.
@@ -152,33 +211,38 @@ class GameSentryApp(tk.Tk):
         # --- Load Logo Image ---
         # Store the PhotoImage as an instance attribute to prevent it from being
         # garbage-collected, which would cause the image to disappear.
-        self.logo_image = None
-        try:
-            logo_path = "" # Initialize to prevent reference before assignment in except block
-            # Construct a reliable path to the image file relative to the script
-            logo_path = os.path.join(os.path.dirname(__file__), 'pictures', 'gtt_logo.png')
-            # Load the original image and then subsample it to a smaller size.
-            # The numbers (5, 5) mean we take every 5th pixel, making it smaller.
-            original_image = tk.PhotoImage(file=logo_path)
-            self.logo_image = original_image.subsample(10)
-        except tk.TclError:
-            print(f"Warning: Could not find or open logo file at '{logo_path}'. Falling back to text logo.")
-
-        # --- Top Bar Frame ---
-        self.top_bar_frame = ttk.Frame(self, padding=(5, 10), style='Primary.TFrame')
-        self.top_bar_frame.pack(side=tk.TOP, fill=tk.X)
-
-        # --- Divider ---
-        self.divider = ttk.Separator(self, orient='horizontal', style='Accent.TSeparator')
-        self.divider.pack(fill='x')
-
-        # --- Main Content Area (Lower Section) ---
-        self.main_content_frame = ttk.Frame(self, padding="10", style='Background.TFrame')
-        self.main_content_frame.pack(fill=tk.BOTH, expand=True)
-
-        self.session_log_frame = None  # Initialize to None
-
-        self._update_ui_for_view() # Initial UI build
+        with self.startup_profiler.phase('logo'):
+            self.logo_image = None
+            try:
+                logo_path = "" # Initialize to prevent reference before assignment in except block
+                # Construct a reliable path to the image file relative to the script
+                logo_path = os.path.join(os.path.dirname(__file__), 'pictures', 'gtt_logo.png')
+                # Load the original image and then subsample it to a smaller size.
+                # The numbers (5, 5) mean we take every 5th pixel, making it smaller.
+                original_image = tk.PhotoImage(file=logo_path)
+                self.logo_image = original_image.subsample(10)
+            except tk.TclError:
+                print(f"Warning: Could not find or open logo file at '{logo_path}'. Falling back to text logo.")
+
+        with self.startup_profiler.phase('window_layout'):
+            # --- Top Bar Frame ---
+            self.top_bar_frame = ttk.Frame(self, padding=(5, 10), style='Primary.TFrame')
+            self.top_bar_frame.pack(side=tk.TOP, fill=tk.X)
+
+            # --- Divider ---
+            self.divider = ttk.Separator(self, orient='horizontal', style='Accent.TSeparator')
+            self.divider.pack(fill='x')
+
+            # --- Main Content Area (Lower Section) ---
+            self.main_content_frame = ttk.Frame(self, padding="10", style='Background.TFrame')
+            self.main_content_frame.pack(fill=tk.BOTH, expand=True)
+
+            self.session_log_frame = None  # Initialize to None
+            self.parent_kid_users: Optional[List[Dict[str, Any]]] = None  # Kid profiles shown in the parent dashboard
+
+            self._show_startup_skeleton() # Paint the window while the backend starts
+        self.after_idle(self._log_first_paint)
+        threading.Thread(target=self._start_backend, daemon=True).start()
 
         # For parent log widgets cleanup
         self._parent_log_widgets = []
@@ -194,14 +258,12 @@ class GameSentryApp(tk.Tk):
         os.makedirs(self.AVATAR_DIR, exist_ok=True)
         os.makedirs(self.ICON_DIR, exist_ok=True)
         
-        # Now load images using these paths
-        try:
-            original_image = tk.PhotoImage(file=self.LOGO_PATH)
-            self.logo_image = original_image.subsample(10)
-        except tk.TclError:
-            logger.warning(f"Could not find logo at {self.LOGO_PATH}")
-            
-        self._initialize_tray_icon()
+        with self.startup_profiler.phase('tray_icon'):
+            self._initialize_tray_icon()
+
+        # Once the local store has synced, the last known state can be shown without waiting for Firebase
+        if local_store.has_synced():
+            self._show_first_view()
 
     def _clear_widgets(self, frame):
         """Destroys all child widgets of a given frame."""
@@ -211,6 +273,10 @@ class GameSentryApp(tk.Tk):
     def _update_ui_for_view(self):
         logger.debug(f"Updating UI for view: {self.current_view}")
         """Clears and rebuilds the UI based on the current view (Parent or Kid)."""
+        # A running timer survives repaints of its kid's view; leaving that view ends the session
+        if self.kid_timer_running and (self.current_view != ROLE_KID or not self.current_kid_user
+                                       or self.current_kid_user.get('id') != self.kid_timer_user_id):
+            self._finish_kid_session(datetime.now())
         # Always clear all children of main_content_frame before rebuilding UI for any view
         for child in self.main_content_frame.winfo_children():
             child.destroy()
@@ -220,17 +286,7 @@ class GameSentryApp(tk.Tk):
 
         # --- Rebuild Top Bar ---
         # Logo and Title are common to both views
-        logo_label = ttk.Label(self.top_bar_frame, style='Primary.TLabel')
-        if self.logo_image:
-            logo_label.configure(image=self.logo_image)
-        else:
-            logo_label.configure(text="🎮⏱️", font=("", 27, "bold"))
-        logo_label.pack(side=tk.LEFT, padx=(5, 10))
-
-        app_title_label = ttk.Label(
-            self.top_bar_frame, text="Game Sentry", font=("", 27, "bold"), style='Primary.TLabel'
-        )
-        app_title_label.pack(side=tk.LEFT)
+        self._build_title()
 
         # --- View-Specific Buttons ---
         if self.current_view == ROLE_PARENT:
@@ -276,8 +332,10 @@ class GameSentryApp(tk.Tk):
             self.session_log_frame.pack(fill=tk.BOTH, expand=True)
             
             # --- Kid Filter Combobox ---
-            users = list_users(self.db) if self.db else []
+            users = list_users(self.db) if self._reads_available() else []
             kid_users = [user for user in users if user.get('role') == ROLE_KID]
+            # Reused by the log table so refreshing it doesn't list users again
+            self.parent_kid_users = kid_users
             kid_names = [user.get('username', 'Kid') for user in kid_users]
             kid_id_map = {user.get('username', 'Kid'): user.get('id') for user in kid_users}
             filter_frame = ttk.Frame(self.session_log_frame)
@@ -289,15 +347,27 @@ class GameSentryApp(tk.Tk):
             filter_combo.pack(side=tk.LEFT, padx=5)
             filter_combo.bind("<<ComboboxSelected>>", lambda e: self.show_logs_for_kid())
 
-            # --- Date Filter Calendar ---
-            # Remove the calendar and clear button, just show today's date as a label
-            date_filter_frame = ttk.Frame(self.main_content_frame)
-            date_filter_frame.pack(pady=(0, 0))
+            # --- Date Range Filter ---
+            date_filter_frame = ttk.Frame(self.session_log_frame)
+            date_filter_frame.pack(pady=(5, 0))
             today_str = datetime.now().strftime('%Y-%m-%d')
-            self.date_filter_var = tk.StringVar(value=today_str)
-            ttk.Label(date_filter_frame, text=f"Day: {today_str}").pack(side=tk.LEFT, padx=5)
-            # Always filter logs to today
-            get_selected_date = lambda: self.date_filter_var.get()
+            self.date_from_var = tk.StringVar(value=today_str)
+            self.date_to_var = tk.StringVar(value=today_str)
+            ttk.Label(date_filter_frame, text="From:").pack(side=tk.LEFT)
+            ttk.Entry(date_filter_frame, textvariable=self.date_from_var, width=11).pack(side=tk.LEFT, padx=5)
+            ttk.Label(date_filter_frame, text="To:").pack(side=tk.LEFT)
+            ttk.Entry(date_filter_frame, textvariable=self.date_to_var, width=11).pack(side=tk.LEFT, padx=5)
+            range_presets = {"Today": 0, "Last 7 days": 6, "Last 30 days": 29, "Last year": 364, "All time": None}
+            preset_var = tk.StringVar(value="Today")
+            def apply_preset(event=None):
+                days_back = range_presets[preset_var.get()]
+                self.date_to_var.set("" if days_back is None else today_str)
+                self.date_from_var.set("" if days_back is None else (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d'))
+                self.show_logs_for_kid()
+            preset_combo = ttk.Combobox(date_filter_frame, textvariable=preset_var, values=list(range_presets), state="readonly", width=12)
+            preset_combo.pack(side=tk.LEFT, padx=5)
+            preset_combo.bind("<<ComboboxSelected>>", apply_preset)
+            ttk.Button(date_filter_frame, text="Apply", command=self.show_logs_for_kid).pack(side=tk.LEFT, padx=5)
 
             # --- All Kids' Session Logs Table (with filter) ---
             self.show_logs_for_kid()
@@ -336,16 +406,13 @@ class GameSentryApp(tk.Tk):
             avatar_url = self.current_kid_user.get('avatar_url')
 
             if avatar_url:
-                try:
-                    img = load_image_from_url(avatar_url, (150, 150))
-                    if img:
-                        self.kid_view_avatar_image = ImageTk.PhotoImage(img)
-                        avatar_label.config(image=self.kid_view_avatar_image, text="", compound='none')
-                    else:
-                        self._set_avatar_placeholder(avatar_label, "Avatar\nError")
-                except Exception as e:
-                    print(f"Error loading kid view avatar from URL: {e}")
-                    self._set_avatar_placeholder(avatar_label, "Avatar\nError")
+                # Shown at once if it's in memory, otherwise a placeholder until it has loaded in the background
+                self.kid_view_avatar_image = avatar_cache.cached_photo(avatar_url, 150)
+                if self.kid_view_avatar_image:
+                    avatar_label.config(image=self.kid_view_avatar_image, text="", compound='none')
+                else:
+                    self._set_avatar_placeholder(avatar_label, "Loading…")
+                    self._load_kid_view_avatar(avatar_label, avatar_url)
             else:
                 self._set_avatar_placeholder(avatar_label, "No\nAvatar")
 
@@ -369,15 +436,16 @@ class GameSentryApp(tk.Tk):
             # --- Timer and Start/Stop Button ---
             self.kid_timer_label = ttk.Label(left_pane, text="00:00:00", font=("Helvetica", 16, "bold"), background="#23272b", foreground="#fff")
             self.kid_timer_label.pack(pady=(0, 10))
-            self.kid_timer_running = False
-            self.kid_timer_start_time = None
+            if self.kid_timer_job:
+                self.after_cancel(self.kid_timer_job)
+                self.kid_timer_job = None
             self.kid_timer_elapsed = 0
-            self.kid_timer_job = None
             self.kid_session_tree = None  # Reference to the session log Treeview
 
-            # Load session logs from Firestore
-            if self.db is not None:
-                self.kid_session_log = get_session_logs_for_user(self.db, self.current_kid_user.get('id'))
+            # Load today's session logs from the local store
+            if self._reads_available():
+                today_str = datetime.now().strftime('%Y-%m-%d')
+                self.kid_session_log = get_session_logs_for_user(self.db, self.current_kid_user.get('id'), today_str, today_str)
             else:
                 self.kid_session_log = []
 
@@ -419,36 +487,27 @@ class GameSentryApp(tk.Tk):
                     logger.debug("Started notification thread for session start.")
                     
                     self.kid_timer_running = True
-                    self.kid_timer_start_time = datetime.now()
+                    self.kid_timer_start_time = datetime.now().replace(microsecond=0)
+                    self.kid_timer_session_id = new_session_id()
+                    self.kid_timer_user_id = self.current_kid_user.get('id')
+                    self.kid_timer_last_heartbeat = self.kid_timer_start_time
+                    session_journal.record_start(self.kid_timer_session_id, self.kid_timer_user_id,
+                                                 self.kid_timer_start_time.strftime(SESSION_TIME_FORMAT))
                     self.kid_timer_button.text = "Stop"
                     self.kid_timer_button.colors = self.timer_button_colors_stop
                     self.kid_timer_button._draw(self.kid_timer_button.colors["bg"], self.kid_timer_button.colors["text"])
                     self._update_kid_timer()
                 else:
-                    self.kid_timer_running = False
-                    if self.kid_timer_job:
-                        self.after_cancel(self.kid_timer_job)
-                        self.kid_timer_job = None
-                    end_time = datetime.now()
-                    start_time = self.kid_timer_start_time
-                    session_entry = None
-                    if start_time is not None:
-                        duration = (end_time - start_time).total_seconds()
-                        session_entry = {
-                            'start': start_time.strftime('%Y-%m-%d %H:%M:%S'),
-                            'stop': end_time.strftime('%Y-%m-%d %H:%M:%S'),
-                            'duration': str(self._format_duration(duration))
-                        }
-                        # Add to Firestore
+                    # Journaled and stored locally right away; the upload happens in the background
+                    session_entry = self._finish_kid_session(datetime.now())
+                    if session_entry is not None:
                         if self.current_kid_user is not None:
-                            add_session_log_to_user(self.db, self.current_kid_user.get('id'), session_entry)
-                            
                             # --- SEND STOP NOTIFICATIONS (in a separate thread) ---
                             username = self.current_kid_user.get('username', 'Kid')
                             sounds_enabled = self.sound_notifications_enabled.get()
                             threading.Thread(
                                 target=self._send_stop_session_notifications_threaded,
-                                args=(username, str(self._format_duration(duration)), sounds_enabled),
+                                args=(username, session_entry['duration'], sounds_enabled),
                                 daemon=True
                             ).start()
                             logger.debug("Started notification thread for session stop.")
@@ -475,7 +534,6 @@ class GameSentryApp(tk.Tk):
                     self.kid_timer_button.text = "Start"
                     self.kid_timer_button.colors = self.timer_button_colors_start
                     self.kid_timer_button._draw(self.kid_timer_button.colors["bg"], self.kid_timer_button.colors["text"])
-                    self.kid_timer_start_time = None
 
             # Use a round button for Start/Stop
             self.timer_button_colors_start = {
@@ -497,20 +555,25 @@ class GameSentryApp(tk.Tk):
 
             def _update_kid_timer():
                 if self.kid_timer_running and self.kid_timer_start_time is not None:
-                    elapsed = (datetime.now() - self.kid_timer_start_time).total_seconds()
+                    now = datetime.now()
+                    elapsed = (now - self.kid_timer_start_time).total_seconds()
                     self.kid_timer_label.config(text=self._format_duration(elapsed))
+                    if (now - self.kid_timer_last_heartbeat).total_seconds() >= JOURNAL_HEARTBEAT_SECONDS:
+                        session_journal.record_heartbeat(self.kid_timer_session_id, now.strftime(SESSION_TIME_FORMAT))
+                        self.kid_timer_last_heartbeat = now
                     # Update daily time remaining display
                     self._update_daily_time_display()
                     self.kid_timer_job = self.after(1000, _update_kid_timer)
             self._update_kid_timer = _update_kid_timer
 
-            def _format_duration(seconds):
-                seconds = int(seconds)
-                h = seconds // 3600
-                m = (seconds % 3600) // 60
-                s = seconds % 60
-                return f"{h:02}:{m:02}:{s:02}"
-            self._format_duration = _format_duration
+            self._format_duration = seconds_to_duration
+
+            # Pick up a timer that was already running (a repaint, or one recovered from the session journal)
+            if self.kid_timer_running:
+                self.kid_timer_button.text = "Stop"
+                self.kid_timer_button.colors = self.timer_button_colors_stop
+                self.kid_timer_button._draw(self.kid_timer_button.colors["bg"], self.kid_timer_button.colors["text"])
+                self._update_kid_timer()
 
             def _refresh_kid_session_log(parent):
                 if self.kid_session_tree is not None:
@@ -521,13 +584,8 @@ class GameSentryApp(tk.Tk):
                 tree.heading("stop", text="Stop Time")
                 tree.heading("duration", text="Duration")
                 # Sort sessions by start time descending
-                def parse_start(entry):
-                    try:
-                        return datetime.strptime(entry["start"], '%Y-%m-%d %H:%M:%S')
-                    except Exception:
-                        return datetime.min
-                for entry in sorted(self.kid_session_log, key=parse_start, reverse=True):
-                    tree.insert("", "end", values=(entry["start"], entry["stop"], entry["duration"]))
+                for entry in sorted(self.kid_session_log, key=lambda entry: entry['start_ts'], reverse=True):
+                    tree.insert("", "end", iid=entry.get("id"), values=(entry["start"], entry["stop"], entry["duration"]))
                 tree.pack(anchor=tk.NW, fill=tk.X, pady=(10, 0))
                 self.kid_session_tree = tree
             self._refresh_kid_session_log = _refresh_kid_session_log
@@ -548,8 +606,7 @@ class GameSentryApp(tk.Tk):
                 if selected_kid_name == "All" or not selected_kid_name:
                     messagebox.showwarning("Select Kid", "Please select a specific kid to add an entry.")
                     return
-                users = list_users(self.db) if self.db else []
-                user = next((u for u in users if u.get('role') == ROLE_KID and u.get('username', 'Kid') == selected_kid_name), None)
+                user = next((u for u in self._get_parent_kid_users() if u.get('username', 'Kid') == selected_kid_name), None)
                 if not user:
                     messagebox.showerror("User Not Found", f"Could not find user '{selected_kid_name}'.")
                     return
@@ -564,17 +621,15 @@ class GameSentryApp(tk.Tk):
                 if selected_kid_name == "All" or not selected_kid_name:
                     messagebox.showwarning("Select Kid", "Please select a specific kid to delete all entries.")
                     return
-                users = list_users(self.db) if self.db else []
-                user = next((u for u in users if u.get('role') == ROLE_KID and u.get('username', 'Kid') == selected_kid_name), None)
+                user = next((u for u in self._get_parent_kid_users() if u.get('username', 'Kid') == selected_kid_name), None)
                 if not user:
                     messagebox.showerror("User Not Found", f"Could not find user '{selected_kid_name}'.")
                     return
                 user_id = user.get('id')
                 if not messagebox.askyesno("Confirm Delete All", f"Are you sure you want to delete ALL session entries for '{selected_kid_name}'?"):
                     return
-                user_doc = self.db.collection(USERS_COLLECTION).document(user_id)
-                user_doc.update({'sessions': []})
-                self.show_logs_for_kid()
+                run_in_background(self, lambda: self._delete_all_sessions(user_id),
+                                  lambda deleted: self.show_logs_for_kid())
 
             ttk.Button(btn_frame, text="Add Entry", command=add_entry).pack(side=tk.LEFT, padx=5)
             ttk.Button(btn_frame, text="Delete All Entries", command=delete_all_entries).pack(side=tk.LEFT, padx=5)
@@ -654,6 +709,31 @@ class GameSentryApp(tk.Tk):
                 # Teeth brushed, can play
                 return False
                 
+    def _load_kid_view_avatar(self, avatar_label: ttk.Label, avatar_url: str):
+        """Downloads the kid view avatar on the avatar cache's thread pool and swaps it in on the Tk thread."""
+        future = avatar_cache.load_image_async(avatar_url, 150)
+
+        def on_loaded(future):
+            try:
+                self.after(0, lambda: self._show_kid_view_avatar(avatar_label, avatar_url, future))
+            except (RuntimeError, tk.TclError):
+                pass  # The app is shutting down
+        future.add_done_callback(on_loaded)
+
+    def _show_kid_view_avatar(self, avatar_label: ttk.Label, avatar_url: str, future):
+        if not avatar_label.winfo_exists():
+            return  # The view was rebuilt meanwhile
+        try:
+            img = future.result()
+        except Exception as e:
+            print(f"Error loading kid view avatar from URL: {e}")
+            img = None
+        if img is None:
+            self._set_avatar_placeholder(avatar_label, "Avatar\nError")
+            return
+        self.kid_view_avatar_image = avatar_cache.photo_from_image(avatar_url, 150, img)
+        avatar_label.config(image=self.kid_view_avatar_image, text="", compound='none')
+
     def _set_avatar_placeholder(self, label, text):
         """Sets a placeholder image and text on an avatar label."""
         # Create a blank image to enforce size on the ttk.Label, if not already created.
@@ -743,6 +823,20 @@ class GameSentryApp(tk.Tk):
         
         with open(CONFIG_FILE, 'w') as f:
             json.dump(config, f, indent=4)
+        # Emails held back by a rejected login go out with the new settings
+        if self.email_dispatcher is not None:
+            self.email_dispatcher.wake()
+
+    def _on_email_login_rejected(self, error: Exception):
+        """Tells the parent that emails are on hold until the login is fixed; runs on the dispatcher thread."""
+        def show():
+            messagebox.showerror("Email Login Failed",
+                                 "The email server rejected the login, so notifications are on hold.\n\n"
+                                 f"Update the email address or app password in Settings.\n\n{error}")
+        try:
+            self.after(0, show)
+        except (RuntimeError, tk.TclError):
+            pass  # The app is shutting down
 
     def get_email_config(self) -> Dict[str, Any]:
         """Gets email configuration from config.json."""
@@ -764,47 +858,22 @@ class GameSentryApp(tk.Tk):
             }
 
     def send_email_notification(self, subject: str, message: str, html_message: Optional[str] = None):
-        """Sends email notification using Gmail SMTP."""
+        """Queues an email notification in the outbox; it is sent in the background by the email dispatcher."""
         email_config = self.get_email_config()
         
         if not email_config['email_enabled'] or not email_config['email_address'] or not email_config['email_password']:
             return False
+        if not email_config['email_recipients']:
+            return False
         
         try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['From'] = email_config['email_address']
-            msg['Subject'] = f"Game Sentry - {subject}"
-            
-            # Add recipients
-            recipients = email_config['email_recipients']
-            if not recipients:
-                return False
-            msg['To'] = ', '.join(recipients)
-            
-            # Add text and HTML parts
-            text_part = MIMEText(message, 'plain')
-            msg.attach(text_part)
-            
-            if html_message:
-                html_part = MIMEText(html_message, 'html')
-                msg.attach(html_part)
-            
-            # Send email via Gmail SMTP
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(email_config['email_address'], email_config['email_password'])
-            
-            text = msg.as_string()
-            server.sendmail(email_config['email_address'], recipients, text)
-            server.quit()
-            
-            print(f"Email notification sent: {subject}")
-            return True
-            
-        except Exception as e:
-            print(f"Error sending email notification: {e}")
+            email_outbox.add(subject, message, html_message)
+        except OSError as e:
+            print(f"Error queuing email notification: {e}")
             return False
+        if self.email_dispatcher is not None:
+            self.email_dispatcher.wake()
+        return True
 
     def send_daily_limit_email(self, username: str, daily_limit: int, current_usage: int):
         """Sends a formatted email notification for daily limit reached."""
@@ -1025,7 +1094,7 @@ This is an automated notification from Game Sentry.
 
     def switch_to_kid_view(self):
         """Switches to kid view, automatically loading the last selected kid if available."""
-        if self.last_selected_kid_id and self.db:
+        if self.last_selected_kid_id and self._reads_available():
             # Try to load the last selected kid
             last_kid = get_user(self.db, self.last_selected_kid_id)
             if last_kid:
@@ -1079,24 +1148,27 @@ This is an automated notification from Game Sentry.
 
     def _initialize_tray_icon(self):
         """Initializes and runs the system tray icon in a separate thread."""
+        self.tray_thread = threading.Thread(target=self._run_tray_icon, daemon=True)
+        self.tray_thread.start()
+
+    def _run_tray_icon(self):
+        """Tray thread: builds the icon (importing PIL and pystray off the Tk thread) and runs it."""
         def on_activate(icon):
             self.after(0, self._restore_window)
 
-        try:
-            icon_path = os.path.join(os.path.dirname(__file__), 'pictures', 'gtt_logo.png')
-            image = PILImage.open(icon_path)
-            image = image.resize((64, 64))
-        except Exception:
-            image = PILImage.new('RGB', (64, 64), color='gray')
+        with self.startup_profiler.phase('tray_icon_build'):
+            try:
+                icon_path = os.path.join(os.path.dirname(__file__), 'pictures', 'gtt_logo.png')
+                image = resize(open_image(icon_path, 64), (64, 64))
+            except Exception:
+                image = Image.new('RGB', (64, 64), color='gray')
 
-        menu = pystray.Menu(
-            pystray.MenuItem('Show', on_activate, default=True),
-            pystray.MenuItem('Quit', self._quit_from_tray)
-        )
-        self.tray_icon = pystray.Icon("Game Sentry", image, "Game Sentry", menu)
-        
-        self.tray_thread = threading.Thread(target=self.tray_icon.run, daemon=True)
-        self.tray_thread.start()
+            menu = pystray.Menu(
+                pystray.MenuItem('Show', on_activate, default=True),
+                pystray.MenuItem('Quit', self._quit_from_tray)
+            )
+            self.tray_icon = pystray.Icon("Game Sentry", image, "Game Sentry", menu)
+        self.tray_icon.run()
 
     def _on_minimize(self, event):
         # Minimize to tray when window is minimized
@@ -1119,6 +1191,19 @@ This is an automated notification from Game Sentry.
         self.destroy()
 
     def destroy(self):
+        # Record a session that is still running, then stop uploading; the journal keeps anything not yet uploaded
+        if getattr(self, 'kid_timer_running', False):
+            self._finish_kid_session(datetime.now())
+        if getattr(self, 'session_uploader', None) is not None:
+            self.session_uploader.stop()
+        avatar_uploads.stop()
+        if getattr(self, 'email_dispatcher', None) is not None:
+            self.email_dispatcher.stop()
+        if getattr(self, 'avatar_sweeper', None) is not None:
+            self.avatar_sweeper.stop()
+        # Stop syncing the local store with Firestore
+        if getattr(self, 'local_sync', None) is not None:
+            self.local_sync.stop()
         # Release the mutex when the application closes
         if hasattr(self, 'mutex'):
             win32api.CloseHandle(self.mutex)
@@ -1128,11 +1213,208 @@ This is an automated notification from Game Sentry.
         """Opens the KidSelectionDialog to switch to another kid profile in Kid view."""
         KidSelectionDialog(self, self.db, self._on_kid_selected)
 
-    def _initialize_to_last_view(self):
+    def _forget_deleted_avatars(self, public_ids: List[str]):
+        """Drops swept avatars from the upload index and the avatar cache; runs on the sweeper thread."""
+        avatar_uploads.forget(*public_ids)
+        deleted = set(public_ids)
+        for url in avatar_cache.cached_urls():
+            if public_id_from_url(url) in deleted:
+                # Safe off the Tk thread: the PhotoImages themselves are dropped on the Tk thread's next lookup
+                avatar_cache.invalidate(url)
+
+    # Deletes run on a worker thread. Uploads still waiting in the journal are dropped first,
+    # or they would bring the deleted sessions back (or write them under a deleted user).
+
+    def _delete_session(self, user_id: str, session_id: str) -> bool:
+        self.session_uploader.discard(user_id, session_id)
+        return delete_session_log_for_user(self.db, user_id, session_id)
+
+    def _delete_all_sessions(self, user_id: str) -> bool:
+        self.session_uploader.discard(user_id)
+        return delete_all_session_logs_for_user(self.db, user_id)
+
+    def _delete_user(self, user_id: str) -> bool:
+        self.session_uploader.discard(user_id)
+        return delete_user(self.db, user_id)
+
+    def _queue_session_upload(self, user_id: str, session_id: str, session_log: Dict[str, Any]):
+        """Journals a finished session, stores it locally as pending and queues its upload."""
+        # The play block is the one the session was played in, not whichever is current when the upload lands
+        block_start_ts = local_store.get_daily_usage(user_id, datetime.now().strftime('%Y-%m-%d')).get('block_started_ts')
+        event = session_journal.record_stop(session_id, user_id, session_log, block_start_ts)
+        local_store.upsert_session(user_id, session_id, session_document(session_log), pending=True)
+        self.session_uploader.enqueue(event)
+
+    def _finish_kid_session(self, end_time: datetime) -> Optional[Dict[str, Any]]:
+        """Stops the kid timer and records its session; returns the session log entry, or None if nothing was running."""
+        if self.kid_timer_job:
+            self.after_cancel(self.kid_timer_job)
+            self.kid_timer_job = None
+        start_time, session_id, user_id = self.kid_timer_start_time, self.kid_timer_session_id, self.kid_timer_user_id
+        self.kid_timer_running = False
+        self.kid_timer_start_time = None
+        self.kid_timer_session_id = None
+        self.kid_timer_user_id = None
+        if start_time is None or not session_id or not user_id:
+            return None
+        return self._record_finished_session(user_id, session_id, start_time, end_time)
+
+    def _record_finished_session(self, user_id: str, session_id: str, start_time: datetime, end_time: datetime) -> Dict[str, Any]:
+        """Builds the session log entry for a finished timer and queues it for upload."""
+        end_time = max(end_time.replace(microsecond=0), start_time)
+        session_entry = session_log_entry(new_session_record(start_time, end_time))
+        self._queue_session_upload(user_id, session_id, session_entry)
+        return dict(session_entry, id=session_id)
+
+    def _recover_journaled_sessions(self):
+        """Resumes or closes timers left running by the last run."""
+        for event in session_journal.running_sessions():
+            try:
+                start_time = parse_session_time(event['start'])
+                last_seen = parse_session_time(event['last_seen'])
+            except (KeyError, ValueError) as e:
+                logger.error(f"Discarding unreadable journaled session {event.get('session_id')}: {e}")
+                session_journal.mark_uploaded(event.get('session_id'))
+                continue
+            kid = get_user(self.db, event['user_id'])
+            if kid is None:
+                # The kid was deleted; there is nobody to record the session for
+                session_journal.mark_uploaded(event['session_id'])
+                continue
+            if not self.kid_timer_running and (datetime.now() - last_seen).total_seconds() <= JOURNAL_RESUME_SECONDS:
+                # The app was only down briefly: carry on timing in the kid's view
+                logger.info(f"Resuming journaled session {event['session_id']} for {kid.get('username')}")
+                self.kid_timer_running = True
+                self.kid_timer_start_time = start_time
+                self.kid_timer_session_id = event['session_id']
+                self.kid_timer_user_id = event['user_id']
+                self.kid_timer_last_heartbeat = last_seen
+                self.current_view = ROLE_KID
+                self.current_kid_user = kid
+                self.last_selected_kid_id = kid.get('id')
+            else:
+                # Close the session at the last moment it was known to be running
+                logger.info(f"Closing journaled session {event['session_id']} for {kid.get('username')} at {event['last_seen']}")
+                self._record_finished_session(event['user_id'], event['session_id'], start_time, last_seen)
+
+    def _reads_available(self) -> bool:
+        """Whether views can be built: reads are served from the local store once it has synced, even before Firebase is up."""
+        return self.db is not None or local_store.has_synced()
+
+    def _build_title(self):
+        """Packs the logo and app title into the top bar."""
+        logo_label = ttk.Label(self.top_bar_frame, style='Primary.TLabel')
+        if self.logo_image:
+            logo_label.configure(image=self.logo_image)
+        else:
+            logo_label.configure(text="🎮⏱️", font=("", 27, "bold"))
+        logo_label.pack(side=tk.LEFT, padx=(5, 10))
+
+        app_title_label = ttk.Label(
+            self.top_bar_frame, text="Game Sentry", font=("", 27, "bold"), style='Primary.TLabel'
+        )
+        app_title_label.pack(side=tk.LEFT)
+
+    def _show_startup_skeleton(self):
+        """Draws the top bar and a loading placeholder until the backend is ready."""
+        self._build_title()
+        ttk.Label(self.main_content_frame, text="Loading…", font=("", 14)).pack(expand=True)
+
+    def _log_first_paint(self):
+        """Runs once the first frame has been drawn and logs how long the launch took to get there."""
+        elapsed_ms = self.startup_profiler.mark('first_paint')
+        logger.info(f"Startup: first paint after {elapsed_ms:.0f} ms")
+
+    def _start_backend(self):
+        """
+        Background thread: initializes Firebase and Cloudinary and warms up the data
+        the first view needs, then hands over to the Tk thread.
+        """
+        with self.startup_profiler.phase('firebase_init'):
+            db = initialize_firebase()
+        last_kid = None
+        if db is not None:
+            try:
+                with self.startup_profiler.phase('prefetch'):
+                    if not local_store.has_synced():
+                        # First launch: mirror the user list now rather than on the Tk thread
+                        local_store.replace_users(list_user_profiles(db))
+                    if self.last_view == ROLE_KID and self.last_selected_kid_id:
+                        last_kid = get_user(db, self.last_selected_kid_id)
+            except Exception as e:
+                # The first view fetches whatever is missing again
+                logger.warning(f"Could not prefetch startup data: {e}")
+        try:
+            self.after(0, lambda: self._on_backend_ready(db, last_kid))
+        except (RuntimeError, tk.TclError):
+            # The window was closed before the backend came up
+            pass
+
+    def _show_first_view(self, last_kid: Optional[Dict[str, Any]] = None):
+        """Replaces the skeleton with the last view; its reads come from the local store."""
+        with self.startup_profiler.phase('last_view'):
+            self._initialize_to_last_view(last_kid)
+        with self.startup_profiler.phase('journal_recovery'):
+            self._recover_journaled_sessions()
+        with self.startup_profiler.phase('view_build'):
+            self._update_ui_for_view()
+        self.first_view_shown = True
+        elapsed_ms = self.startup_profiler.mark('first_view')
+        logger.info(f"Startup: first view ready after {elapsed_ms:.0f} ms")
+
+    def _on_backend_ready(self, db: Any, last_kid: Optional[Dict[str, Any]]):
+        """Starts the background services, and shows the first view if the local store couldn't yet."""
+        if db is None:
+            self.startup_profiler.mark('backend_failed')
+            self.startup_profiler.finish()
+            if self.first_view_shown:
+                # The local replica keeps the app usable; sessions stay in the journal until a later launch uploads them
+                messagebox.showwarning("Firebase Error", "Could not initialize Firebase. Showing the last synced data; "
+                                                         "timer sessions are kept and uploaded on a later launch.")
+                return
+            messagebox.showerror("Firebase Error", "Could not initialize Firebase. The application will close.")
+            self.destroy()
+            return
+        self.db = db
+
+        with self.startup_profiler.phase('backend_services'):
+            # --- Local Store Sync ---
+            # Reads come from the local store; keep it reconciled with Firestore in the background.
+            # On the very first launch, repaint once the initial sync has filled the store.
+            self.local_sync = LocalSync(local_store, self.db)
+            self.local_sync.start(on_first_sync=lambda: self.after(0, self._update_ui_for_view))
+
+            # --- Session Uploads ---
+            self.session_uploader.start()
+
+            # --- Email Notifications ---
+            # The outbox is sent from one background thread over a reused SMTP connection, retrying until it's delivered.
+            self.email_dispatcher = EmailDispatcher(email_outbox, get_settings=self.get_email_config,
+                                                    on_auth_error=self._on_email_login_rejected)
+            self.email_dispatcher.start()
+
+            # --- Avatar Cleanup ---
+            # Avatars no user references any more are deleted in batches by a daily background sweep.
+            self.avatar_sweeper = AvatarSweeper(
+                local_store, [CloudinaryAvatarStore(), DirectoryAvatarStore(self.avatars_dir)],
+                list_users=lambda: list_user_profiles(self.db),
+                on_deleted=self._forget_deleted_avatars,
+                recently_used=avatar_uploads.recently_used,
+            )
+            self.avatar_sweeper.start()
+
+        self.backend_ready = True
+        if not self.first_view_shown:
+            self._show_first_view(last_kid)
+        self.startup_profiler.finish()
+        preload(WARM_UP_MODULES)
+
+    def _initialize_to_last_view(self, last_kid: Optional[Dict[str, Any]] = None):
         """Initialize the app to the last view (parent or kid) if available."""
-        if self.last_view == ROLE_KID and self.last_selected_kid_id and self.db:
-            # Try to load the last selected kid
-            last_kid = get_user(self.db, self.last_selected_kid_id)
+        if self.last_view == ROLE_KID and self.last_selected_kid_id and self._reads_available():
+            # Try to load the last selected kid, unless startup already fetched it
+            if last_kid is None or last_kid.get('id') != self.last_selected_kid_id:
+                last_kid = get_user(self.db, self.last_selected_kid_id)
             if last_kid:
                 self.current_view = ROLE_KID
                 self.current_kid_user = last_kid
@@ -1144,11 +1426,11 @@ This is an automated notification from Game Sentry.
 
     def _calculate_daily_remaining(self, user_id: str) -> int:
         """Calculate remaining daily time in seconds for a user."""
-        if not self.db:
+        if not self._reads_available():
             return 0
         
         try:
-            user_data = get_user(self.db, user_id)
+            user_data = get_user_profile(self.db, user_id)
             if not user_data:
                 return 0
             
@@ -1206,91 +1488,38 @@ This is an automated notification from Game Sentry.
         except Exception as e:
             print(f"Error updating daily time display: {e}")
 
+    def _get_running_session_seconds(self, user_id: str) -> int:
+        """Returns the elapsed seconds of the running timer if it belongs to the given user."""
+        if hasattr(self, 'kid_timer_running') and self.kid_timer_running and self.kid_timer_start_time:
+            current_user_id = self.current_kid_user.get('id') if self.current_kid_user else None
+            if current_user_id == user_id:
+                return int((datetime.now() - self.kid_timer_start_time).total_seconds())
+        return 0
+
     def _calculate_daily_usage(self, user_id: str) -> int:
         """Calculate total daily usage in seconds for a user."""
-        if not self.db:
+        if not self._reads_available():
             return 0
         
         try:
-            sessions = get_session_logs_for_user(self.db, user_id)
-            today = datetime.now().date()
-            total_seconds = 0
-            
-            for session in sessions:
-                try:
-                    # Parse session start time
-                    start_time = datetime.strptime(session.get('start', ''), '%Y-%m-%d %H:%M:%S')
-                    if start_time.date() == today:
-                        # Parse duration (format: HH:MM:SS)
-                        duration_str = session.get('duration', '00:00:00')
-                        time_parts = duration_str.split(':')
-                        if len(time_parts) == 3:
-                            hours = int(time_parts[0])
-                            minutes = int(time_parts[1])
-                            seconds = int(time_parts[2])
-                            session_seconds = hours * 3600 + minutes * 60 + seconds
-                            total_seconds += session_seconds
-                except (ValueError, IndexError):
-                    continue
-            
-            # Add current session time if timer is running
-            if hasattr(self, 'kid_timer_running') and self.kid_timer_running and self.kid_timer_start_time:
-                current_user_id = self.current_kid_user.get('id') if self.current_kid_user else None
-                if current_user_id == user_id:
-                    elapsed_seconds = int((datetime.now() - self.kid_timer_start_time).total_seconds())
-                    total_seconds += elapsed_seconds
-            
-            return total_seconds
+            daily_usage = get_daily_usage_for_user(self.db, user_id)
+            return daily_usage['total_seconds'] + self._get_running_session_seconds(user_id)
         except Exception as e:
             print(f"Error calculating daily usage for user {user_id}: {e}")
             return 0
 
     def _calculate_block_usage(self, user_id: str) -> int:
         """Calculate current block usage in seconds for a user (resets after break period)."""
-        if not self.db:
+        if not self._reads_available():
             return 0
         
         try:
-            user_data = get_user(self.db, user_id)
-            if not user_data:
-                return 0
-            
             # Check if user is in break period
             if self._is_user_in_rest(user_id):
                 return 0  # Block resets after break period
             
-            sessions = get_session_logs_for_user(self.db, user_id)
-            today = datetime.now().date()
-            total_seconds = 0
-            
-            # Find the start of current block (after last rest period)
-            last_rest_end = self._get_last_rest_end_time(user_id)
-            
-            for session in sessions:
-                try:
-                    # Parse session start time
-                    start_time = datetime.strptime(session.get('start', ''), '%Y-%m-%d %H:%M:%S')
-                    if start_time.date() == today and start_time >= last_rest_end:
-                        # Parse duration (format: HH:MM:SS)
-                        duration_str = session.get('duration', '00:00:00')
-                        time_parts = duration_str.split(':')
-                        if len(time_parts) == 3:
-                            hours = int(time_parts[0])
-                            minutes = int(time_parts[1])
-                            seconds = int(time_parts[2])
-                            session_seconds = hours * 3600 + minutes * 60 + seconds
-                            total_seconds += session_seconds
-                except (ValueError, IndexError):
-                    continue
-            
-            # Add current session time if timer is running
-            if hasattr(self, 'kid_timer_running') and self.kid_timer_running and self.kid_timer_start_time:
-                current_user_id = self.current_kid_user.get('id') if self.current_kid_user else None
-                if current_user_id == user_id:
-                    elapsed_seconds = int((datetime.now() - self.kid_timer_start_time).total_seconds())
-                    total_seconds += elapsed_seconds
-            
-            return total_seconds
+            daily_usage = get_daily_usage_for_user(self.db, user_id)
+            return daily_usage['block_seconds'] + self._get_running_session_seconds(user_id)
         except Exception as e:
             print(f"Error calculating block usage for user {user_id}: {e}")
             return 0
@@ -1336,15 +1565,21 @@ This is an automated notification from Game Sentry.
             'start_time': datetime.now(),
             'duration_minutes': duration_minutes
         }
+        # The next play block only counts sessions started after the break. The local store is updated
+        # right away; the rollup in Firestore is written by the uploader, after any session stopped before it.
+        block_start = self._get_last_rest_end_time(user_id)
+        day, block_start_ts = block_start.strftime('%Y-%m-%d'), int(block_start.timestamp())
+        local_store.set_block_start(user_id, day, block_start_ts)
+        self.session_uploader.enqueue(session_journal.record_block_start(user_id, day, block_start_ts))
         print(f"Started {duration_minutes}-minute break period for user {user_id}")
 
     def _check_block_limit(self, user_id: str, username: str):
         """Check if user has reached play time limit and start break period if needed."""
-        if not self.db:
+        if not self._reads_available():
             return
         
         try:
-            user_data = get_user(self.db, user_id)
+            user_data = get_user_profile(self.db, user_id)
             if not user_data:
                 return
             
@@ -1395,7 +1630,6 @@ This is an automated notification from Game Sentry.
         
         rest_remaining = self._get_rest_remaining_seconds(user_id)
         if rest_remaining <= 0:
-            # Break period ended
             if user_id in self.kid_rest_periods:
                 del self.kid_rest_periods[user_id]
             
@@ -1411,11 +1645,11 @@ This is an automated notification from Game Sentry.
 
     def _check_daily_limit(self, user_id: str, username: str):
         """Check if user has reached daily limit and show notification if needed."""
-        if not self.db:
+        if not self._reads_available():
             return
         
         try:
-            user_data = get_user(self.db, user_id)
+            user_data = get_user_profile(self.db, user_id)
             if not user_data:
                 return
             
@@ -1423,7 +1657,8 @@ This is an automated notification from Game Sentry.
             if daily_limit is None:
                 return
             
-            current_usage = self._calculate_daily_usage(user_id)
+            # Usage is tracked in seconds while the limit is in minutes
+            current_usage = self._calculate_daily_usage(user_id) // 60
             
             # Create a unique key for today's notification
             today_key = f"{user_id}_{datetime.now().date()}"
@@ -1540,8 +1775,7 @@ This is an automated notification from Game Sentry.
             if selected_kid_name == "All" or not selected_kid_name:
                 messagebox.showwarning("Select Kid", "Please select a specific kid to add an entry.")
                 return
-            users = list_users(self.db) if self.db else []
-            user = next((u for u in users if u.get('role') == ROLE_KID and u.get('username', 'Kid') == selected_kid_name), None)
+            user = next((u for u in self._get_parent_kid_users() if u.get('username', 'Kid') == selected_kid_name), None)
             if not user:
                 messagebox.showerror("User Not Found", f"Could not find user '{selected_kid_name}'.")
                 return
@@ -1555,239 +1789,162 @@ This is an automated notification from Game Sentry.
             if selected_kid_name == "All" or not selected_kid_name:
                 messagebox.showwarning("Select Kid", "Please select a specific kid to delete all entries.")
                 return
-            users = list_users(self.db) if self.db else []
-            user = next((u for u in users if u.get('role') == ROLE_KID and u.get('username', 'Kid') == selected_kid_name), None)
+            user = next((u for u in self._get_parent_kid_users() if u.get('username', 'Kid') == selected_kid_name), None)
             if not user:
                 messagebox.showerror("User Not Found", f"Could not find user '{selected_kid_name}'.")
                 return
             user_id = user.get('id')
             if not messagebox.askyesno("Confirm Delete All", f"Are you sure you want to delete ALL session entries for '{selected_kid_name}'?"):
                 return
-            user_doc = self.db.collection(USERS_COLLECTION).document(user_id)
-            user_doc.update({'sessions': []})
-            self.show_logs_for_kid()
+            run_in_background(self, lambda: self._delete_all_sessions(user_id),
+                              lambda deleted: self.show_logs_for_kid())
+
+        def delete_selected_log():
+            entry = self.log_table.selected_entry()
+            if entry is None:
+                messagebox.showwarning("No selection", "Please select a session log entry to delete.")
+                return
+            self._delete_session_log_entry(entry)
+
+        def edit_selected_log():
+            entry = self.log_table.selected_entry()
+            if entry is None:
+                messagebox.showwarning("No selection", "Please select a session log entry to edit.")
+                return
+            self._edit_session_log_entry(entry)
 
         ttk.Button(btn_frame, text="Add Entry", command=add_entry).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Edit Selected", command=edit_selected_log).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Delete Selected", command=delete_selected_log).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="Delete All Entries", command=delete_all_entries).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="Refresh", command=self.show_logs_for_kid).pack(side=tk.LEFT, padx=5)
 
-        # Table Frame
-        table_frame = ttk.Frame(self.logs_table_frame)
-        table_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        tree = ttk.Treeview(table_frame, columns=("username", "start", "stop", "duration"), show="headings", height=12)
-        tree.heading("username", text="Username")
-        tree.heading("start", text="Start Time")
-        tree.heading("stop", text="Stop Time")
-        tree.heading("duration", text="Duration")
-        tree.pack(fill=tk.BOTH, expand=True)
-
-        # --- Fetch and insert session logs ---
-        users = list_users(self.db) if self.db else []
+        # --- Session Logs Table (rows are fetched page by page as the user scrolls) ---
+        date_range = self._get_selected_date_range()
+        if date_range is None:
+            return
+        start_day, end_day = date_range
+        kid_users = {user.get('id'): user for user in self._get_selected_kid_users()}
+        # Cursors from the local store and Firestore differ, so a table sticks to one source
+        from_local_store = local_store.has_synced()
+        self.log_table = SessionLogTable(
+            self.logs_table_frame,
+            columns=("username", "start", "stop", "duration"),
+            headings=("Username", "Start Time", "Stop Time", "Duration"),
+            fetch_page=lambda cursor: self._fetch_kid_session_log_page(kid_users, start_day, end_day, cursor, from_local_store),
+            empty_text="No session logs found for the selected dates."
+        )
+        self.log_table.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+
+    def _delete_session_log_entry(self, entry: Dict[str, Any]):
+        """Deletes the session behind a parent log table entry (by its ID) and reloads the table."""
+        if not self.db:
+            return
+        if not messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this session log entry?"):
+            return
+        def on_deleted(deleted: bool):
+            if not deleted:
+                messagebox.showerror("Delete Failed", "Could not delete the session log entry.")
+            self.show_logs_for_kid()
+        run_in_background(self, lambda: self._delete_session(entry['user_id'], entry['session_id']), on_deleted)
+
+    def _edit_session_log_entry(self, entry: Dict[str, Any]):
+        """Asks for new times for the session behind a parent log table entry and saves them by its ID."""
+        if not self.db:
+            return
+        user_id = entry['user_id']
+        session_id = entry['session_id']
+        session = entry['session']
+        new_start = simpledialog.askstring("Edit Start Time", "Start Time (YYYY-MM-DD HH:MM:SS):", initialvalue=session.get('start', ''))
+        if new_start is None:
+            return
+        new_stop = simpledialog.askstring("Edit Stop Time", "Stop Time (YYYY-MM-DD HH:MM:SS):", initialvalue=session.get('stop', ''))
+        if new_stop is None:
+            return
+        new_duration = simpledialog.askstring("Edit Duration", "Duration (HH:MM:SS):", initialvalue=session.get('duration', ''))
+        if new_duration is None:
+            return
+        # --- Validation ---
+        try:
+            start_dt = parse_session_time(new_start)
+            stop_dt = parse_session_time(new_stop)
+        except Exception:
+            messagebox.showerror("Invalid Time", "Start and Stop times must be in format YYYY-MM-DD HH:MM:SS.")
+            return
+        if start_dt > stop_dt:
+            messagebox.showerror("Invalid Time Range", "Start time cannot be after stop time.")
+            return
+        # Check for overlap with other sessions
+        other = find_overlapping_session_log(self.db, user_id, int(start_dt.timestamp()), int(stop_dt.timestamp()), exclude_id=session_id)
+        if other is not None:
+            messagebox.showerror("Time Overlap", f"The new time range overlaps with another session (from {other.get('start','')} to {other.get('stop','')}).")
+            return
+        updated_session = {'start': new_start, 'stop': new_stop, 'duration': new_duration}
+        def on_saved(saved: bool):
+            if not saved:
+                messagebox.showerror("Edit Failed", "Could not save the session log entry. It may have been deleted on another device.")
+            self.show_logs_for_kid()
+        # Save the updated session to Firestore
+        run_in_background(self, lambda: update_session_log_for_user(self.db, user_id, session_id, updated_session), on_saved)
+
+    def _get_parent_kid_users(self) -> List[Dict[str, Any]]:
+        """Returns the kid profiles listed when the parent dashboard was built, listing them if needed."""
+        if self.parent_kid_users is None:
+            users = list_users(self.db) if self._reads_available() else []
+            self.parent_kid_users = [user for user in users if user.get('role') == ROLE_KID]
+        return self.parent_kid_users
+
+    def _get_selected_kid_users(self) -> List[Dict[str, Any]]:
+        """Returns the kid profiles matching the parent dashboard's kid filter."""
         selected_kid = self.filter_var.get().strip().lower() if hasattr(self, 'filter_var') else "all"
-        selected_day = self.date_filter_var.get() if hasattr(self, 'date_filter_var') else ""
-        selected_date = None
-        if selected_day:
-            try:
-                selected_date = datetime.strptime(selected_day, '%Y-%m-%d').date()
-            except Exception:
-                selected_date = None
+        return [user for user in self._get_parent_kid_users()
+                if selected_kid == "all" or user.get('username', 'Kid').strip().lower() == selected_kid]
 
-        all_kids_logs = []
-        for user in users:
-            if user.get('role') == ROLE_KID:
-                username = user.get('username', 'Kid').strip().lower()
-                if selected_kid != "all" and username != selected_kid:
-                    continue
-                sessions = get_session_logs_for_user(self.db, user.get('id'))
-                for idx, session in enumerate(sessions):
-                    start = session.get('start', '')
-                    try:
-                        session_dt = datetime.strptime(start, '%Y-%m-%d %H:%M:%S')
-                        session_date = session_dt.date()
-                        if selected_date and session_date != selected_date:
-                            continue
-                        entry = {
-                            'username': user.get('username', 'Kid'),
-                            'start': start,
-                            'stop': session.get('stop', ''),
-                            'duration': session.get('duration', ''),
-                            'user_id': user.get('id'),
-                            'session_idx': idx,
-                            'session': session
-                        }
-                        all_kids_logs.append(entry)
-                    except Exception:
-                        continue
-
-        # Sort logs by start time descending
-        all_kids_logs.sort(key=lambda x: x['start'], reverse=True)
-
-        # Insert into table
-        for entry in all_kids_logs:
-            tree.insert("", "end", values=(entry["username"], entry["start"], entry["stop"], entry["duration"]))
-
-        # Show a message if no logs
-        if not all_kids_logs:
-            no_logs_label = ttk.Label(table_frame, text="No session logs found for the selected date.")
-            no_logs_label.pack(pady=10)
-
-    def _actual_show_logs(self, *args):
-        """Actual implementation of session log display"""
+    def _get_selected_date_range(self):
+        """Returns the (start_day, end_day) picked in the parent dashboard; empty ends are open. None if invalid."""
+        start_day = self.date_from_var.get().strip() if hasattr(self, 'date_from_var') else ""
+        end_day = self.date_to_var.get().strip() if hasattr(self, 'date_to_var') else ""
         try:
-            print("[DEBUG] Loading session logs...")
-            selected_day = self.date_filter_var.get() if hasattr(self, 'date_filter_var') else ""
-            print(f"[DEBUG] Selected date: {selected_day}")
-            # Clear previous widgets
-            if hasattr(self, '_parent_log_widgets'):
-                for w in self._parent_log_widgets:
-                    try:
-                        w.destroy()
-                    except Exception:
-                        pass
-            self._parent_log_widgets = []
-            self.main_content_frame.update_idletasks()
-            # Parse selected date
-            selected_date = None
-            if selected_day:
-                try:
-                    selected_date = datetime.strptime(selected_day, '%Y-%m-%d').date()
-                except Exception as e:
-                    print(f"Invalid date filter: {e}")
-            # Fetch users and filter logs
-            users = list_users(self.db) if self.db else []
-            selected_kid = self.filter_var.get().strip().lower() if hasattr(self, 'filter_var') else "all"
-            all_kids_logs = []
-            for user in users:
-                if user.get('role') == ROLE_KID:
-                    username = user.get('username', 'Kid').strip().lower()
-                    if selected_kid != "all" and username != selected_kid:
-                        continue
-                    # Get fresh session logs
-                    sessions = get_session_logs_for_user(self.db, user.get('id'))
-                    for idx, session in enumerate(sessions):
-                        start = session.get('start', '')
-                        try:
-                            session_dt = datetime.strptime(start, '%Y-%m-%d %H:%M:%S')
-                            session_date = session_dt.date()
-                            # Apply date filter
-                            if selected_date and session_date != selected_date:
-                                continue
-                            # Create complete entry
-                            entry = {
-                                'username': user.get('username', 'Kid'),
-                                'start': start,
-                                'stop': session.get('stop', ''),
-                                'duration': session.get('duration', ''),
-                                'user_id': user.get('id'),
-                                'session_idx': idx,
-                                'session': session
-                            }
-                            all_kids_logs.append(entry)
-                        except ValueError as e:
-                            print(f"Error parsing session date: {e}")
-                            continue
-            # Sort logs by start time descending
-            all_kids_logs.sort(key=lambda x: x['start'], reverse=True)
-            # --- Session Log Frame (dedicated for table and controls) ---
-            self.session_log_frame = ttk.Frame(self.main_content_frame)
-            self.session_log_frame.pack(fill=tk.BOTH, expand=True)
-            self.main_content_frame.update_idletasks()  # Force UI redraw
-            # --- Buttons Frame (now above the table) ---
-            btn_frame = ttk.Frame(self.session_log_frame)
-            btn_frame.pack(pady=(10, 0))
-            self._parent_log_widgets.append(btn_frame)
-            # Only keep delete/edit buttons
-            def delete_selected_log():
-                if not self.db:
-                    return
-                selected = tree.selection()
-                if not selected:
-                    messagebox.showwarning("No selection", "Please select a session log entry to delete.")
-                    return
-                iid = selected[0]
-                user_id = iid.split(":")[0]
-                session_idx = int(iid.split(":")[1])
-                if not messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this session log entry?"):
-                    return
-                user_doc = self.db.collection(USERS_COLLECTION).document(user_id)
-                user_data = user_doc.get().to_dict() if user_doc else None
-                sessions = user_data.get('sessions', []) if user_data else []
-                if 0 <= session_idx < len(sessions):
-                    del sessions[session_idx]
-                    user_doc.update({'sessions': sessions})
-                self.show_logs_for_kid()
-            def edit_selected_log():
-                if not self.db:
-                    return
-                selected = tree.selection()
-                if not selected:
-                    messagebox.showwarning("No selection", "Please select a session log entry to edit.")
-                    return
-                iid = selected[0]
-                user_id = iid.split(":")[0]
-                session_idx = int(iid.split(":")[1])
-                user_doc = self.db.collection(USERS_COLLECTION).document(user_id)
-                user_data = user_doc.get().to_dict() if user_doc else None
-                sessions = user_data.get('sessions', []) if user_data else []
-                if 0 <= session_idx < len(sessions):
-                    session = sessions[session_idx]
-                    new_start = simpledialog.askstring("Edit Start Time", "Start Time (YYYY-MM-DD HH:MM:SS):", initialvalue=session.get('start', ''))
-                    if new_start is None:
-                        return
-                    new_stop = simpledialog.askstring("Edit Stop Time", "Stop Time (YYYY-MM-DD HH:MM:SS):", initialvalue=session.get('stop', ''))
-                    if new_stop is None:
-                        return
-                    new_duration = simpledialog.askstring("Edit Duration", "Duration (HH:MM:SS):", initialvalue=session.get('duration', ''))
-                    if new_duration is None:
-                        return
-                    # --- Validation ---
-                    try:
-                        start_dt = datetime.strptime(new_start, '%Y-%m-%d %H:%M:%S')
-                        stop_dt = datetime.strptime(new_stop, '%Y-%m-%d %H:%M:%S')
-                    except Exception:
-                        messagebox.showerror("Invalid Time", "Start and Stop times must be in format YYYY-MM-DD HH:MM:SS.")
-                        return
-                    if start_dt > stop_dt:
-                        messagebox.showerror("Invalid Time Range", "Start time cannot be after stop time.")
-                        return
-                    # Check for overlap with other sessions
-                    for idx, other in enumerate(sessions):
-                        if idx == session_idx:
-                            continue
-                        try:
-                            other_start = datetime.strptime(other.get('start', ''), '%Y-%m-%d %H:%M:%S')
-                            other_stop = datetime.strptime(other.get('stop', ''), '%Y-%m-%d %H:%M:%S')
-                        except Exception:
-                            continue
-                        # Overlap if: (start < other_stop) and (stop > other_start)
-                        if (start_dt < other_stop and stop_dt > other_start):
-                            messagebox.showerror("Time Overlap", f"The new time range overlaps with another session (from {other.get('start','')} to {other.get('stop','')}).")
-                            return
-                    sessions[session_idx] = {'start': new_start, 'stop': new_stop, 'duration': new_duration}
-                    # Save updated sessions list to Firestore
-                    user_doc.update({'sessions': sessions})
-                self.show_logs_for_kid()
-            # --- Table Frame ---
-            table_frame = ttk.Frame(self.session_log_frame)
-            table_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-            self._parent_log_widgets.append(table_frame)
-            tree = ttk.Treeview(table_frame, columns=("username", "start", "stop", "duration"), show="headings", height=12)
-            tree.heading("username", text="Username")
-            tree.heading("start", text="Start Time")
-            tree.heading("stop", text="Stop Time")
-            tree.heading("duration", text="Duration")
-            for entry in all_kids_logs:
-                tree.insert("", "end", values=(entry["username"], entry["start"], entry["stop"], entry["duration"]), iid=f'{entry["user_id"]}:{entry["session_idx"]}')
-            tree.pack(fill=tk.BOTH, expand=True)
-            if not all_kids_logs:
-                no_logs_label = ttk.Label(table_frame, text="No session logs found for the selected date.")
-                no_logs_label.pack(pady=10)
-                self._parent_log_widgets.append(no_logs_label)
-            ttk.Button(btn_frame, text="Delete Selected", command=delete_selected_log).pack(side=tk.LEFT, padx=5)
-            ttk.Button(btn_frame, text="Edit Selected", command=edit_selected_log).pack(side=tk.LEFT, padx=5)
-        except Exception as e:
-            print(f"Error in _actual_show_logs: {e}")
-            messagebox.showerror("Error", f"Could not load session logs: {str(e)}")
+            for day in (start_day, end_day):
+                if day:
+                    datetime.strptime(day, '%Y-%m-%d')
+        except ValueError:
+            messagebox.showerror("Invalid Date", "Dates must be in format YYYY-MM-DD.")
+            return None
+        if start_day and end_day and start_day > end_day:
+            messagebox.showerror("Invalid Date Range", "The start date cannot be after the end date.")
+            return None
+        return start_day or None, end_day or None
+
+    def _make_log_entry(self, user: Dict[str, Any], session: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'iid': f"{user.get('id')}:{session.get('id')}",
+            'username': user.get('username', 'Kid'),
+            'start': session.get('start', ''),
+            'stop': session.get('stop', ''),
+            'duration': session.get('duration', ''),
+            'user_id': user.get('id'),
+            'session_id': session.get('id'),
+            'session': session
+        }
+
+    def _fetch_kid_session_log_page(self, kid_users: Dict[str, Dict[str, Any]], start_day: Optional[str], end_day: Optional[str],
+                                    cursor: Any, from_local_store: bool):
+        """Fetches one page of the parent log table for the given kids (by ID), newest first; runs on a background thread."""
+        if not kid_users or (self.db is None and not from_local_store):
+            return [], None
+        round_trips_before = read_counter.total()
+        if from_local_store:
+            sessions, next_cursor = local_store.get_sessions_page(list(kid_users), start_day, end_day, LOG_PAGE_SIZE, cursor)
+        else:
+            # Before the first sync: one kid pages through their own sessions; several kids share one collection group query
+            user_id = next(iter(kid_users)) if len(kid_users) == 1 else None
+            sessions, next_cursor = query_sessions_page(self.db, user_id, start_day, end_day, LOG_PAGE_SIZE, cursor)
+        entries = [self._make_log_entry(kid_users[session['user_id']], session)
+                   for session in sessions if session['user_id'] in kid_users]
+        logger.debug(f"Loaded a page of {len(entries)} session logs for {len(kid_users)} kids "
+                     f"in {read_counter.total() - round_trips_before} Firestore round trips")
+        return entries, next_cursor
 
 class KidSelectionDialog(tk.Toplevel):
     """A dialog window to select a kid user to view their dashboard, with avatars and a modern look."""
@@ -1798,6 +1955,8 @@ class KidSelectionDialog(tk.Toplevel):
         self.callback = callback
         self.selected_index = None
         self.card_widgets = []
+        self._avatar_loads = []  # Futures of avatars still downloading; cancelled if the dialog closes first
+        self._closed = False
 
         self.title("Select Kid Profile")
         self.transient(parent)
@@ -1837,6 +1996,7 @@ class KidSelectionDialog(tk.Toplevel):
         # --- Load Users ---
         self.users = [user for user in list_users(self.db) if user.get('role') == ROLE_KID]
         self.avatar_images = []  # Prevent garbage collection
+        self.placeholder_image = ImageTk.PhotoImage(Image.new('RGB', (64, 64), color='#bbb'))
 
         card_bg = self.parent_app.theme_colors['widget_bg']
         card_fg = self.parent_app.theme_colors['widget_fg']
@@ -1869,23 +2029,13 @@ class KidSelectionDialog(tk.Toplevel):
             frame.bind("<Enter>", lambda e, i=idx: on_card_enter(i))
             frame.bind("<Leave>", lambda e, i=idx: on_card_leave(i))
 
-            # Avatar
+            # Avatar: shown at once if it's in memory, otherwise a placeholder until it has loaded
             avatar_url = user.get('avatar_url')
-            avatar_img = None
-            if avatar_url:
-                try:
-                    img = load_image_from_url(avatar_url, (64, 64))
-                    if img:
-                        avatar_img = ImageTk.PhotoImage(img)
-                except Exception:
-                    avatar_img = None
-            if not avatar_img:
-                # Placeholder
-                img = Image.new('RGB', (64, 64), color='#bbb')
-                avatar_img = ImageTk.PhotoImage(img)
-            self.avatar_images.append(avatar_img)
-            avatar_label = tk.Label(frame, image=avatar_img, bg=card_bg)
+            avatar_img = avatar_cache.cached_photo(avatar_url, 64) if avatar_url else None
+            avatar_label = tk.Label(frame, image=avatar_img or self.placeholder_image, bg=card_bg)
             avatar_label.pack(side=tk.LEFT, padx=10, pady=5)
+            if avatar_url and avatar_img is None:
+                self._load_avatar(avatar_label, avatar_url)
             avatar_label.bind("<Button-1>", lambda e, i=idx: on_card_click(i))
             avatar_label.bind("<Double-Button-1>", lambda e, i=idx: on_card_double_click(i))
             avatar_label.bind("<Enter>", lambda e, i=idx: on_card_enter(i))
@@ -1904,6 +2054,40 @@ class KidSelectionDialog(tk.Toplevel):
 
         # No need for Select button since single-click automatically selects
 
+    def _load_avatar(self, avatar_label: tk.Label, avatar_url: str):
+        """Downloads an avatar on the avatar cache's thread pool and swaps it in on the Tk thread."""
+        future = avatar_cache.load_image_async(avatar_url, 64)
+        self._avatar_loads.append(future)
+
+        def on_loaded(future):
+            if self._closed or future.cancelled():
+                return
+            try:
+                self.after(0, lambda: self._show_avatar(avatar_label, avatar_url, future))
+            except (RuntimeError, tk.TclError):
+                pass  # The dialog was destroyed meanwhile
+        future.add_done_callback(on_loaded)
+
+    def _show_avatar(self, avatar_label: tk.Label, avatar_url: str, future):
+        if self._closed or not avatar_label.winfo_exists():
+            return
+        try:
+            img = future.result()
+        except Exception as e:
+            print(f"Error loading avatar from {avatar_url}: {e}")
+            return
+        if img is not None:
+            photo = avatar_cache.photo_from_image(avatar_url, 64, img)
+            self.avatar_images.append(photo)
+            avatar_label.configure(image=photo)
+
+    def destroy(self):
+        # Drop avatar downloads that haven't started; ones in flight finish into the cache
+        self._closed = True
+        for future in self._avatar_loads:
+            future.cancel()
+        super().destroy()
+
     def _select_card(self, idx):
         card_bg = self.parent_app.theme_colors['widget_bg']
         card_selected = self.parent_app.theme_colors['accent']
@@ -1924,7 +2108,7 @@ class KidSelectionDialog(tk.Toplevel):
         if selected_date is None:
             return True
         try:
-            session_date = datetime.strptime(session['start'], '%Y-%m-%d %H:%M:%S').date()
+            session_date = parse_session_time(session['start']).date()
             return session_date == selected_date
         except ValueError:
             return False
@@ -2036,6 +2220,10 @@ class UserManagementWindow(tk.Toplevel):
             self.secondary_button_colors, height=35, radius=15
         ).pack(side=tk.LEFT, padx=5)
 
+        # Progress of background avatar uploads
+        self.avatar_status_label = ttk.Label(avatar_frame, text="")
+        self.avatar_status_label.pack(side=tk.LEFT, padx=5)
+
         # --- Kid-Specific Settings Frame ---
         self.kid_settings_frame = ttk.LabelFrame(right_pane, text="Kid-Specific Settings", padding="10")
         self.kid_settings_frame.pack(fill=tk.X, pady=(20, 0))
@@ -2177,7 +2365,7 @@ class UserManagementWindow(tk.Toplevel):
         if avatar_url:
             try:
                 # Load image from URL and update preview
-                img = load_image_from_url(avatar_url)
+                img = load_image_from_url(avatar_url, (100, 100))
                 if img:
                     self._load_avatar_preview_from_image(img)
                 else:
@@ -2242,8 +2430,7 @@ class UserManagementWindow(tk.Toplevel):
             return
 
         try:
-            img = Image.open(current_preview_path)
-            img.thumbnail((100, 100))  # Resize for preview
+            img = load_thumbnail(current_preview_path, 100)  # Resize for preview
             self.avatar_photo_image = ImageTk.PhotoImage(img)
             self.avatar_preview_label.config(image=self.avatar_photo_image, text="", relief="flat")
         except Exception as e:
@@ -2251,7 +2438,7 @@ class UserManagementWindow(tk.Toplevel):
             self.avatar_preview_label.config(image='', text="Load Error", width=12, relief="solid", borderwidth=1)
             self.avatar_photo_image = None # Clear the reference
 
-    def _load_avatar_preview_from_image(self, img: Image.Image):
+    def _load_avatar_preview_from_image(self, img: 'Image.Image'):
         """Loads and displays a preview from a PIL Image object."""
         try:
             img.thumbnail((100, 100))  # Resize for preview
@@ -2295,6 +2482,8 @@ class UserManagementWindow(tk.Toplevel):
             self.tree.delete(item)
         
         users = list_users(self.db)
+        # Keep the parent log table's kid list in step with user changes
+        self.parent_app.parent_kid_users = [user for user in users if user.get('role') == ROLE_KID]
         # Sort so that parents come first, then kids, both alphabetically by username
         def role_order(role):
             return 0 if role == 'Parent' else 1
@@ -2318,19 +2507,13 @@ class UserManagementWindow(tk.Toplevel):
 
         user_data = {"username": username, "role": role}
 
-        # Handle avatar file copy and naming
-        if self.selected_avatar_path is not None:
-            try:
-                avatar_url = upload_image_to_cloudinary(self.selected_avatar_path)
-                if not avatar_url:
-                    # upload_image_to_cloudinary shows its own messagebox, just return
-                    return
-                user_data['avatar_url'] = avatar_url
-            except Exception as e:
-                messagebox.showerror("Avatar Error", f"Could not process the avatar image: {e}", parent=self)
-                return # Stop user creation if avatar fails to save
+        # The avatar is uploaded in the background and attached to the user once it lands
+        avatar_path = self.selected_avatar_path
 
-        self._gather_and_save_user(user_data)
+        def on_saved(user_id: str):
+            if avatar_path is not None:
+                self._queue_avatar_upload(user_id, username, avatar_path)
+        self._gather_and_save_user(user_data, on_saved=on_saved)
 
     def save_changes(self):
         """Handles the 'Save Changes' button click."""
@@ -2352,31 +2535,70 @@ class UserManagementWindow(tk.Toplevel):
 
         user_data = {"username": username, "role": role}
 
-        # Handle avatar update
-        if self.selected_avatar_path:
-            # A new avatar has been selected, so we need to replace the old one.
+        # A new avatar replaces the old one once its background upload has finished
+        avatar_path = self.selected_avatar_path
+
+        def on_saved(user_id: str):
+            if avatar_path:
+                self._queue_avatar_upload(user_id, username, avatar_path)
+        self._gather_and_save_user(user_data, is_update=True, on_saved=on_saved)
+
+    def _queue_avatar_upload(self, user_id: str, username: str, avatar_path: str):
+        """Uploads an avatar in the background, showing its progress under the form."""
+        app = self.parent_app
+
+        def on_progress(message: str):
             try:
-                # First, delete the old avatar from Cloudinary
-                old_user_data = get_user(self.db, self.editing_user_id)
-                if old_user_data and old_user_data.get('avatar_url'):
-                    old_avatar_url = old_user_data['avatar_url']
-                    if not delete_image_from_cloudinary(old_avatar_url):
-                        print(f"Warning: could not delete old avatar from Cloudinary: {old_avatar_url}")
-
-                # Now, upload the new one to Cloudinary
-                new_avatar_url = upload_image_to_cloudinary(self.selected_avatar_path)
-                if not new_avatar_url:
-                     # Error is shown by the upload function
-                     return
-                user_data['avatar_url'] = new_avatar_url
-            except Exception as e:
-                messagebox.showerror("Avatar Error", f"Could not update the avatar image: {e}", parent=self)
-                return
+                app.after(0, lambda: self._show_avatar_status(f"{username}: {message}"))
+            except (RuntimeError, tk.TclError):
+                pass  # The app is shutting down
 
-        self._gather_and_save_user(user_data, is_update=True)
+        def on_done(avatar: Optional[Dict[str, str]], error: Optional[Exception]):
+            try:
+                app.after(0, lambda: self._on_avatar_uploaded(user_id, username, avatar, error))
+            except (RuntimeError, tk.TclError):
+                pass  # The app is shutting down; the next upload of this picture reuses it
+        avatar_uploads.submit(avatar_path, on_done, on_progress)
+
+    def _show_avatar_status(self, message: str):
+        if self.winfo_exists():
+            self.avatar_status_label.config(text=message)
+
+    def _on_avatar_uploaded(self, user_id: str, username: str, avatar: Optional[Dict[str, str]], error: Optional[Exception]):
+        """Attaches a finished upload to its user and releases the avatar it replaces. Runs even if this window was closed."""
+        if avatar is None:
+            self._show_avatar_status(f"{username}: avatar upload failed")
+            messagebox.showerror("Cloudinary Error", f"Failed to upload the avatar for '{username}': {error}",
+                                 parent=self if self.winfo_exists() else self.parent_app)
+            return
+        old_user_data = get_user(self.db, user_id)
+        if old_user_data is None:
+            # The user was deleted while the avatar was uploading; the sweeper removes the upload
+            return
 
-    def _gather_and_save_user(self, user_data: Dict[str, Any], is_update: bool = False):
-        """Gathers common form data and calls the appropriate DB function."""
+        def on_saved(saved: bool):
+            if not saved:
+                self._show_avatar_status(f"{username}: could not save the new avatar")
+                return
+            self._show_avatar_status(f"{username}: avatar saved")
+            if old_user_data.get('avatar_url') and old_user_data.get('avatar_url') != avatar['url']:
+                self._sweep_avatars_soon()
+            # Repaint the kid view if it shows this user
+            current_kid = self.parent_app.current_kid_user
+            if current_kid and current_kid.get('id') == user_id:
+                self.parent_app.current_kid_user = get_user(self.db, user_id)
+                self.parent_app._update_ui_for_view()
+        run_in_background(self.parent_app, lambda: update_user(
+            self.db, user_id, {'avatar_url': avatar['url'], 'avatar_public_id': avatar['public_id']}), on_saved)
+
+    def _sweep_avatars_soon(self):
+        """Deletes avatars that are no longer used without waiting for the daily sweep."""
+        if self.parent_app.avatar_sweeper is not None:
+            self.parent_app.avatar_sweeper.sweep_soon()
+
+    def _gather_and_save_user(self, user_data: Dict[str, Any], is_update: bool = False,
+                              on_saved: Optional[Callable[[str], None]] = None):
+        """Gathers common form data and saves the user in the background, then calls ``on_saved(user_id)`` if it worked."""
         role = user_data.get('role')
         if role == ROLE_KID:
             try:
@@ -2402,19 +2624,29 @@ class UserManagementWindow(tk.Toplevel):
                 messagebox.showerror("Input Error", "Invalid Date of Birth or numeric value. Please check your inputs.", parent=self)
                 return
 
-        if is_update:
-            if self.editing_user_id is not None and update_user(self.db, self.editing_user_id, user_data):
-                messagebox.showinfo("Success", f"User '{user_data['username']}' updated successfully.", parent=self)
-                self.refresh_user_list() # This also resets the form
-            else:
-                messagebox.showerror("Database Error", f"Failed to update user '{user_data['username']}'.", parent=self)
-        else:
-            if add_user(self.db, user_data):
-                messagebox.showinfo("Success", f"User '{user_data['username']}' added successfully.", parent=self)
-                self._clear_form()
-                self.refresh_user_list()
-            else:
-                messagebox.showerror("Database Error", f"Failed to add user '{user_data['username']}'.", parent=self)
+        username = user_data['username']
+        editing_user_id = self.editing_user_id
+
+        def save() -> Optional[str]:
+            if is_update:
+                return editing_user_id if editing_user_id is not None and update_user(self.db, editing_user_id, user_data) else None
+            return add_user(self.db, user_data)
+
+        def on_done(user_id: Optional[str]):
+            window_open = self.winfo_exists()
+            parent = self if window_open else self.parent_app
+            if not user_id:
+                action = "update" if is_update else "add"
+                messagebox.showerror("Database Error", f"Failed to {action} user '{username}'.", parent=parent)
+                return
+            messagebox.showinfo("Success", f"User '{username}' {'updated' if is_update else 'added'} successfully.", parent=parent)
+            if window_open:
+                if not is_update:
+                    self._clear_form()
+                self.refresh_user_list()  # This also resets the form
+            if on_saved is not None:
+                on_saved(user_id)
+        run_in_background(self.parent_app, save, on_done)
 
 
     def delete_user_gui(self):
@@ -2428,19 +2660,21 @@ class UserManagementWindow(tk.Toplevel):
         username = self.tree.item(item)['values'][0]
         user_id = self.tree.item(item)['values'][2]
 
-        if messagebox.askyesno("Confirm Deletion", f"Are you sure you want to delete user '{username}'?", parent=self):
-            # Get user data to find the avatar URL before deleting from DB
-            user_data = get_user(self.db, user_id)
+        if not messagebox.askyesno("Confirm Deletion", f"Are you sure you want to delete user '{username}'?", parent=self):
+            return
 
-            if delete_user(self.db, user_id):
-                messagebox.showinfo("Success", f"User '{username}' was deleted.", parent=self)
-                # If deletion from DB was successful, delete the avatar from Cloudinary
-                if user_data and user_data.get('avatar_url'):
-                    if not delete_image_from_cloudinary(user_data['avatar_url']):
-                        print(f"Warning: could not delete avatar from Cloudinary: {user_data['avatar_url']}")
+        def on_deleted(deleted: bool):
+            window_open = self.winfo_exists()
+            parent = self if window_open else self.parent_app
+            if not deleted:
+                messagebox.showerror("Database Error", f"Failed to delete user '{username}'.", parent=parent)
+                return
+            messagebox.showinfo("Success", f"User '{username}' was deleted.", parent=parent)
+            # Their avatar is now an orphan; sweep it from Cloudinary in the background
+            self._sweep_avatars_soon()
+            if window_open:
                 self.refresh_user_list()
-            else:
-                messagebox.showerror("Database Error", f"Failed to delete user '{username}'.", parent=self)
+        run_in_background(self.parent_app, lambda: self.parent_app._delete_user(user_id), on_deleted)
 
 class SettingsWindow(tk.Toplevel):
     """A Toplevel window for managing application settings like themes and email notifications."""
@@ -2621,8 +2855,16 @@ class AvatarSelectionWindow(tk.Toplevel):
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
 
-        # --- Load and Display Avatars ---
+        # --- Lay Out Avatars ---
+        # Every avatar gets a placeholder button straight away; thumbnails are decoded
+        # (or read from the thumbnail cache) only once their row scrolls into view.
         self.photo_images = [] # IMPORTANT: To prevent garbage collection
+        self.placeholder_image = tk.PhotoImage(width=GALLERY_THUMBNAIL_SIZE, height=GALLERY_THUMBNAIL_SIZE)
+        self.canvas = canvas
+        self.pending_buttons: Dict[ttk.Button, str] = {}  # Buttons still showing the placeholder, with their file
+        self.thumbnail_loads = []  # Futures of thumbnails being decoded; cancelled if the window closes first
+        self._closed = False
+        self._visibility_check_scheduled = False
         valid_extensions = ('.png', '.jpg', '.jpeg', '.gif')
         
         row, col = 0, 0
@@ -2631,20 +2873,76 @@ class AvatarSelectionWindow(tk.Toplevel):
         for filename in sorted(os.listdir(self.source_avatars_dir)):
             if filename.lower().endswith(valid_extensions):
                 full_path = os.path.join(self.source_avatars_dir, filename)
-                try:
-                    img = Image.open(full_path)
-                    img.thumbnail((100, 100))
-                    photo = ImageTk.PhotoImage(img)
-                    self.photo_images.append(photo)
+                btn = ttk.Button(scrollable_frame, image=self.placeholder_image, command=lambda p=full_path: self._on_select(p))
+                btn.grid(row=row, column=col, padx=5, pady=5)
+                self.pending_buttons[btn] = full_path
+
+                col = (col + 1) % max_cols
+                if col == 0:
+                    row += 1
+
+        # Load whatever becomes visible as the window is laid out and scrolled
+        canvas.configure(yscrollcommand=lambda first, last: (scrollbar.set(first, last), self._schedule_visibility_check()))
+        canvas.bind("<Configure>", lambda e: self._schedule_visibility_check(), add="+")
+        self._schedule_visibility_check()
+        # Forget thumbnails of avatars that were replaced or removed
+        threading.Thread(target=self._prune_thumbnails, args=(list(self.pending_buttons.values()),), daemon=True).start()
+
+    def _prune_thumbnails(self, paths: List[str]):
+        try:
+            gallery_thumbnails.prune([gallery_thumbnails.key(path, GALLERY_THUMBNAIL_SIZE) for path in paths])
+        except OSError as e:
+            logger.warning(f"Could not prune gallery thumbnails: {e}")
+
+    def _schedule_visibility_check(self):
+        if not self._visibility_check_scheduled and not self._closed:
+            self._visibility_check_scheduled = True
+            self.after_idle(self._load_visible_thumbnails)
+
+    def _load_visible_thumbnails(self):
+        """Starts loading the thumbnails of placeholder buttons within (or one row beyond) the visible area."""
+        self._visibility_check_scheduled = False
+        if self._closed:
+            return
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        margin = GALLERY_THUMBNAIL_SIZE + 20  # Preload the next row so scrolling doesn't show placeholders
+        for btn, path in list(self.pending_buttons.items()):
+            btn_top = btn.winfo_y()
+            if btn_top + btn.winfo_height() >= top - margin and btn_top <= bottom + margin:
+                del self.pending_buttons[btn]
+                self._load_thumbnail(btn, path)
+
+    def _load_thumbnail(self, btn: ttk.Button, path: str):
+        future = gallery_thumbnails.load_async(path, GALLERY_THUMBNAIL_SIZE)
+        self.thumbnail_loads.append(future)
+
+        def on_loaded(future):
+            if self._closed or future.cancelled():
+                return
+            try:
+                self.after(0, lambda: self._show_thumbnail(btn, path, future))
+            except (RuntimeError, tk.TclError):
+                pass  # The window was destroyed meanwhile
+        future.add_done_callback(on_loaded)
 
-                    btn = ttk.Button(scrollable_frame, image=photo, command=lambda p=full_path: self._on_select(p))
-                    btn.grid(row=row, column=col, padx=5, pady=5)
+    def _show_thumbnail(self, btn: ttk.Button, path: str, future):
+        if self._closed or not btn.winfo_exists():
+            return
+        try:
+            photo = ImageTk.PhotoImage(future.result())
+        except Exception as e:
+            print(f"Could not load avatar {os.path.basename(path)}: {e}")
+            return
+        self.photo_images.append(photo)
+        btn.configure(image=photo)
 
-                    col = (col + 1) % max_cols
-                    if col == 0:
-                        row += 1
-                except Exception as e:
-                    print(f"Could not load avatar {filename}: {e}")
+    def destroy(self):
+        # Drop thumbnail loads that haven't started
+        self._closed = True
+        for future in getattr(self, 'thumbnail_loads', []):
+            future.cancel()
+        super().destroy()
 
     def _on_select(self, path: str):
         """Calls the callback with the selected path and closes the window."""
@@ -2652,6 +2950,26 @@ class AvatarSelectionWindow(tk.Toplevel):
         self.destroy()
 
 
+def run_in_background(widget: tk.Misc, work: Callable[[], Any], on_done: Callable[[Any], None]):
+    """
+    Runs a blocking Firestore write on a worker thread so the Tk event loop keeps going.
+
+    ``on_done(result)`` is scheduled on the Tk thread through ``widget``, which
+    should outlive the window that started the write (usually the app).
+    """
+    def run():
+        try:
+            result = work()
+        except Exception as e:
+            logger.error(f"Background write failed: {e}", exc_info=True)
+            result = None
+        try:
+            widget.after(0, lambda: on_done(result))
+        except (RuntimeError, tk.TclError):
+            pass  # The app is shutting down
+    threading.Thread(target=run, daemon=True).start()
+
+
 def add_user(db: Any, user_data: Dict[str, Any]) -> Optional[str]:
     """Adds a new user to the 'users' collection in Firestore."""
     if not user_data.get("username") or not user_data.get("role"):
@@ -2659,9 +2977,13 @@ def add_user(db: Any, user_data: Dict[str, Any]) -> Optional[str]:
         return None
     try:
         user_data['created_at'] = datetime.now(timezone.utc).isoformat()
-        doc_ref = db.collection(USERS_COLLECTION).add(user_data)[1]
-        print(f"Successfully added user '{user_data['username']}' with ID: {doc_ref.id}")
-        return doc_ref.id
+        user_id = create_user_profile(db, user_data)
+        local_store.upsert_user(dict(user_data, id=user_id))
+        print(f"Successfully added user '{user_data['username']}' with ID: {user_id}")
+        return user_id
+    except UsernameTakenError:
+        print(f"Could not add user: the username '{user_data['username']}' is already taken")
+        return None
     except Exception as e:
         print(f"An error occurred while adding user: {e}")
         return None
@@ -2670,45 +2992,64 @@ def update_user(db: Any, user_id: str, user_data: Dict[str, Any]) -> bool:
     """Updates an existing user's data in Firestore."""
     try:
         user_data['updated_at'] = datetime.now(timezone.utc).isoformat()
-        db.collection(USERS_COLLECTION).document(user_id).update(user_data)
+        update_user_profile(db, user_id, user_data)
+        local_user = local_store.get_user(user_id) or {'id': user_id}
+        local_user.update(user_data)
+        local_store.upsert_user(local_user)
         print(f"Successfully updated user with ID: {user_id}")
         return True
+    except UsernameTakenError:
+        print(f"Could not update user {user_id}: the username '{user_data['username']}' is already taken")
+        return False
     except Exception as e:
         print(f"An error occurred while updating user {user_id}: {e}")
         return False
 
 def get_user(db: Any, user_id: str) -> Optional[Dict[str, Any]]:
-    """Retrieves a single user's data from Firestore by their ID."""
-    if db is None:
+    """Retrieves a single user's profile by their ID from the local store."""
+    if db is None and not local_store.has_synced():
         return None
     try:
-        doc = db.collection(USERS_COLLECTION).document(user_id).get()
-        if doc.exists:
-            user_data = doc.to_dict()
-            user_data['id'] = doc.id
-            return user_data
-        else:
+        user_data = local_store.get_user(user_id)
+        if user_data is None and not local_store.has_synced():
+            # First launch: nothing has been mirrored yet, so ask Firestore
+            read_counter.record('user')
+            doc = db.collection(USERS_COLLECTION).document(user_id).get()
+            if doc.exists:
+                user_data = dict(doc.to_dict(), id=doc.id)
+                local_store.upsert_user(user_data)
+                user_data.pop('sessions', None)
+        if user_data is None:
             print(f"No user found with ID: {user_id}")
-            return None
+        return user_data
     except Exception as e:
         print(f"An error occurred while getting user {user_id}: {e}")
         return None
 
+def get_user_profile(db: Any, user_id: str) -> Optional[Dict[str, Any]]:
+    """Retrieves a user's profile (never the sessions array) from the local store."""
+    return get_user(db, user_id)
+
 def is_username_taken(db: Any, username: str, user_id_to_exclude: Optional[str] = None) -> bool:
-    """Checks if a username is already taken, optionally excluding a specific user ID."""
-    query = db.collection(USERS_COLLECTION).where('username', '==', username).limit(1)
-    docs = query.stream()
-    return any(doc.id != user_id_to_exclude for doc in docs)
+    """Checks (case-insensitively) if a username is already taken, optionally excluding a specific user ID."""
+    # A local lookup once the profiles are mirrored, otherwise one point read of the reservation;
+    # saving still re-checks the reservation in a transaction, which catches races with other PCs
+    if local_store.has_synced():
+        owner = local_store.get_username_owner(username)
+    else:
+        owner = get_username_owner(db, username)
+    return owner is not None and owner != user_id_to_exclude
 
 def list_users(db: Any) -> List[Dict[str, Any]]:
-    """Retrieves all users from the 'users' collection, ordered by username."""
+    """Retrieves the profiles of all users from the local store, ordered by username."""
+    if local_store.has_synced():
+        return local_store.list_users()
+    if db is None:
+        return []
     try:
-        docs = db.collection(USERS_COLLECTION).order_by('username').stream()
-        users = []
-        for doc in docs:
-            user_data = doc.to_dict()
-            user_data['id'] = doc.id
-            users.append(user_data)
+        # First launch: list from Firestore (profile fields only) and mirror the result
+        users = list_user_profiles(db)
+        local_store.replace_users(users)
         return users
     except Exception as e:
         print(f"An error occurred while listing users: {e}")
@@ -2716,44 +3057,112 @@ def list_users(db: Any) -> List[Dict[str, Any]]:
         return []
 
 def delete_user(db: Any, user_id: str) -> bool:
-    """Deletes a user from the 'users' collection by their ID."""
+    """Deletes a user and their sessions subcollection by the user's ID."""
     try:
-        db.collection(USERS_COLLECTION).document(user_id).delete()
+        # Firestore does not cascade deletes to subcollections
+        delete_all_sessions(db, user_id)
+        delete_user_profile(db, user_id)
+        local_store.delete_user(user_id)
         print(f"Successfully deleted user with ID: {user_id}")
         return True
     except Exception as e:
         print(f"An error occurred while deleting user: {e}")
         return False
 
-def add_session_log_to_user(db, user_id, session_log):
-    """Appends a session log entry to the user's 'sessions' array in Firestore."""
+def add_session_log_to_user(db, user_id, session_log) -> Optional[str]:
+    """Stores a session log entry in the user's sessions subcollection and returns its ID."""
     if db is None:
+        return None
+    try:
+        session_id = add_session(db, user_id, session_log, block_start_ts=get_block_start_ts(db, user_id))
+        local_store.upsert_session(user_id, session_id, session_document(session_log))
+        return session_id
+    except Exception as e:
+        print(f"Error adding session log to user {user_id}: {e}")
+        return None
+
+def update_session_log_for_user(db, user_id, session_id, session_log) -> bool:
+    """Replaces the times of one of a user's session log entries, identified by its ID."""
+    try:
+        update_session(db, user_id, session_id, session_log, get_block_start_ts(db, user_id))
+        local_store.upsert_session(user_id, session_id, session_document(session_log))
+        return True
+    except api_exceptions.NotFound:
+        print(f"Session log {session_id} of user {user_id} no longer exists in Firestore")
         return False
+    except Exception as e:
+        print(f"Error updating session log {session_id} of user {user_id}: {e}")
+        return False
+
+def delete_session_log_for_user(db, user_id, session_id) -> bool:
+    """Deletes one of a user's session log entries, identified by its ID; an entry already deleted elsewhere counts as deleted."""
     try:
-        user_ref = db.collection(USERS_COLLECTION).document(user_id)
-        user_ref.update({
-            'sessions': ArrayUnion([session_log])
-        })
+        delete_session(db, user_id, session_id, get_block_start_ts(db, user_id))
+        local_store.delete_session(user_id, session_id)
         return True
     except Exception as e:
-        print(f"Error adding session log to user {user_id}: {e}")
+        print(f"Error deleting session log {session_id} of user {user_id}: {e}")
         return False
 
-def get_session_logs_for_user(db, user_id):
-    """Fetches the session logs array for a user from Firestore."""
+def delete_all_session_logs_for_user(db, user_id) -> bool:
+    """Deletes every session log entry (and daily usage rollup) of a user."""
     try:
+        delete_all_sessions(db, user_id)
+        local_store.delete_user_sessions(user_id)
+        return True
+    except Exception as e:
+        print(f"Error deleting session logs of user {user_id}: {e}")
+        return False
+
+def get_session_logs_for_user(db, user_id, start_day: Optional[str] = None, end_day: Optional[str] = None):
+    """
+    Fetches a user's session logs that started between two YYYY-MM-DD days (inclusive), oldest first.
+
+    Served from the local store; leaving both days empty returns the whole history.
+    """
+    try:
+        if local_store.has_synced():
+            return local_store.get_sessions(user_id, start_day, end_day)
         if db is None:
             return []
-        user_ref = db.collection(USERS_COLLECTION).document(user_id)
-        doc = user_ref.get()
-        if doc.exists:
-            data = doc.to_dict()
-            return data.get('sessions', [])
-        return []
+        return query_sessions(db, user_id, start_day, end_day)
     except Exception as e:
         print(f"Error fetching session logs for user {user_id}: {e}")
         return []
 
+def find_overlapping_session_log(db, user_id, start_ts: int, stop_ts: int, exclude_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Returns one of a user's session logs overlapping [start_ts, stop_ts) (epoch seconds), or None.
+
+    Answered from the local store's interval index; before the first sync only
+    sessions from the neighbouring days are checked.
+    """
+    if local_store.has_synced():
+        overlapping = local_store.find_overlapping_sessions(user_id, start_ts, stop_ts, exclude_id)
+    else:
+        nearby_start = (datetime.fromtimestamp(start_ts) - timedelta(days=1)).strftime('%Y-%m-%d')
+        nearby_end = datetime.fromtimestamp(stop_ts).strftime('%Y-%m-%d')
+        overlapping = [other for other in get_session_logs_for_user(db, user_id, nearby_start, nearby_end)
+                       if other.get('id') != exclude_id and start_ts < other['stop_ts'] and stop_ts > other['start_ts']]
+    return overlapping[0] if overlapping else None
+
+def get_daily_usage_for_user(db, user_id, day: Optional[str] = None) -> Dict[str, Any]:
+    """Returns a user's usage for a YYYY-MM-DD day (today by default), summed from the local store."""
+    day = day or datetime.now().strftime('%Y-%m-%d')
+    if local_store.has_synced():
+        return local_store.get_daily_usage(user_id, day)
+    if db is None:
+        return {}
+    return get_daily_usage(db, user_id, day)
+
+def get_block_start_ts(db, user_id) -> Optional[int]:
+    """Returns when the user's current play block started (epoch seconds), or None if it started at midnight."""
+    try:
+        return get_daily_usage_for_user(db, user_id).get('block_started_ts')
+    except Exception as e:
+        print(f"Error reading play block start for user {user_id}: {e}")
+        return None
+
 # --- Firebase and Cloudinary Functions ---
 
 def initialize_firebase():
@@ -2786,72 +3195,18 @@ def initialize_firebase():
         return None
 
 
-def upload_image_to_cloudinary(image_path):
-    """Resizes an image to 128x128, uploads it to Cloudinary, and returns the URL."""
-    try:
-        with Image.open(image_path) as img:
-            # Resize the image to a fixed 128x128 size.
-            # Using LANCZOS for high-quality downsampling.
-            try:
-                # For Pillow 9.1.0+ (Resampling is a submodule)
-                resample_filter = Image.Resampling.LANCZOS
-            except AttributeError:
-                # For older Pillow versions
-                resample_filter = Image.LANCZOS # type: ignore
-            img_resized = img.resize((128, 128), resample=resample_filter)
-
-            # Save the resized image to an in-memory buffer to avoid creating temp files.
-            buffer = io.BytesIO()
-            # Preserve original format if it's a common web format, otherwise default to PNG.
-            img_format = img.format if img.format in ['JPEG', 'PNG', 'GIF'] else 'PNG'
-            img_resized.save(buffer, format=img_format)
-            buffer.seek(0)  # Rewind the buffer to the beginning
-
-            # Upload the buffer's content to Cloudinary
-            upload_result = cloudinary.uploader.upload(buffer, folder="game_sentry_avatars/")
-            return upload_result.get("secure_url")
-    except Exception as e:
-        print(f"Error processing or uploading image to Cloudinary: {e}")
-        messagebox.showerror("Cloudinary Error", f"Failed to upload image: {e}")
-        return None
-
-def delete_image_from_cloudinary(url: str) -> bool:
-    """Deletes an image from Cloudinary using its URL."""
-    if not url:
-        return False
-    try:
-        # Extract public_id from URL. Example: .../upload/v12345/folder/image.jpg
-        # The public_id is 'folder/image'
-        parts = url.split('/')
-        # Find the 'upload' part, the public_id starts after the version number
-        upload_index = parts.index('upload')
-        public_id_with_ext = '/'.join(parts[upload_index+2:])
-        public_id, _ = os.path.splitext(public_id_with_ext)
-        
-        result = cloudinary.uploader.destroy(f"game_sentry_avatars/{public_id}")
-        if result.get("result") == "ok":
-            print(f"Successfully deleted {public_id} from Cloudinary.")
-            return True
-        else:
-            print(f"Failed to delete {public_id} from Cloudinary. Result: {result}")
-            return False
-    except (ValueError, IndexError) as e:
-        print(f"Could not parse public_id from Cloudinary URL '{url}': {e}")
-        return False
-    except Exception as e:
-        print(f"Error deleting from Cloudinary: {e}")
-        return False
-
-def load_image_from_url(url: str, thumbnail_size: Optional[tuple] = None) -> Optional[Image.Image]:
-    """Downloads an image from a URL and returns it as a PIL Image object."""
+def load_image_from_url(url: str, thumbnail_size: Optional[tuple] = None) -> Optional['Image.Image']:
+    """Downloads an image from a URL and returns it as a PIL Image object; avatar sizes come from the avatar cache."""
+    if thumbnail_size and thumbnail_size[0] == thumbnail_size[1] and thumbnail_size[0] in AVATAR_SIZES:
+        return avatar_cache.get_image(url, thumbnail_size[0])
     try:
-        response = requests.get(url, stream=True)
+        response, content = fetch(url)
         response.raise_for_status() # Raise an exception for bad status codes
-        img = Image.open(io.BytesIO(response.content))
+        img = open_image(content, max(thumbnail_size) if thumbnail_size else None)
         if thumbnail_size:
-            img.thumbnail(thumbnail_size)
+            img.thumbnail(thumbnail_size, resample_filter())
         return img
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ResponseTooLarge) as e:
         print(f"Error downloading image from {url}: {e}")
         return None
     except Exception as e:
@@ -2961,7 +3316,8 @@ class ManualEntryDialog(tk.Toplevel):
         # Buttons
         btn_frame = ttk.Frame(self)
         btn_frame.pack(pady=15, anchor='center', fill='x')
-        ttk.Button(btn_frame, text="Save", command=self.save).pack(side=tk.LEFT, padx=20, ipadx=10, ipady=2)
+        self.save_button = ttk.Button(btn_frame, text="Save", command=self.save)
+        self.save_button.pack(side=tk.LEFT, padx=20, ipadx=10, ipady=2)
         ttk.Button(btn_frame, text="Cancel", command=self.destroy).pack(side=tk.LEFT, padx=20, ipadx=10, ipady=2)
 
         # Update duration on change
@@ -3007,19 +3363,6 @@ class ManualEntryDialog(tk.Toplevel):
             stop_dt = datetime.strptime(f"{date} {stop}", '%Y-%m-%d %H:%M')
             if stop_dt < start_dt:
                 stop_dt += timedelta(days=1)  # Allow overnight
-            duration = stop_dt - start_dt
-            duration_str = str(duration)
-            if duration.days > 0:
-                # Format as HH:MM:SS for >24h
-                total_seconds = duration.total_seconds()
-                h = int(total_seconds // 3600)
-                m = int((total_seconds % 3600) // 60)
-                s = int(total_seconds % 60)
-                duration_str = f"{h:02}:{m:02}:{s:02}"
-            else:
-                h, rem = divmod(duration.seconds, 3600)
-                m, s = divmod(rem, 60)
-                duration_str = f"{h:02}:{m:02}:{s:02}"
         except Exception:
             messagebox.showerror("Invalid Input", "Please enter valid date and time values.", parent=self)
             return
@@ -3027,22 +3370,27 @@ class ManualEntryDialog(tk.Toplevel):
             messagebox.showerror("Invalid Time Range", "Start time cannot be after stop time.", parent=self)
             return
         # Overlap check
-        sessions = get_session_logs_for_user(self.db, self.user['id'])
-        for other in sessions:
-            try:
-                other_start = datetime.strptime(other.get('start', ''), '%Y-%m-%d %H:%M:%S')
-                other_stop = datetime.strptime(other.get('stop', ''), '%Y-%m-%d %H:%M:%S')
-            except Exception:
-                continue
-            if (start_dt < other_stop and stop_dt > other_start):
-                messagebox.showerror("Time Overlap", f"The new time range overlaps with another session (from {other.get('start','')} to {other.get('stop','')}).", parent=self)
+        new_session = new_session_record(start_dt, stop_dt)
+        other = find_overlapping_session_log(self.db, self.user['id'], new_session['start_ts'], new_session['stop_ts'])
+        if other is not None:
+            messagebox.showerror("Time Overlap", f"The new time range overlaps with another session (from {other.get('start','')} to {other.get('stop','')}).", parent=self)
+            return
+        # Add entry; the dialog stays up (without accepting a second click) until it is saved
+        self.save_button.config(state=tk.DISABLED)
+
+        def on_saved(session_id: Optional[str]):
+            if not self.winfo_exists():
+                if session_id is not None:
+                    self.on_success()
                 return
-        # Add entry
-        user_doc = self.db.collection(USERS_COLLECTION).document(self.user['id'])
-        sessions.append({'start': start_dt.strftime('%Y-%m-%d %H:%M:%S'), 'stop': stop_dt.strftime('%Y-%m-%d %H:%M:%S'), 'duration': duration_str})
-        user_doc.update({'sessions': sessions})
-        self.on_success()
-        self.destroy()
+            if session_id is None:
+                # Keep the dialog open so the entry can be saved again
+                self.save_button.config(state=tk.NORMAL)
+                messagebox.showerror("Save Failed", "Could not save the session entry. Please try again.", parent=self)
+                return
+            self.on_success()
+            self.destroy()
+        run_in_background(self.master, lambda: add_session_log_to_user(self.db, self.user['id'], new_session), on_saved)
 
 class ToggleSwitch(tk.Canvas):
     def __init__(self, parent, variable, width=36, height=20, on_color="#4caf50", off_color="#e0e0e0", knob_color="#fff", command=None):
@@ -3079,6 +3427,149 @@ class ToggleSwitch(tk.Canvas):
         if self.command:
             self.command()
 
+class SessionLogTable(ttk.Frame):
+    """
+    A session log table that only materializes the rows currently in view.
+
+    Rows are kept as plain dicts and the Treeview holds just ``visible_rows``
+    items, which are swapped out as the user scrolls. Pages are requested from
+    ``fetch_page(cursor) -> (entries, next_cursor)`` on a background thread when
+    the view nears the end of what has been loaded; a ``next_cursor`` of None
+    means there is nothing more to fetch.
+    """
+    def __init__(self, parent, columns, headings, fetch_page, visible_rows=15, empty_text="No session logs found."):
+        super().__init__(parent)
+        self.columns = columns
+        self.fetch_page = fetch_page
+        self.visible_rows = visible_rows
+        self.empty_text = empty_text
+        self.rows: List[Dict[str, Any]] = []
+        self.offset = 0
+        self.cursor: Any = None
+        self.has_more = True
+        self.loading = False
+
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", height=visible_rows, selectmode="browse")
+        for column, heading in zip(columns, headings):
+            self.tree.heading(column, text=heading)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.status_label = ttk.Label(self, text="Loading...")
+        self.status_label.grid(row=1, column=0, columnspan=2, pady=(5, 0))
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_to(self.offset - 3))  # Linux wheel up
+        self.tree.bind("<Button-5>", lambda e: self.scroll_to(self.offset + 3))  # Linux wheel down
+        self.tree.bind("<Up>", lambda e: self._move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self._move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.scroll_to(self.offset - self.visible_rows))
+        self.tree.bind("<Next>", lambda e: self.scroll_to(self.offset + self.visible_rows))
+
+        self._load_more()
+
+    def selected_entry(self) -> Optional[Dict[str, Any]]:
+        """Returns the entry of the selected row, if any."""
+        selection = self.tree.selection()
+        if not selection:
+            return None
+        return next((row for row in self.rows[self.offset:self.offset + self.visible_rows] if row['iid'] == selection[0]), None)
+
+    def scroll_to(self, offset: int):
+        max_offset = max(0, len(self.rows) - self.visible_rows)
+        self.offset = max(0, min(offset, max_offset))
+        self._render()
+        # Prefetch once the view is within a screen of the loaded rows' end
+        if self.offset + 2 * self.visible_rows >= len(self.rows):
+            self._load_more()
+        return "break"
+
+    def _render(self):
+        """Rebuilds the Treeview items for the rows currently in view."""
+        selection = self.tree.selection()
+        self.tree.delete(*self.tree.get_children())
+        for row in self.rows[self.offset:self.offset + self.visible_rows]:
+            self.tree.insert("", "end", iid=row['iid'], values=tuple(row[column] for column in self.columns))
+        if selection and self.tree.exists(selection[0]):
+            self.tree.selection_set(selection[0])
+        # Leave room past the end of the loaded rows while more pages exist
+        total = len(self.rows) + (self.visible_rows if self.has_more else 0)
+        if total <= self.visible_rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.offset / total, (self.offset + self.visible_rows) / total)
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            total = len(self.rows) + (self.visible_rows if self.has_more else 0)
+            self.scroll_to(int(float(args[1]) * total))
+        elif args[0] == "scroll":
+            step = self.visible_rows if args[2] == "pages" else 1
+            self.scroll_to(self.offset + int(args[1]) * step)
+
+    def _on_mousewheel(self, event):
+        return self.scroll_to(self.offset - int(event.delta / 120) * 3)
+
+    def _move_selection(self, step: int):
+        items = self.tree.get_children()
+        selection = self.tree.selection()
+        if not items:
+            return "break"
+        index = items.index(selection[0]) + step if selection else 0
+        if index < 0:
+            self.scroll_to(self.offset - 1)
+            index = 0
+        elif index >= len(items):
+            self.scroll_to(self.offset + 1)
+            index = len(self.tree.get_children()) - 1
+        items = self.tree.get_children()
+        if items:
+            self.tree.selection_set(items[index])
+        return "break"
+
+    def _load_more(self):
+        if self.loading or not self.has_more:
+            return
+        self.loading = True
+        cursor = self.cursor
+
+        def fetch():
+            try:
+                entries, next_cursor = self.fetch_page(cursor)
+                error = None
+            except Exception as e:
+                entries, next_cursor, error = [], None, e
+            try:
+                self.after(0, lambda: self._on_page(entries, next_cursor, error))
+            except (RuntimeError, tk.TclError):
+                pass  # The table was closed while the page was loading
+
+        threading.Thread(target=fetch, daemon=True).start()
+
+    def _on_page(self, entries: List[Dict[str, Any]], next_cursor: Any, error: Optional[Exception]):
+        if not self.winfo_exists():
+            return
+        self.loading = False
+        if error is not None:
+            print(f"Error loading session logs: {error}")
+            self.has_more = False
+            self.status_label.config(text="Could not load session logs.")
+            return
+        self.rows.extend(entries)
+        self.cursor = next_cursor
+        self.has_more = next_cursor is not None
+        if not self.rows:
+            self.status_label.config(text=self.empty_text)
+        else:
+            more = "+" if self.has_more else ""
+            self.status_label.config(text=f"{len(self.rows)}{more} sessions")
+        self._render()
+        # A short page (e.g. after filtering) may not fill the view yet
+        if self.has_more and self.offset + 2 * self.visible_rows >= len(self.rows):
+            self._load_more()
+
 if __name__ == "__main__":
     app = GameSentryApp()
     app.mainloop()
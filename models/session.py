@@ -1 +1,141 @@
- 
\ No newline at end of file
+"""
+Session log helpers for Game Sentry.
+
+Sessions are stored as versioned records of integers:
+
+    schema_version   - SESSION_SCHEMA_VERSION
+    start_ts         - epoch seconds the session started
+    stop_ts          - epoch seconds the session stopped
+    duration_seconds - seconds played
+    day              - local YYYY-MM-DD the session started on
+
+Version 1 records (and entries of the old 'sessions' array) stored 'start',
+'stop' and 'duration' as formatted strings; ``session_record`` reads both, and
+``session_log_entry`` adds the display strings the UI shows.
+"""
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict
+
+SESSION_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DAY_FORMAT = '%Y-%m-%d'
+SESSION_SCHEMA_VERSION = 2
+SESSION_RECORD_FIELDS = ('schema_version', 'start_ts', 'stop_ts', 'duration_seconds', 'day')
+# Distinct session times remembered by parse_session_time.
+PARSE_CACHE_SIZE = 4096
+# Exactly what SESSION_TIME_FORMAT produces (zero-padded ASCII digits); only these take the fast path.
+SESSION_TIME_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', re.ASCII)
+
+
+def duration_to_seconds(duration_str: str) -> int:
+    """Converts an 'HH:MM:SS' duration string to seconds; malformed values count as 0."""
+    time_parts = duration_str.split(':')
+    if len(time_parts) != 3:
+        return 0
+    try:
+        hours, minutes, seconds = (int(part) for part in time_parts)
+    except ValueError:
+        return 0
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def seconds_to_duration(seconds: float) -> str:
+    """Formats a number of seconds as an 'HH:MM:SS' duration string."""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02}:{(seconds % 3600) // 60:02}:{seconds % 60:02}"
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_session_time(value: str) -> datetime:
+    """
+    Parses a 'YYYY-MM-DD HH:MM:SS' session time; raises ValueError if it is malformed.
+
+    Values shaped exactly like SESSION_TIME_FORMAT output take the
+    ``fromisoformat`` fast path, which agrees with ``strptime`` on them; anything
+    else goes through ``strptime`` so the accepted inputs and errors stay the same.
+    Results are memoized, as the same times are parsed over and over.
+    """
+    if SESSION_TIME_PATTERN.fullmatch(value):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, SESSION_TIME_FORMAT)
+
+
+def session_start(session: Dict[str, Any]) -> datetime:
+    """Parses a session's start time; raises ValueError if it is malformed."""
+    return parse_session_time(session.get('start', ''))
+
+
+def session_record(session: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the current-version record for a session of any schema version.
+
+    Legacy string records are converted; raises KeyError/ValueError if their start time is missing or malformed.
+    """
+    if session.get('schema_version', 1) >= SESSION_SCHEMA_VERSION:
+        return {field: session[field] for field in SESSION_RECORD_FIELDS}
+    start_dt = parse_session_time(session['start'])
+    start_ts = int(start_dt.timestamp())
+    duration_seconds = duration_to_seconds(session.get('duration') or '00:00:00')
+    try:
+        stop_ts = int(parse_session_time(session.get('stop', '')).timestamp())
+    except ValueError:
+        stop_ts = start_ts + duration_seconds
+    return {
+        'schema_version': SESSION_SCHEMA_VERSION,
+        'start_ts': start_ts,
+        'stop_ts': stop_ts,
+        'duration_seconds': duration_seconds,
+        'day': start_dt.strftime(DAY_FORMAT),
+    }
+
+
+def session_log_entry(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds the 'start', 'stop' and 'duration' display strings to a current-version session record."""
+    return dict(
+        record,
+        start=datetime.fromtimestamp(record['start_ts']).strftime(SESSION_TIME_FORMAT),
+        stop=datetime.fromtimestamp(record['stop_ts']).strftime(SESSION_TIME_FORMAT),
+        duration=seconds_to_duration(record['duration_seconds']),
+    )
+
+
+def new_session_record(start: datetime, stop: datetime) -> Dict[str, Any]:
+    """Builds the current-version record for a session played between two local times."""
+    start_ts = int(start.timestamp())
+    stop_ts = int(stop.timestamp())
+    return {
+        'schema_version': SESSION_SCHEMA_VERSION,
+        'start_ts': start_ts,
+        'stop_ts': stop_ts,
+        'duration_seconds': stop_ts - start_ts,
+        'day': start.strftime(DAY_FORMAT),
+    }
+
+
+def _benchmark(count: int = 100_000):
+    """Times parse_session_time against strptime on unique and on repeated session times."""
+    base = datetime(2025, 1, 1)
+    unique = [(base + timedelta(seconds=37 * i)).strftime(SESSION_TIME_FORMAT) for i in range(count)]
+    repeated = [unique[i % 500] for i in range(count)]
+    for label, values in (('unique', unique), ('repeated', repeated)):
+        parse_session_time.cache_clear()
+        started = time.perf_counter()
+        for value in values:
+            datetime.strptime(value, SESSION_TIME_FORMAT)
+        strptime_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        for value in values:
+            parse_session_time(value)
+        fast_seconds = time.perf_counter() - started
+        print(f"{count} {label} times: strptime {strptime_seconds * 1000:.1f} ms, "
+              f"parse_session_time {fast_seconds * 1000:.1f} ms ({strptime_seconds / fast_seconds:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
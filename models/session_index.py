@@ -0,0 +1,47 @@
+"""Sorted interval index over one kid's sessions, for overlap checks and time-window lookups."""
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class SessionIntervalIndex:
+    """
+    Keeps one kid's sessions sorted by start time.
+
+    Sessions are half-open [start_ts, stop_ts) intervals in epoch seconds.
+    Window lookups bisect the sorted starts; overlap checks only look back as
+    far as the longest session, so both cost O(log n + k) for k matches.
+    """
+    def __init__(self, sessions: Iterable[Tuple[str, int, int]] = ()):
+        self._starts: List[Tuple[int, str]] = []  # sorted (start_ts, session_id)
+        self._intervals: Dict[str, Tuple[int, int]] = {}  # {session_id: (start_ts, stop_ts)}
+        # Upper bound on any indexed session's length; removals don't lower it, which only widens the look-back
+        self._max_duration = 0
+        for session_id, start_ts, stop_ts in sessions:
+            self.add(session_id, start_ts, stop_ts)
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def add(self, session_id: str, start_ts: int, stop_ts: int):
+        """Adds a session, replacing any earlier interval stored under the same ID."""
+        self.remove(session_id)
+        insort(self._starts, (start_ts, session_id))
+        self._intervals[session_id] = (start_ts, stop_ts)
+        self._max_duration = max(self._max_duration, stop_ts - start_ts)
+
+    def remove(self, session_id: str):
+        interval = self._intervals.pop(session_id, None)
+        if interval is None:
+            return
+        del self._starts[bisect_left(self._starts, (interval[0], session_id))]
+
+    def starting_between(self, start_ts: Optional[int], stop_ts: Optional[int]) -> List[str]:
+        """IDs of the sessions that started in [start_ts, stop_ts), oldest first; a None bound leaves that end open."""
+        low = 0 if start_ts is None else bisect_left(self._starts, (start_ts,))
+        high = len(self._starts) if stop_ts is None else bisect_left(self._starts, (stop_ts,))
+        return [session_id for _, session_id in self._starts[low:high]]
+
+    def overlapping(self, start_ts: int, stop_ts: int) -> List[str]:
+        """IDs of the sessions whose interval overlaps [start_ts, stop_ts), oldest first."""
+        candidates = self.starting_between(start_ts - self._max_duration, stop_ts)
+        return [session_id for session_id in candidates if self._intervals[session_id][1] > start_ts]
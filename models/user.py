@@ -2,6 +2,12 @@
 from typing import Dict, Any, Optional
 from datetime import datetime
 
-# ...
-# (Paste user model/validation logic here)
-# ... 
\ No newline at end of file
+# Fields returned by profile listings. Anything else on a user document (such
+# as the legacy 'sessions' array) is left on the server.
+USER_PROFILE_FIELDS = [
+    'username', 'role', 'avatar_url', 'avatar_public_id', 'dob',
+    'max_session_minutes', 'max_daily_minutes', 'rest_minutes', 'rest_duration_minutes', 'enforce_rest',
+    'lunch_start_time', 'lunch_end_time', 'enforce_lunch_routine',
+    'allowed_start_time', 'allowed_end_time',
+    'created_at', 'updated_at',
+]
@@ -0,0 +1,237 @@
+"""
+Disk-backed avatar cache for Game Sentry.
+
+Avatars are downloaded once, decoded, and stored as PNG thumbnails at every
+size the UI shows (``AVATAR_SIZES``) under the app data folder. Entries are
+revalidated with ``If-None-Match``/``If-Modified-Since`` at most once every
+``REVALIDATE_SECONDS``, the folder is kept under a size cap by evicting the
+least recently used avatars, and ``PhotoImage``s are kept in memory so
+reopening a dialog does no network or disk I/O at all.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from services.http_client import fetch
+from utils.image_utils import make_thumbnails, open_image
+from utils.lazy_import import LazyModule
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+ImageTk = LazyModule('PIL.ImageTk')
+
+AVATAR_CACHE_DIR = 'avatar_cache'
+# Thumbnail sizes (square bounding boxes, in pixels) used by the kid selection dialog, the profile editor and the kid view.
+AVATAR_SIZES = (64, 100, 150)
+# How long a cached avatar is trusted before it is revalidated with the server.
+REVALIDATE_SECONDS = 24 * 60 * 60
+# Least recently used avatars are evicted once the thumbnails take more than this.
+MAX_CACHE_BYTES = 50 * 1024 * 1024
+# PhotoImages kept in memory, most recently used first.
+MAX_MEMORY_PHOTOS = 128
+# Avatars downloaded at once by load_image_async.
+AVATAR_LOAD_WORKERS = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS avatars (
+    url TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    checked_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS avatars_by_last_used ON avatars (last_used);
+"""
+
+
+class AvatarCache:
+    """
+    Avatar thumbnails keyed by URL, on disk and in memory.
+
+    ``get_image``, ``load_image_async`` and ``invalidate`` are safe to call
+    from any thread; ``cached_photo`` and ``photo_from_image`` create or hand
+    out Tk images and so belong on the Tk thread, which should never wait on a
+    download. Worker threads never drop PhotoImages themselves: they mark the
+    URL stale, and the Tk thread drops the in-memory copies on its next lookup. Concurrent requests for the same
+    URL share one download.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._photos: 'OrderedDict[Tuple[str, int], Any]' = OrderedDict()  # {(url, size): PhotoImage}
+        self._stale_urls: Set[str] = set()  # URLs whose PhotoImages the Tk thread should drop
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._conn = sqlite3.connect(os.path.join(cache_dir, 'avatars.db'), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._conn.close()
+
+    def _thumbnail_path(self, key: str, size: int) -> str:
+        return os.path.join(self.cache_dir, f"{key}-{size}.png")
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def _entry(self, url: str) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM avatars WHERE url = ?", (url,)).fetchone()
+
+    def _drop_stale_photos(self):
+        """Drops the PhotoImages of avatars that changed or were removed; Tk thread only, call with the lock held."""
+        if not self._stale_urls:
+            return
+        for memory_key in [memory_key for memory_key in self._photos if memory_key[0] in self._stale_urls]:
+            del self._photos[memory_key]
+        self._stale_urls.clear()
+
+    def cached_photo(self, url: str, size: int) -> Optional[Any]:
+        """The in-memory PhotoImage of an avatar, or None if it isn't in memory; never touches disk or network."""
+        memory_key = (url, size)
+        with self._lock:
+            self._drop_stale_photos()
+            photo = self._photos.get(memory_key)
+            if photo is not None:
+                self._photos.move_to_end(memory_key)
+            return photo
+
+    def photo_from_image(self, url: str, size: int, img: 'Image.Image') -> Any:
+        """Turns an image returned by ``get_image`` into a PhotoImage and keeps it in memory. Tk thread only."""
+        photo = ImageTk.PhotoImage(img)
+        with self._lock:
+            self._drop_stale_photos()
+            self._photos[(url, size)] = photo
+            while len(self._photos) > MAX_MEMORY_PHOTOS:
+                self._photos.popitem(last=False)
+        return photo
+
+    def load_image_async(self, url: str, size: int) -> 'Future[Optional[Image.Image]]':
+        """Runs ``get_image`` on a small shared thread pool; cancel the future to drop a load that hasn't started."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=AVATAR_LOAD_WORKERS, thread_name_prefix='avatar')
+            return self._executor.submit(self.get_image, url, size)
+
+    def get_image(self, url: str, size: int) -> Optional['Image.Image']:
+        """The avatar at ``url`` as a PIL image fitted in a ``size`` square, downloading or revalidating it if needed."""
+        if size not in AVATAR_SIZES:
+            raise ValueError(f"Avatar size {size} is not one of {AVATAR_SIZES}")
+        with self._url_lock(url):
+            entry = self._entry(url)
+            if entry is not None and time.time() - entry['checked_at'] >= REVALIDATE_SECONDS:
+                entry = self._refresh(url, entry)
+            elif entry is None:
+                entry = self._refresh(url, None)
+            if entry is None:
+                return None
+            path = self._thumbnail_path(entry['key'], size)
+            try:
+                with open(path, 'rb') as f:
+                    img = open_image(f.read())
+            except OSError as e:
+                # A thumbnail went missing or is corrupt; forget the entry so the next call downloads it again
+                logger.warning(f"Dropping unreadable cached avatar {path}: {e}")
+                self._remove(url, entry['key'])
+                return None
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE avatars SET last_used = ? WHERE url = ?", (time.time(), url))
+            return img
+
+    def _refresh(self, url: str, entry: Optional[sqlite3.Row]) -> Optional[sqlite3.Row]:
+        """Downloads the avatar, or revalidates the cached one; serves the stale copy if the server can't be reached."""
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            response, content = fetch(url, headers=headers)
+            if response.status_code == 304 and entry is not None:
+                with self._lock, self._conn:
+                    self._conn.execute("UPDATE avatars SET checked_at = ? WHERE url = ?", (time.time(), url))
+                return self._entry(url)
+            response.raise_for_status()
+            thumbnails = make_thumbnails(content, AVATAR_SIZES)
+        except Exception as e:
+            if entry is not None:
+                logger.warning(f"Could not revalidate avatar {url}, using the cached copy: {e}")
+                return entry
+            logger.error(f"Error downloading avatar from {url}: {e}")
+            return None
+        self._store(url, thumbnails, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        with self._lock:
+            # The Tk thread drops the in-memory copies of the old image
+            self._stale_urls.add(url)
+        return self._entry(url)
+
+    def _store(self, url: str, thumbnails: Dict[int, 'Image.Image'], etag: Optional[str], last_modified: Optional[str]):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+        total_bytes = 0
+        for size, thumbnail in thumbnails.items():
+            path = self._thumbnail_path(key, size)
+            temp_path = path + '.tmp'
+            thumbnail.save(temp_path, format='PNG')
+            os.replace(temp_path, path)
+            total_bytes += os.path.getsize(path)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO avatars (url, key, etag, last_modified, checked_at, last_used, bytes) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, key, etag, last_modified, now, now, total_bytes))
+        self._evict()
+
+    def _remove(self, url: str, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM avatars WHERE url = ?", (url,))
+            self._stale_urls.add(url)
+        for size in AVATAR_SIZES:
+            try:
+                os.remove(self._thumbnail_path(key, size))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        """Removes least recently used avatars until the cache is back under its size cap."""
+        with self._lock:
+            total_bytes = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM avatars").fetchone()[0]
+            if total_bytes <= self.max_bytes:
+                return
+            for row in self._conn.execute("SELECT url, key, bytes FROM avatars ORDER BY last_used").fetchall():
+                if total_bytes <= self.max_bytes:
+                    break
+                logger.debug(f"Evicting cached avatar {row['url']}")
+                self._remove(row['url'], row['key'])
+                total_bytes -= row['bytes']
+
+    def cached_urls(self) -> List[str]:
+        with self._lock:
+            return [row['url'] for row in self._conn.execute("SELECT url FROM avatars").fetchall()]
+
+    def invalidate(self, url: str):
+        """Forgets an avatar, e.g. after it was deleted from Cloudinary."""
+        entry = self._entry(url)
+        if entry is not None:
+            self._remove(url, entry['key'])
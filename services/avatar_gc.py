@@ -0,0 +1,317 @@
+"""
+Orphaned avatar sweeper for Game Sentry.
+
+An avatar stops being referenced when its user picks a new one or is deleted,
+and uploads can be abandoned if the app closes before they are attached to a
+user. Instead of deleting images one at a time as that happens,
+``AvatarSweeper`` periodically lists every stored avatar, diffs the list
+against the avatars user profiles reference, and deletes the rest in batches
+of ``DELETE_BATCH_SIZE``. Images younger than ``MIN_ORPHAN_AGE`` are left
+alone, so an upload that hasn't been attached to its user yet is never swept;
+neither is an older image the upload queue just handed out again
+(``AvatarUploadQueue.recently_used``), which is checked again before each batch.
+
+Preview what a sweep would delete (nothing is deleted without --apply):
+
+    python -m services.avatar_gc              # the local avatars folder vs the local store's users
+    python -m services.avatar_gc --demo       # a stand-in for Cloudinary with a few orphans
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from services.avatar_uploads import AVATAR_FOLDER, public_id_from_url
+from utils.lazy_import import LazyModule
+
+logger = logging.getLogger(__name__)
+
+cloudinary_api = LazyModule('cloudinary.api')
+
+# Most public_ids Cloudinary's Admin API deletes in one call.
+DELETE_BATCH_SIZE = 100
+# Resources listed per Admin API call.
+LIST_PAGE_SIZE = 500
+# Younger images may be uploads that haven't been attached to their user yet.
+MIN_ORPHAN_AGE = timedelta(hours=1)
+SWEEP_INTERVAL = timedelta(days=1)
+# Let startup finish before the first sweep.
+SWEEP_START_DELAY_SECONDS = 120
+LOCAL_AVATAR_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+
+class CloudinaryAvatarStore:
+    """The avatars folder on Cloudinary, through the Admin API."""
+    def __init__(self, folder: str = AVATAR_FOLDER):
+        self.folder = folder
+        self.name = f"cloudinary:{folder}"
+
+    def list_assets(self) -> Iterator[Tuple[str, datetime]]:
+        """Yields (public_id, created_at) for every image in the folder."""
+        cursor = None
+        while True:
+            options = {'type': 'upload', 'prefix': f"{self.folder}/", 'max_results': LIST_PAGE_SIZE}
+            if cursor:
+                options['next_cursor'] = cursor
+            page = cloudinary_api.resources(**options)
+            for resource in page.get('resources', []):
+                created_at = datetime.fromisoformat(resource['created_at'].replace('Z', '+00:00'))
+                yield resource['public_id'], created_at
+            cursor = page.get('next_cursor')
+            if not cursor:
+                return
+
+    def delete_assets(self, asset_ids: List[str]) -> Dict[str, bool]:
+        """Deletes up to DELETE_BATCH_SIZE images in one call; returns whether each one is gone."""
+        deleted = cloudinary_api.delete_resources(asset_ids).get('deleted', {})
+        return {asset_id: deleted.get(asset_id) in ('deleted', 'not_found') for asset_id in asset_ids}
+
+
+class DirectoryAvatarStore:
+    """
+    Avatar images in a local folder, identified by ``prefix`` + file name without extension.
+
+    Used for the legacy ``avatars`` folder, and as a local stand-in for Cloudinary.
+    """
+    def __init__(self, directory: str, prefix: str = ''):
+        self.directory = directory
+        self.prefix = prefix
+        self.name = f"folder:{directory}"
+
+    def _files(self) -> Dict[str, os.DirEntry]:
+        if not os.path.isdir(self.directory):
+            return {}
+        return {self.prefix + os.path.splitext(entry.name)[0]: entry for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.lower().endswith(LOCAL_AVATAR_EXTENSIONS)}
+
+    def list_assets(self) -> Iterator[Tuple[str, datetime]]:
+        for asset_id, entry in self._files().items():
+            yield asset_id, datetime.fromtimestamp(entry.stat().st_mtime, timezone.utc)
+
+    def delete_assets(self, asset_ids: List[str]) -> Dict[str, bool]:
+        files = self._files()
+        results = {}
+        for asset_id in asset_ids:
+            try:
+                if asset_id in files:
+                    os.remove(files[asset_id].path)
+                results[asset_id] = True
+            except OSError as e:
+                logger.warning(f"Could not delete avatar file {files[asset_id].path}: {e}")
+                results[asset_id] = False
+        return results
+
+
+def referenced_avatar_ids(users: Iterable[Dict[str, Any]]) -> Set[str]:
+    """Every ID an avatar in use can be stored under: public_ids, and the public_id and file name in each URL."""
+    referenced = set()
+    for user in users:
+        if user.get('avatar_public_id'):
+            referenced.add(user['avatar_public_id'])
+        url = user.get('avatar_url')
+        if url:
+            public_id = public_id_from_url(url)
+            if public_id:
+                referenced.add(public_id)
+            referenced.add(os.path.splitext(url.rstrip('/').rsplit('/', 1)[-1])[0])
+    return referenced
+
+
+def find_orphans(store: Any, referenced: Set[str], min_age: timedelta = MIN_ORPHAN_AGE,
+                 now: Optional[datetime] = None) -> Tuple[int, List[str]]:
+    """Returns how many avatars the store holds and the IDs of those not referenced and older than ``min_age``."""
+    now = now or datetime.now(timezone.utc)
+    scanned = 0
+    orphans = []
+    for asset_id, created_at in store.list_assets():
+        scanned += 1
+        if asset_id not in referenced and now - created_at >= min_age:
+            orphans.append(asset_id)
+    return scanned, sorted(orphans)
+
+
+def sweep(store: Any, users: List[Dict[str, Any]], dry_run: bool = False, batch_size: int = DELETE_BATCH_SIZE,
+          min_age: timedelta = MIN_ORPHAN_AGE, recently_used: Callable[[], Set[str]] = set) -> Dict[str, Any]:
+    """
+    Deletes the avatars in ``store`` that no user references, ``batch_size`` at a time.
+
+    IDs returned by ``recently_used()`` are kept (and listed as skipped) even
+    if unreferenced. With ``dry_run`` nothing is deleted; the report lists
+    what would be. A failed batch is reported and left for the next sweep.
+    """
+    report = {'store': store.name, 'dry_run': dry_run, 'scanned': 0, 'orphans': [], 'deleted': [], 'failed': [],
+              'skipped': []}
+    if not users:
+        # An empty user list (e.g. a failed query) would make every avatar look orphaned
+        logger.warning(f"Not sweeping {store.name}: no user profiles to compare against")
+        return report
+    report['scanned'], report['orphans'] = find_orphans(store, referenced_avatar_ids(users), min_age)
+    if dry_run:
+        return report
+    for start in range(0, len(report['orphans']), batch_size):
+        # Asked per batch: listing and deleting a large folder takes a while
+        in_use = recently_used()
+        candidates = report['orphans'][start:start + batch_size]
+        batch = [asset_id for asset_id in candidates if asset_id not in in_use]
+        report['skipped'].extend(asset_id for asset_id in candidates if asset_id in in_use)
+        if not batch:
+            continue
+        try:
+            results = store.delete_assets(batch)
+        except Exception as e:
+            logger.warning(f"Could not delete a batch of {len(batch)} avatars from {store.name}: {e}")
+            report['failed'].extend(batch)
+            continue
+        report['deleted'].extend(asset_id for asset_id in batch if results.get(asset_id))
+        report['failed'].extend(asset_id for asset_id in batch if not results.get(asset_id))
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    verb = "would delete" if report['dry_run'] else "deleted"
+    count = len(report['orphans']) if report['dry_run'] else len(report['deleted'])
+    lines = [f"{report['store']}: {report['scanned']} avatars, {len(report['orphans'])} orphaned, {verb} {count}"]
+    if report['failed']:
+        lines.append(f"  {len(report['failed'])} could not be deleted and will be retried on the next sweep")
+    if report['skipped']:
+        lines.append(f"  {len(report['skipped'])} were just reused by an upload and are kept")
+    for asset_id in report['orphans']:
+        lines.append(f"  {'-' if asset_id in report['deleted'] else ' '} {asset_id}")
+    return '\n'.join(lines)
+
+
+class AvatarSweeper:
+    """
+    Sweeps orphaned avatars from each store on a daemon thread.
+
+    A sweep runs once every ``interval`` (the last run is remembered in the
+    local store), and ``sweep_soon`` wakes the thread early, e.g. after
+    avatars were replaced or users deleted. ``on_deleted(asset_ids)`` runs on
+    that thread after each store is swept; ``recently_used`` is passed on to
+    ``sweep``.
+    """
+    def __init__(self, store_meta: Any, stores: List[Any], list_users: Callable[[], List[Dict[str, Any]]],
+                 interval: timedelta = SWEEP_INTERVAL, on_deleted: Optional[Callable[[List[str]], None]] = None,
+                 recently_used: Callable[[], Set[str]] = set):
+        self.store_meta = store_meta
+        self.stores = stores
+        self.list_users = list_users
+        self.interval = interval
+        self.on_deleted = on_deleted
+        self.recently_used = recently_used
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def sweep_soon(self):
+        self._wake_event.set()
+
+    def run_once(self, dry_run: bool = False) -> List[Dict[str, Any]]:
+        """Sweeps every store against a fresh list of user profiles and returns the reports."""
+        users = self.list_users()
+        reports = []
+        for store in self.stores:
+            try:
+                report = sweep(store, users, dry_run=dry_run, recently_used=self.recently_used)
+            except Exception as e:
+                logger.warning(f"Could not sweep orphaned avatars from {store.name}: {e}")
+                continue
+            logger.info(format_report(report))
+            if report['deleted'] and self.on_deleted is not None:
+                self.on_deleted(report['deleted'])
+            reports.append(report)
+        if not dry_run:
+            self.store_meta.set_meta('last_avatar_sweep', datetime.now().isoformat())
+        return reports
+
+    def _sweep_due(self) -> bool:
+        last_sweep = self.store_meta.get_meta('last_avatar_sweep')
+        if last_sweep is None:
+            return True
+        try:
+            return datetime.now() - datetime.fromisoformat(last_sweep) >= self.interval
+        except ValueError:
+            return True
+
+    def _run(self):
+        self._stop_event.wait(SWEEP_START_DELAY_SECONDS)
+        while not self._stop_event.is_set():
+            woken = self._wake_event.is_set()
+            self._wake_event.clear()
+            if woken or self._sweep_due():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.warning(f"Avatar sweep failed, will retry: {e}")
+            # Check hourly whether a sweep is due, or sooner if woken
+            self._wake_event.wait(60 * 60)
+
+
+def _demo():
+    """Sweeps a temporary folder standing in for the Cloudinary avatars folder: a dry run, then for real."""
+    import tempfile
+
+    directory = tempfile.mkdtemp()
+    old = (datetime.now() - timedelta(days=2)).timestamp()
+    for name, age in (('in-use', old), ('replaced', old), ('deleted-user', old), ('just-uploaded', None)):
+        path = os.path.join(directory, f"{name}.png")
+        with open(path, 'wb') as f:
+            f.write(b'stand-in avatar')
+        if age is not None:
+            os.utime(path, (age, age))
+    store = DirectoryAvatarStore(directory, prefix=f"{AVATAR_FOLDER}/")
+    users = [
+        {'id': 'a', 'avatar_public_id': f"{AVATAR_FOLDER}/in-use"},
+        {'id': 'b'},
+    ]
+    print(format_report(sweep(store, users, dry_run=True)))
+    print(format_report(sweep(store, users, batch_size=1)))
+    print(f"left in the stand-in folder: {sorted(os.listdir(directory))}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Report (or delete) avatar images no user references.")
+    parser.add_argument('--dir', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'avatars'),
+                        help="Avatar folder to sweep (default: the app's avatars folder).")
+    parser.add_argument('--apply', action='store_true', help="Delete the orphans instead of only listing them.")
+    parser.add_argument('--demo', action='store_true', help="Sweep a temporary stand-in folder instead.")
+    args = parser.parse_args(argv)
+    if args.demo:
+        _demo()
+        return 0
+
+    from services.local_store import LOCAL_STORE_FILE, LocalStore
+    from utils.config import get_app_data_dir
+
+    store_path = os.path.join(get_app_data_dir(), LOCAL_STORE_FILE)
+    if not os.path.exists(store_path):
+        print(f"No local store at {store_path}; run the app once to sync the user list.")
+        return 1
+    local_store = LocalStore(store_path)
+    try:
+        if not local_store.has_synced():
+            print("The local store hasn't synced the user list yet; run the app once first.")
+            return 1
+        users = local_store.list_users()
+    finally:
+        local_store.close()
+    print(format_report(sweep(DirectoryAvatarStore(args.dir), users, dry_run=not args.apply)))
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Background avatar uploads for Game Sentry.
+
+Avatars are resized to a 128x128 payload and uploaded from a worker thread so
+the user management window never waits on Cloudinary. Payloads are addressed
+by their SHA-256 hash: the hash is the Cloudinary ``public_id``, and a local
+index of hashes already uploaded lets an identical image reuse the existing
+URL without any network call.
+
+Try the queue against a local stand-in for the upload API with:
+
+    python -m services.avatar_uploads
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Set
+
+from utils.image_utils import encode, open_image, resize
+from utils.lazy_import import LazyModule
+
+logger = logging.getLogger(__name__)
+
+cloudinary_uploader = LazyModule('cloudinary.uploader')
+
+AVATAR_FOLDER = 'game_sentry_avatars'
+AVATAR_UPLOAD_INDEX_FILE = 'avatar_uploads.json'
+AVATAR_PAYLOAD_SIZE = (128, 128)
+# An avatar handed out this recently may not be attached to its user yet, so
+# the orphan sweeper must not delete it even if nothing references it.
+RECENTLY_USED_SECONDS = 60 * 60
+
+# upload(payload, public_id) -> {'secure_url': ..., 'public_id': ...}
+UploadFunction = Callable[[bytes, str], Dict[str, Any]]
+ProgressCallback = Callable[[str], None]
+DoneCallback = Callable[[Optional[Dict[str, str]], Optional[Exception]], None]
+
+
+def avatar_payload(image_path: str) -> bytes:
+    """The bytes actually uploaded for an avatar: the image resized to 128x128, in its own format if it's a web format."""
+    img = open_image(image_path, max(AVATAR_PAYLOAD_SIZE))
+    return encode(resize(img, AVATAR_PAYLOAD_SIZE), img.format).getvalue()
+
+
+def payload_hash(payload: bytes) -> str:
+    return hashlib.sha256(payload).hexdigest()
+
+
+def public_id_from_url(url: str) -> Optional[str]:
+    """The public_id in a Cloudinary delivery URL (.../upload/v12345/folder/image.jpg -> 'folder/image'), or None."""
+    parts = url.split('/')
+    try:
+        upload_index = parts.index('upload')
+    except ValueError:
+        return None
+    path = parts[upload_index + 1:]
+    # The version segment is optional
+    if path and path[0][:1] == 'v' and path[0][1:].isdigit():
+        path = path[1:]
+    return os.path.splitext('/'.join(path))[0] or None
+
+
+def upload_to_cloudinary(payload: bytes, public_id: str) -> Dict[str, Any]:
+    """Uploads an avatar payload to the avatars folder; an existing image with the same public_id is returned as-is."""
+    return cloudinary_uploader.upload(
+        io.BytesIO(payload), public_id=f"{AVATAR_FOLDER}/{public_id}", overwrite=False, unique_filename=False)
+
+
+class AvatarUploadQueue:
+    """
+    Uploads avatars one at a time on a background thread.
+
+    ``submit`` returns immediately. ``on_progress(message)`` and
+    ``on_done(avatar, error)`` run on the worker thread; ``avatar`` is
+    ``{'url': ..., 'public_id': ...}`` on success. Failed uploads are retried
+    with exponential backoff before ``on_done`` reports the last error.
+    """
+    def __init__(self, upload: UploadFunction, index_path: str, max_attempts: int = 4,
+                 initial_backoff: float = 2.0, max_backoff: float = 30.0):
+        self.upload = upload
+        self.index_path = index_path
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._index = self._load_index()  # {payload hash: {'url': ..., 'public_id': ...}}
+        self._handed_out: Dict[str, float] = {}  # {public_id: time.monotonic() it was last returned}
+        self._queue: Deque[tuple] = deque()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def _load_index(self) -> Dict[str, Dict[str, str]]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable avatar upload index {self.index_path}: {e}")
+            return {}
+
+    def _save_index(self):
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(temp_path, self.index_path)
+
+    def submit(self, image_path: str, on_done: DoneCallback, on_progress: Optional[ProgressCallback] = None):
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._queue.append((image_path, on_done, on_progress))
+            self._condition.notify()
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._queue)
+
+    def recently_used(self) -> Set[str]:
+        """public_ids returned in the last RECENTLY_USED_SECONDS, dedupe-index hits included."""
+        cutoff = time.monotonic() - RECENTLY_USED_SECONDS
+        with self._condition:
+            for public_id in [public_id for public_id, used_at in self._handed_out.items() if used_at < cutoff]:
+                del self._handed_out[public_id]
+            return set(self._handed_out)
+
+    def forget(self, *public_ids: str):
+        """Drops avatars from the dedupe index, e.g. after they were deleted from Cloudinary."""
+        with self._condition:
+            stale = [digest for digest, avatar in self._index.items() if avatar['public_id'] in public_ids]
+            for digest in stale:
+                del self._index[digest]
+            if stale:
+                self._save_index()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                image_path, on_done, on_progress = self._queue.popleft()
+            avatar, error = None, None
+            try:
+                avatar = self._upload_one(image_path, on_progress or (lambda message: None))
+            except Exception as e:
+                logger.error(f"Could not upload avatar {image_path}: {e}")
+                error = e
+            try:
+                on_done(avatar, error)
+            except Exception as e:
+                logger.error(f"Avatar upload callback failed: {e}", exc_info=True)
+
+    def _upload_one(self, image_path: str, on_progress: ProgressCallback) -> Dict[str, str]:
+        on_progress("Preparing avatar…")
+        payload = avatar_payload(image_path)
+        digest = payload_hash(payload)
+        with self._condition:
+            known = self._index.get(digest)
+            if known is not None:
+                # An index hit can point at an old image nobody references any more; keep the sweeper off it
+                self._handed_out[known['public_id']] = time.monotonic()
+        if known is not None:
+            on_progress("Avatar already uploaded")
+            return dict(known)
+        backoff = self.initial_backoff
+        for attempt in range(1, self.max_attempts + 1):
+            on_progress("Uploading avatar…" if attempt == 1 else f"Uploading avatar (attempt {attempt} of {self.max_attempts})…")
+            try:
+                # The hash is the public_id, so Cloudinary also keeps a single copy of identical uploads
+                result = self.upload(payload, digest[:32])
+                break
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    raise
+                logger.warning(f"Avatar upload failed, retrying in {backoff:.0f}s: {e}")
+                on_progress(f"Upload failed, retrying in {backoff:.0f}s…")
+                with self._condition:
+                    if self._condition.wait_for(lambda: self._stopped, backoff):
+                        raise
+                backoff = min(backoff * 2, self.max_backoff)
+        avatar = {'url': result['secure_url'], 'public_id': result['public_id']}
+        with self._condition:
+            self._index[digest] = avatar
+            # Cloudinary returns an existing image with this public_id as-is, old upload date included
+            self._handed_out[avatar['public_id']] = time.monotonic()
+            self._save_index()
+        on_progress("Avatar uploaded")
+        return dict(avatar)
+
+
+def _demo():
+    """Uploads a few avatars to an in-process stand-in for Cloudinary that fails every other call."""
+    import tempfile
+
+    stored: Dict[str, bytes] = {}
+    calls = {'count': 0}
+
+    def flaky_upload(payload: bytes, public_id: str) -> Dict[str, Any]:
+        calls['count'] += 1
+        if calls['count'] % 2 == 1:
+            raise ConnectionError("stand-in upload API dropped the request")
+        full_id = f"{AVATAR_FOLDER}/{public_id}"
+        stored[full_id] = payload
+        return {'secure_url': f"https://example.invalid/{full_id}.png", 'public_id': full_id}
+
+    avatars_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pictures', 'avatars')
+    paths = sorted(os.path.join(avatars_dir, name) for name in os.listdir(avatars_dir))[:2]
+    paths.append(paths[0])  # the same picture again is served from the index
+    queue = AvatarUploadQueue(flaky_upload, os.path.join(tempfile.mkdtemp(), AVATAR_UPLOAD_INDEX_FILE), initial_backoff=0.1)
+    done = threading.Semaphore(0)
+    for path in paths:
+        start = time.perf_counter()
+
+        def on_done(avatar, error, path=path, start=start):
+            print(f"{os.path.basename(path)}: {avatar or error} in {(time.perf_counter() - start) * 1000:.0f} ms")
+            done.release()
+        queue.submit(path, on_done, on_progress=lambda message: print(f"  {message}"))
+        done.acquire()
+    queue.stop()
+    print(f"{calls['count']} upload calls, {len(stored)} images stored for {len(paths)} avatars")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    _demo()
@@ -0,0 +1,399 @@
+"""
+Email notifications for Game Sentry, sent from a persisted outbox.
+
+Queuing an email only appends it to a JSON-lines outbox file, so callers on
+the Tk thread never wait on SMTP. ``EmailDispatcher`` sends the outbox from a
+single background thread over one authenticated SMTP connection, which is
+kept open while emails keep coming, closed after ``idle_timeout`` seconds
+without any, and reopened on demand. Messages survive restarts and offline
+periods; failures are retried with exponential backoff, and messages older
+than ``MAX_MESSAGE_AGE`` are dropped rather than sent late. A rejected login
+isn't retried: the outbox is held until the email settings change.
+
+Try it against a local stand-in SMTP server with:
+
+    python -m services.email_outbox
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.lazy_import import LazyModule
+
+logger = logging.getLogger(__name__)
+
+smtplib = LazyModule('smtplib')
+ssl = LazyModule('ssl')
+mime_text = LazyModule('email.mime.text')
+mime_multipart = LazyModule('email.mime.multipart')
+
+EMAIL_OUTBOX_FILE = 'email_outbox.log'
+SMTP_HOST = 'smtp.gmail.com'
+SMTP_PORT = 587
+# Seconds to wait for the SMTP server to connect or answer.
+SMTP_TIMEOUT = 20
+# Close the SMTP connection once no email has been queued for this long.
+IDLE_TIMEOUT_SECONDS = 60
+# A notification this old isn't worth sending any more.
+MAX_MESSAGE_AGE = timedelta(days=2)
+# Rewrite the outbox with only unsent messages once it grows past this size.
+COMPACT_BYTES = 64 * 1024
+
+
+def build_message(sender: str, recipients: List[str], subject: str, text: str, html: Optional[str] = None):
+    """A multipart/alternative email with a plain text part and an optional HTML part."""
+    msg = mime_multipart.MIMEMultipart('alternative')
+    msg['From'] = sender
+    msg['To'] = ', '.join(recipients)
+    msg['Subject'] = f"Game Sentry - {subject}"
+    msg.attach(mime_text.MIMEText(text, 'plain'))
+    if html:
+        msg.attach(mime_text.MIMEText(html, 'html'))
+    return msg
+
+
+class EmailOutbox:
+    """
+    Append-only, fsync'd record of queued emails.
+
+    Lines look like ``{"type": "queued", "id": ..., "subject": ..., "text": ..., "html": ..., "queued_at": ...}``
+    and ``{"type": "done", "id": ...}``; replaying them yields the emails not
+    sent yet. Senders and recipients are read from the settings when an email
+    is sent, so they aren't stored.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, Any]] = {}  # {message id: queued event}, oldest first
+        torn = self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if torn:
+            # Terminate a torn last line so the next event starts on a line of its own
+            self._file.write('\n')
+            self._file.flush()
+
+    def _load(self) -> bool:
+        """Rebuilds the pending messages from the outbox file; returns True if its last line is unterminated."""
+        if not os.path.exists(self.path):
+            return False
+        line = '\n'
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable email outbox line: {line!r}")
+                    continue
+                self._apply(event)
+        return not line.endswith('\n')
+
+    def _apply(self, event: Dict[str, Any]):
+        if event.get('type') == 'queued':
+            self._pending[event['id']] = event
+        elif event.get('type') == 'done':
+            self._pending.pop(event.get('id'), None)
+
+    def _append(self, event: Dict[str, Any]):
+        with self._lock:
+            self._file.write(json.dumps(event) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._apply(event)
+
+    def add(self, subject: str, text: str, html: Optional[str] = None) -> str:
+        message_id = uuid.uuid4().hex
+        self._append({'type': 'queued', 'id': message_id, 'subject': subject, 'text': text, 'html': html,
+                      'queued_at': datetime.now().isoformat()})
+        return message_id
+
+    def mark_done(self, message_id: str):
+        """Removes a message from the outbox, whether it was sent or given up on."""
+        self._append({'type': 'done', 'id': message_id})
+        if os.path.getsize(self.path) > COMPACT_BYTES:
+            self.compact()
+
+    def next_pending(self) -> Optional[Dict[str, Any]]:
+        """The oldest message not sent yet, or None."""
+        with self._lock:
+            return dict(next(iter(self._pending.values()))) if self._pending else None
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def compact(self):
+        """Atomically rewrites the outbox with only the unsent messages."""
+        with self._lock:
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for event in self._pending.values():
+                    f.write(json.dumps(event) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class EmailDispatcher:
+    """
+    Sends the outbox over a reused SMTP connection on a background thread.
+
+    ``get_settings()`` returns the email config ('email_enabled',
+    'email_address', 'email_password', 'email_recipients') and is read before
+    every email, so settings changes apply to emails already queued; queued
+    emails are dropped if notifications were switched off meanwhile. Call
+    ``wake`` after adding to the outbox or changing the settings.
+
+    If the server rejects the login, ``on_auth_error(error)`` runs on the
+    dispatcher thread and nothing more is sent until the address or password
+    changes.
+    """
+    def __init__(self, outbox: EmailOutbox, get_settings: Callable[[], Dict[str, Any]],
+                 host: str = SMTP_HOST, port: int = SMTP_PORT, use_tls: bool = True,
+                 idle_timeout: float = IDLE_TIMEOUT_SECONDS, initial_backoff: float = 10.0, max_backoff: float = 600.0,
+                 on_auth_error: Optional[Callable[[Exception], None]] = None):
+        self.outbox = outbox
+        self.get_settings = get_settings
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.idle_timeout = idle_timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.on_auth_error = on_auth_error
+        self._connection = None
+        self._connection_key: Optional[Tuple[str, str]] = None  # (address, password) it logged in with
+        self._rejected_key: Optional[Tuple[str, str]] = None  # (address, password) the server refused
+        self._condition = threading.Condition()
+        self._woken = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Starts sending, beginning with whatever the outbox kept from earlier runs."""
+        self._thread.start()
+
+    def wake(self):
+        with self._condition:
+            self._woken = True
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _wait(self, timeout: Optional[float]) -> bool:
+        """Waits until woken, stopped or ``timeout``; returns True if woken or stopped."""
+        with self._condition:
+            if not self._woken and not self._stopped:
+                self._condition.wait(timeout)
+            woken = self._woken or self._stopped
+            self._woken = False
+            return woken
+
+    def _run(self):
+        backoff = self.initial_backoff
+        while not self._stopped:
+            message = self.outbox.next_pending()
+            if message is None:
+                # Keep the connection for a burst of emails, then let it go
+                if not self._wait(self.idle_timeout if self._connection is not None else None):
+                    self._disconnect()
+                continue
+            if self._rejected_key is not None and self._rejected_key == self._credentials(self.get_settings()):
+                # Retrying the same login can't help; wait for wake() after the settings change
+                self._wait(None)
+                continue
+            try:
+                self._send(message)
+            except Exception as e:
+                if isinstance(e, smtplib.SMTPAuthenticationError):
+                    logger.error(f"The SMTP server rejected the email login; holding {self.outbox.pending_count()} "
+                                 f"email(s) until the email settings change: {e}")
+                    self._rejected_key = self._credentials(self.get_settings())
+                    self._disconnect()
+                    if self.on_auth_error is not None:
+                        try:
+                            self.on_auth_error(e)
+                        except Exception as callback_error:
+                            logger.error(f"Email login error callback failed: {callback_error}", exc_info=True)
+                    continue
+                if self._is_permanent(e):
+                    logger.error(f"Dropping email '{message['subject']}' the server refused: {e}")
+                    self.outbox.mark_done(message['id'])
+                    continue
+                logger.warning(f"Could not send email '{message['subject']}', retrying in {backoff:.0f}s: {e}")
+                self._disconnect()
+                # New emails don't cut the backoff short; only stop does
+                with self._condition:
+                    self._condition.wait_for(lambda: self._stopped, backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            self.outbox.mark_done(message['id'])
+            backoff = self.initial_backoff
+        self._disconnect()
+
+    @staticmethod
+    def _credentials(settings: Dict[str, Any]) -> Tuple[str, str]:
+        return settings.get('email_address', ''), settings.get('email_password', '')
+
+    @staticmethod
+    def _is_permanent(error: Exception) -> bool:
+        """Whether retrying can't help: the server rejected the sender, the recipients or the message itself."""
+        if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)):
+            return True
+        return isinstance(error, smtplib.SMTPDataError) and error.smtp_code >= 500
+
+    def _send(self, message: Dict[str, Any]):
+        try:
+            queued_at = datetime.fromisoformat(message['queued_at'])
+        except (KeyError, ValueError):
+            queued_at = datetime.now()
+        if datetime.now() - queued_at > MAX_MESSAGE_AGE:
+            logger.info(f"Dropping email '{message['subject']}' queued at {queued_at}; it's too old to send")
+            return
+        settings = self.get_settings()
+        recipients = settings.get('email_recipients') or []
+        if not settings.get('email_enabled') or not settings.get('email_address') or not recipients:
+            logger.info(f"Dropping email '{message['subject']}': email notifications are off")
+            return
+        msg = build_message(settings['email_address'], recipients, message['subject'], message['text'], message.get('html'))
+        reused = self._connection is not None
+        connection = self._connect(settings)
+        try:
+            connection.sendmail(settings['email_address'], recipients, msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            if not reused:
+                raise
+            # The server dropped the idle connection we kept; log in again and retry once
+            self._disconnect()
+            self._connect(settings).sendmail(settings['email_address'], recipients, msg.as_string())
+        logger.info(f"Email notification sent: {message['subject']}")
+
+    def _connect(self, settings: Dict[str, Any]):
+        """The open SMTP connection, or a new one if there's none or the credentials changed."""
+        key = self._credentials(settings)
+        if self._connection is not None and self._connection_key == key:
+            return self._connection
+        self._disconnect()
+        connection = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        try:
+            if self.use_tls:
+                connection.starttls(context=ssl.create_default_context())
+            if key[1]:
+                connection.login(*key)
+        except Exception:
+            connection.close()
+            raise
+        self._connection, self._connection_key = connection, key
+        return connection
+
+    def _disconnect(self):
+        connection, self._connection, self._connection_key = self._connection, None, None
+        if connection is None:
+            return
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+
+def _demo():
+    """Sends a few emails through a local stand-in SMTP server that starts late and drops idle connections."""
+    import socket
+    import socketserver
+    import tempfile
+
+    received: List[str] = []
+    connections = {'count': 0}
+
+    class StandInSMTPHandler(socketserver.StreamRequestHandler):
+        def reply(self, line: str):
+            self.wfile.write(line.encode('ascii') + b'\r\n')
+
+        def handle(self):
+            connections['count'] += 1
+            self.reply('220 stand-in ESMTP')
+            data_lines = None
+            for raw in self.rfile:
+                line = raw.decode('utf-8').rstrip('\r\n')
+                if data_lines is not None:
+                    if line == '.':
+                        received.append('\n'.join(data_lines))
+                        data_lines = None
+                        self.reply('250 OK: queued')
+                    else:
+                        data_lines.append(line[1:] if line.startswith('..') else line)
+                    continue
+                verb = line[:4].upper()
+                if verb == 'EHLO':
+                    self.reply('250 stand-in')
+                elif verb in ('HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP'):
+                    self.reply('250 OK')
+                elif verb == 'DATA':
+                    data_lines = []
+                    self.reply('354 End data with <CR><LF>.<CR><LF>')
+                elif verb == 'QUIT':
+                    self.reply('221 Bye')
+                    return
+                else:
+                    self.reply('502 Command not implemented')
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    outbox_path = os.path.join(tempfile.mkdtemp(), EMAIL_OUTBOX_FILE)
+    # Queued by an earlier run that closed before sending it
+    earlier_run = EmailOutbox(outbox_path)
+    earlier_run.add("Queued Before Restart", "Sent after a restart.")
+    earlier_run.close()
+    outbox = EmailOutbox(outbox_path)
+    settings = {'email_enabled': True, 'email_address': 'sentry@example.invalid', 'email_password': '',
+                'email_recipients': ['parent@example.invalid']}
+    dispatcher = EmailDispatcher(outbox, lambda: settings, host='127.0.0.1', port=port, use_tls=False,
+                                 idle_timeout=0.5, initial_backoff=0.2)
+    print(f"{outbox.pending_count()} email(s) in the outbox at startup; the SMTP server is down")
+    dispatcher.start()
+    for subject in ("Gaming Session Started", "Gaming Session Stopped"):
+        outbox.add(subject, f"{subject} (demo)")
+        dispatcher.wake()
+    time.sleep(0.5)
+
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', port), StandInSMTPHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def wait_for(count: int):
+        deadline = time.monotonic() + 10
+        while len(received) < count and time.monotonic() < deadline:
+            time.sleep(0.05)
+    try:
+        wait_for(3)
+        print(f"server up: {len(received)} emails over {connections['count']} connection(s)")
+        time.sleep(1)  # past the idle timeout, so the connection is closed
+        outbox.add("Daily Gaming Limit Reached", "Limit reached (demo)")
+        dispatcher.wake()
+        wait_for(4)
+        print(f"after going idle: {len(received)} emails over {connections['count']} connection(s), "
+              f"{outbox.pending_count()} left in the outbox")
+    finally:
+        dispatcher.stop()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    _demo()
@@ -1,10 +1,448 @@
 """Firebase service logic for Game Sentry."""
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
-from google.cloud.firestore_v1 import ArrayUnion
-from typing import Any, Dict, List, Optional
-from datetime import datetime, timezone
-
-# ...
-# (Paste all Firebase-related functions here)
-# ... 
\ No newline at end of file
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import hashlib
+import threading
+import uuid
+from urllib.parse import quote
+from collections import Counter
+
+from models.session import DAY_FORMAT, session_log_entry, session_record
+from models.user import USER_PROFILE_FIELDS
+from utils.lazy_import import LazyModule
+
+# The Firestore client library takes the better part of a second to import;
+# load it on first use so importing this module stays cheap.
+firestore = LazyModule('firebase_admin.firestore')
+api_exceptions = LazyModule('google.api_core.exceptions')
+
+USERS_COLLECTION = 'users'
+SESSIONS_SUBCOLLECTION = 'sessions'
+DAILY_USAGE_SUBCOLLECTION = 'daily_usage'
+USERNAMES_COLLECTION = 'usernames'
+# Firestore rejects write batches with more than 500 operations.
+MAX_BATCH_SIZE = 500
+
+# --- Read Accounting ---
+
+class ReadCounter:
+    """
+    Counts Firestore round trips (document gets, query streams, get_all batches) by label.
+
+    Used to check that a screen costs a fixed number of round trips no matter
+    how many kids there are; take ``total()`` before and after loading it.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    def record(self, label: str, round_trips: int = 1):
+        with self._lock:
+            self._counts[label] += round_trips
+
+    def total(self) -> int:
+        with self._lock:
+            return sum(self._counts.values())
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+read_counter = ReadCounter()
+
+# --- User Profiles ---
+
+def list_user_profiles(db: Any) -> List[Dict[str, Any]]:
+    """Lists every user's profile fields (with 'id'), ordered by username, without downloading session history."""
+    read_counter.record('user profiles')
+    query = db.collection(USERS_COLLECTION).select(USER_PROFILE_FIELDS).order_by('username')
+    profiles = []
+    for doc in query.stream():
+        profile = doc.to_dict()
+        profile['id'] = doc.id
+        profiles.append(profile)
+    return profiles
+
+# --- Username Reservations ---
+#
+# usernames/{key} holds {'user_id', 'username'} for every username in use, where
+# the key is the lowercased username. Creating, renaming and deleting a user
+# read and write the reservation in the same transaction as the user document,
+# so two users can never end up with the same name, even from different PCs.
+
+class UsernameTakenError(Exception):
+    """Raised when a username is already reserved by another user."""
+
+def username_key(username: str) -> str:
+    """Returns the reservation document ID for a username (case-insensitive)."""
+    key = quote(username.strip().lower(), safe='')
+    # Firestore rejects '.', '..' and '__*__' as document IDs. quote() always escapes '%',
+    # so percent-encoding those characters can't collide with another username's key.
+    if key in ('.', '..'):
+        return key.replace('.', '%2E')
+    if len(key) >= 4 and key.startswith('__') and key.endswith('__'):
+        return '%5F' + key[1:]
+    return key
+
+def username_ref(db: Any, username: str) -> Any:
+    return db.collection(USERNAMES_COLLECTION).document(username_key(username))
+
+def get_username_owner(db: Any, username: str) -> Optional[str]:
+    """Returns the ID of the user holding a username, with a single point read; None if it is free."""
+    read_counter.record('username')
+    doc = username_ref(db, username).get()
+    return doc.to_dict().get('user_id') if doc.exists else None
+
+def create_user_profile(db: Any, user_data: Dict[str, Any]) -> str:
+    """Creates a user and reserves their username in one transaction; returns the new user ID or raises UsernameTakenError."""
+    user_ref = db.collection(USERS_COLLECTION).document()
+    reservation_ref = username_ref(db, user_data['username'])
+
+    @firestore.transactional
+    def _create(transaction):
+        if reservation_ref.get(transaction=transaction).exists:
+            raise UsernameTakenError(user_data['username'])
+        transaction.create(reservation_ref, {'user_id': user_ref.id, 'username': user_data['username']})
+        transaction.set(user_ref, user_data)
+
+    _create(db.transaction())
+    return user_ref.id
+
+def update_user_profile(db: Any, user_id: str, user_data: Dict[str, Any]):
+    """Updates a user's fields, moving their username reservation in the same transaction if the username changes."""
+    user_ref = db.collection(USERS_COLLECTION).document(user_id)
+
+    @firestore.transactional
+    def _update(transaction):
+        new_username = user_data.get('username')
+        if new_username is None:
+            transaction.update(user_ref, user_data)
+            return
+        # Transactions must do all their reads before any write
+        user_snapshot = user_ref.get(transaction=transaction)
+        old_username = (user_snapshot.to_dict() or {}).get('username') if user_snapshot.exists else None
+        new_reservation = username_ref(db, new_username).get(transaction=transaction)
+        owner = new_reservation.to_dict().get('user_id') if new_reservation.exists else None
+        if owner is not None and owner != user_id:
+            raise UsernameTakenError(new_username)
+        old_reservation = None
+        if old_username and username_key(old_username) != username_key(new_username):
+            old_reservation = username_ref(db, old_username).get(transaction=transaction)
+        transaction.update(user_ref, user_data)
+        transaction.set(new_reservation.reference, {'user_id': user_id, 'username': new_username})
+        if old_reservation is not None and old_reservation.exists and old_reservation.to_dict().get('user_id') == user_id:
+            transaction.delete(old_reservation.reference)
+
+    _update(db.transaction())
+
+def delete_user_profile(db: Any, user_id: str):
+    """Deletes a user document and releases their username in one transaction."""
+    user_ref = db.collection(USERS_COLLECTION).document(user_id)
+
+    @firestore.transactional
+    def _delete(transaction):
+        snapshot = user_ref.get(transaction=transaction)
+        username = (snapshot.to_dict() or {}).get('username') if snapshot.exists else None
+        reservation = username_ref(db, username).get(transaction=transaction) if username else None
+        transaction.delete(user_ref)
+        if reservation is not None and reservation.exists and reservation.to_dict().get('user_id') == user_id:
+            transaction.delete(reservation.reference)
+
+    _delete(db.transaction())
+
+def reserve_existing_usernames(db: Any) -> Dict[str, int]:
+    """Creates the reservations of users that predate the usernames index; reports how many were reserved or clash."""
+    report = {'reserved': 0, 'existing': 0, 'conflicts': 0}
+    for profile in list_user_profiles(db):
+        username = profile.get('username')
+        if not username:
+            continue
+        owner = get_username_owner(db, username)
+        if owner == profile['id']:
+            report['existing'] += 1
+        elif owner is not None:
+            print(f"  Username '{username}' of user {profile['id']} is already held by user {owner}; rename one of them")
+            report['conflicts'] += 1
+        else:
+            try:
+                username_ref(db, username).create({'user_id': profile['id'], 'username': username})
+                report['reserved'] += 1
+            except api_exceptions.AlreadyExists:
+                print(f"  Username '{username}' of user {profile['id']} was reserved meanwhile; rename one of them")
+                report['conflicts'] += 1
+    return report
+
+# --- Session Storage ---
+#
+# Each session lives in its own document under users/{user_id}/sessions/{session_id}
+# holding a versioned record of integers (see models.session): 'start_ts' (used
+# for range queries and ordering), 'stop_ts', 'duration_seconds' and 'day' (the
+# local YYYY-MM-DD the session started on). Older documents with string times
+# are still read; ``python -m services.session_migration --upgrade-schema``
+# rewrites them.
+#
+# Every write that adds, edits or removes a session also adjusts the per-day
+# rollup at users/{user_id}/daily_usage/{YYYY-MM-DD} in the same write batch,
+# using atomic increments so concurrent writers from several PCs never lose an
+# update. A rollup holds:
+#   total_seconds, session_count   - all sessions that started that day
+#   block_seconds, block_started_ts - sessions since the current play block began
+#   first_start_ts, last_stop_ts   - earliest start / latest stop of the day
+
+def session_document(session_log: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the Firestore document for a session log entry of any schema version (the current-version record)."""
+    return session_record(session_log)
+
+def legacy_session_id(session_log: Dict[str, Any]) -> str:
+    """Derives a stable document ID for a session from the legacy array, so re-running a migration is idempotent."""
+    key = f"{session_log.get('start', '')}|{session_log.get('stop', '')}|{session_log.get('duration', '')}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+def new_session_id() -> str:
+    """Generates an ID for a newly recorded session."""
+    return uuid.uuid4().hex
+
+def day_to_timestamp(day: str) -> int:
+    """Returns the epoch seconds of local midnight at the start of a YYYY-MM-DD day."""
+    return int(datetime.strptime(day, DAY_FORMAT).timestamp())
+
+def sessions_collection(db: Any, user_id: str) -> Any:
+    return db.collection(USERS_COLLECTION).document(user_id).collection(SESSIONS_SUBCOLLECTION)
+
+def daily_usage_ref(db: Any, user_id: str, day: str) -> Any:
+    return db.collection(USERS_COLLECTION).document(user_id).collection(DAILY_USAGE_SUBCOLLECTION).document(day)
+
+def _filter_start_days(query: Any, start_day: Optional[str], end_day: Optional[str]) -> Any:
+    """Restricts a sessions query to sessions that started between two days (inclusive)."""
+    if start_day:
+        query = query.where('start_ts', '>=', day_to_timestamp(start_day))
+    if end_day:
+        next_day = (datetime.strptime(end_day, DAY_FORMAT) + timedelta(days=1)).strftime(DAY_FORMAT)
+        query = query.where('start_ts', '<', day_to_timestamp(next_day))
+    return query
+
+def sessions_query(db: Any, user_id: str, start_day: Optional[str] = None, end_day: Optional[str] = None) -> Any:
+    """Builds a query for a user's sessions that started between two days (inclusive), oldest first."""
+    return _filter_start_days(sessions_collection(db, user_id), start_day, end_day).order_by('start_ts')
+
+def session_from_snapshot(doc: Any) -> Dict[str, Any]:
+    """Converts a session document snapshot into a session log dict (record plus display strings) with its 'id'."""
+    session = session_log_entry(session_record(doc.to_dict()))
+    session['id'] = doc.id
+    return session
+
+def query_sessions(db: Any, user_id: str, start_day: Optional[str] = None, end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Fetches a user's sessions that started between two days (inclusive), oldest first."""
+    read_counter.record('sessions')
+    return [session_from_snapshot(doc) for doc in sessions_query(db, user_id, start_day, end_day).stream()]
+
+def query_sessions_page(db: Any, user_id: Optional[str], start_day: Optional[str], end_day: Optional[str],
+                        page_size: int, start_after: Any = None) -> Tuple[List[Dict[str, Any]], Any]:
+    """
+    Fetches one page of sessions between two days (inclusive), newest first.
+
+    With ``user_id`` None every user's sessions are paged through one collection
+    group query. Returns the page (each session carrying its 'user_id') and the
+    cursor to pass as ``start_after`` for the next page, or None after the last page.
+    """
+    if user_id:
+        query = sessions_collection(db, user_id)
+    else:
+        query = db.collection_group(SESSIONS_SUBCOLLECTION)
+    query = _filter_start_days(query, start_day, end_day).order_by('start_ts', direction=firestore.Query.DESCENDING)
+    if start_after is not None:
+        query = query.start_after(start_after)
+    read_counter.record('sessions page')
+    docs = list(query.limit(page_size).stream())
+    sessions = []
+    for doc in docs:
+        session = session_from_snapshot(doc)
+        session['user_id'] = doc.reference.parent.parent.id
+        sessions.append(session)
+    next_cursor = docs[-1] if len(docs) == page_size else None
+    return sessions, next_cursor
+
+def query_all_sessions(db: Any, start_day: Optional[str] = None, end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Fetches every user's sessions that started between two days (inclusive) in one collection group query.
+
+    Each session carries the owning 'user_id'. Filtering on start_ts needs the
+    collection group index on sessions.start_ts (Firestore prints a link to
+    create it on first use).
+    """
+    query = _filter_start_days(db.collection_group(SESSIONS_SUBCOLLECTION), start_day, end_day)
+    read_counter.record('sessions (all users)')
+    sessions = []
+    for doc in query.order_by('start_ts').stream():
+        session = session_from_snapshot(doc)
+        session['user_id'] = doc.reference.parent.parent.id
+        sessions.append(session)
+    return sessions
+
+def _rollup_change(document: Dict[str, Any], sign: int, block_start_ts: Optional[int]) -> Dict[str, Any]:
+    """Builds the increments that add (sign=1) or remove (sign=-1) a session from its day's rollup."""
+    seconds = document['duration_seconds']
+    change = {
+        'day': document['day'],
+        'total_seconds': firestore.Increment(sign * seconds),
+        'session_count': firestore.Increment(sign),
+    }
+    # The block start only applies to the day it falls on; without one the block began at midnight.
+    if (block_start_ts is None or document['start_ts'] >= block_start_ts
+            or datetime.fromtimestamp(block_start_ts).strftime(DAY_FORMAT) != document['day']):
+        change['block_seconds'] = firestore.Increment(sign * seconds)
+    if sign > 0:
+        change['first_start_ts'] = firestore.Minimum(document['start_ts'])
+        change['last_stop_ts'] = firestore.Maximum(document['stop_ts'])
+    return change
+
+def _refresh_daily_usage_bounds(db: Any, user_id: str, day: str):
+    """Recomputes a day's first start and last stop after a session was edited or removed."""
+    sessions = query_sessions(db, user_id, day, day)
+    if sessions:
+        bounds = {
+            'first_start_ts': min(session['start_ts'] for session in sessions),
+            'last_stop_ts': max(session['stop_ts'] for session in sessions),
+        }
+    else:
+        bounds = {'first_start_ts': firestore.DELETE_FIELD, 'last_stop_ts': firestore.DELETE_FIELD}
+    daily_usage_ref(db, user_id, day).set(bounds, merge=True)
+
+def add_session(db: Any, user_id: str, session_log: Dict[str, Any], session_id: Optional[str] = None,
+                block_start_ts: Optional[int] = None) -> str:
+    """
+    Stores a session log entry and counts it in its day's rollup; returns the session ID.
+
+    The session document is created, not overwritten, so retrying with the same
+    session ID raises AlreadyExists instead of counting the session twice.
+    """
+    session_id = session_id or new_session_id()
+    document = session_document(session_log)
+    batch = db.batch()
+    batch.create(sessions_collection(db, user_id).document(session_id), document)
+    batch.set(daily_usage_ref(db, user_id, document['day']), _rollup_change(document, 1, block_start_ts), merge=True)
+    batch.commit()
+    return session_id
+
+def update_session(db: Any, user_id: str, session_id: str, session_log: Dict[str, Any],
+                   block_start_ts: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Replaces the times of an existing session and moves its time between rollups; returns the replaced document.
+
+    Runs in a transaction that reads the stored session, so the time taken off
+    the old day's rollup is what was actually stored even if another device
+    edited the session meanwhile. Raises NotFound if the session was deleted.
+    """
+    session_ref = sessions_collection(db, user_id).document(session_id)
+    document = session_document(session_log)
+
+    @firestore.transactional
+    def _update(transaction):
+        snapshot = session_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            raise api_exceptions.NotFound(f"Session {session_id} of user {user_id} no longer exists")
+        old_document = session_record(snapshot.to_dict())
+        transaction.set(session_ref, document)
+        transaction.set(daily_usage_ref(db, user_id, old_document['day']), _rollup_change(old_document, -1, block_start_ts), merge=True)
+        transaction.set(daily_usage_ref(db, user_id, document['day']), _rollup_change(document, 1, block_start_ts), merge=True)
+        return old_document
+
+    read_counter.record('session (transaction)')
+    old_document = _update(db.transaction())
+    for day in {old_document['day'], document['day']}:
+        _refresh_daily_usage_bounds(db, user_id, day)
+    return old_document
+
+def delete_session(db: Any, user_id: str, session_id: str, block_start_ts: Optional[int] = None) -> bool:
+    """
+    Deletes a single session and removes it from its day's rollup; returns False if it was already gone.
+
+    The rollup is adjusted from the stored session inside a transaction, so a
+    concurrent edit or delete cannot make it count the session wrongly.
+    """
+    session_ref = sessions_collection(db, user_id).document(session_id)
+
+    @firestore.transactional
+    def _delete(transaction):
+        snapshot = session_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return None
+        document = session_record(snapshot.to_dict())
+        transaction.delete(session_ref)
+        transaction.set(daily_usage_ref(db, user_id, document['day']), _rollup_change(document, -1, block_start_ts), merge=True)
+        return document
+
+    read_counter.record('session (transaction)')
+    document = _delete(db.transaction())
+    if document is None:
+        return False
+    _refresh_daily_usage_bounds(db, user_id, document['day'])
+    return True
+
+def delete_all_sessions(db: Any, user_id: str) -> int:
+    """Deletes every session and daily rollup of a user in batches and returns how many sessions were removed."""
+    deleted = 0
+    user_ref = db.collection(USERS_COLLECTION).document(user_id)
+    for subcollection in (SESSIONS_SUBCOLLECTION, DAILY_USAGE_SUBCOLLECTION):
+        while True:
+            docs = list(user_ref.collection(subcollection).limit(MAX_BATCH_SIZE).stream())
+            if not docs:
+                break
+            batch = db.batch()
+            for doc in docs:
+                batch.delete(doc.reference)
+            batch.commit()
+            if subcollection == SESSIONS_SUBCOLLECTION:
+                deleted += len(docs)
+    return deleted
+
+# --- Daily Usage Rollups ---
+
+def empty_daily_usage(day: str) -> Dict[str, Any]:
+    return {'day': day, 'total_seconds': 0, 'session_count': 0, 'block_seconds': 0}
+
+def daily_usage_from_snapshot(doc: Any, day: str) -> Dict[str, Any]:
+    """Converts a rollup snapshot into a dict, filling in zeros for a day without sessions."""
+    daily_usage = empty_daily_usage(day)
+    if doc.exists:
+        daily_usage.update(doc.to_dict())
+    return daily_usage
+
+def get_daily_usage(db: Any, user_id: str, day: str) -> Dict[str, Any]:
+    """Reads a user's usage rollup for a YYYY-MM-DD day."""
+    read_counter.record('daily_usage')
+    return daily_usage_from_snapshot(daily_usage_ref(db, user_id, day).get(), day)
+
+def start_daily_usage_block(db: Any, user_id: str, day: str, block_start_ts: int):
+    """Starts a new play block (e.g. after a rest period); only sessions from then on count toward it."""
+    daily_usage_ref(db, user_id, day).set({'day': day, 'block_seconds': 0, 'block_started_ts': block_start_ts}, merge=True)
+
+def rebuild_daily_usage(db: Any, user_id: str) -> int:
+    """
+    Recomputes every daily rollup of a user from their sessions and returns how many days were written.
+
+    Play blocks restart at midnight, so any break taken today is forgotten.
+    """
+    rollups: Dict[str, Dict[str, Any]] = {}
+    for doc in sessions_collection(db, user_id).stream():
+        session = session_record(doc.to_dict())
+        seconds = session['duration_seconds']
+        stop_ts = session['stop_ts']
+        rollup = rollups.setdefault(session['day'], dict(empty_daily_usage(session['day']), first_start_ts=session['start_ts'], last_stop_ts=stop_ts))
+        rollup['total_seconds'] += seconds
+        rollup['block_seconds'] += seconds
+        rollup['session_count'] += 1
+        rollup['first_start_ts'] = min(rollup['first_start_ts'], session['start_ts'])
+        rollup['last_stop_ts'] = max(rollup['last_stop_ts'], stop_ts)
+
+    days = list(rollups.items())
+    for offset in range(0, len(days), MAX_BATCH_SIZE):
+        batch = db.batch()
+        for day, rollup in days[offset:offset + MAX_BATCH_SIZE]:
+            batch.set(daily_usage_ref(db, user_id, day), rollup)
+        batch.commit()
+    return len(days)
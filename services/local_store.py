@@ -0,0 +1,526 @@
+"""
+Local SQLite replica of Game Sentry's Firestore data.
+
+Every read the app makes (users, session logs, daily usage) is served from
+this store, so the UI paints immediately on launch and limits keep being
+enforced while Firestore is unreachable. ``LocalSync`` keeps the replica
+reconciled with Firestore from background threads.
+"""
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from models.session import DAY_FORMAT, SESSION_SCHEMA_VERSION, session_log_entry, session_record
+from models.session_index import SessionIntervalIndex
+from services.firebase_service import (
+    DAILY_USAGE_SUBCOLLECTION, SESSIONS_SUBCOLLECTION, day_to_timestamp, empty_daily_usage, list_user_profiles,
+    query_all_sessions, read_counter, username_key,
+)
+
+logger = logging.getLogger(__name__)
+
+LOCAL_STORE_FILE = 'game_sentry.db'
+# Sessions last at most a day, so one that started this long before the last
+# resync may have been uploaded after it.
+RESYNC_OVERLAP = timedelta(days=1)
+SESSION_COLUMNS = ('user_id', 'id', 'start', 'stop', 'duration', 'start_ts', 'stop_ts', 'duration_seconds', 'day')
+INSERT_SESSION_SQL = ("INSERT OR REPLACE INTO sessions (user_id, id, start, stop, duration, duration_seconds, start_ts, stop_ts, day, pending) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+# IDs bound per "IN (...)" query; older SQLite builds cap a statement at 999 parameters
+SQL_PARAM_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    start TEXT NOT NULL,
+    stop TEXT NOT NULL,
+    duration TEXT NOT NULL,
+    duration_seconds INTEGER NOT NULL,
+    start_ts INTEGER NOT NULL,
+    stop_ts INTEGER NOT NULL DEFAULT 0,
+    day TEXT NOT NULL,
+    pending INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, id)
+);
+CREATE INDEX IF NOT EXISTS sessions_by_user_start ON sessions (user_id, start_ts);
+CREATE INDEX IF NOT EXISTS sessions_by_user_day ON sessions (user_id, day);
+CREATE INDEX IF NOT EXISTS sessions_by_start ON sessions (start_ts, id);
+CREATE TABLE IF NOT EXISTS daily_usage (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    block_started_ts INTEGER,
+    PRIMARY KEY (user_id, day)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _end_of_day_ts(day: str) -> int:
+    next_day = (datetime.strptime(day, DAY_FORMAT) + timedelta(days=1)).strftime(DAY_FORMAT)
+    return day_to_timestamp(next_day)
+
+
+class LocalStore:
+    """
+    SQLite mirror of user profiles, session logs and play-block starts.
+
+    One connection is shared between the Tk thread and the sync threads and
+    every statement runs under a lock, so callers never need to coordinate.
+    Daily and block usage are summed from the local sessions, which keeps
+    them correct offline; the sums are kept in memory as running totals,
+    seeded on first read and updated as sessions are added, so the timer's
+    once-a-second usage check never queries the table. Per-user interval
+    indexes over the sessions are built on first use and kept in step with
+    every session write.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._indexes: Dict[str, SessionIntervalIndex] = {}
+        self._daily_usage: Dict[Tuple[str, str], Dict[str, Any]] = {}  # {(user_id, day): running totals}
+        self._username_owners: Optional[Dict[str, str]] = None  # {username_key: user_id}, rebuilt after user writes
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+            if 'pending' not in columns:
+                self._conn.execute("ALTER TABLE sessions ADD COLUMN pending INTEGER NOT NULL DEFAULT 0")
+            if 'stop_ts' not in columns:
+                self._conn.execute("ALTER TABLE sessions ADD COLUMN stop_ts INTEGER NOT NULL DEFAULT 0")
+                self._conn.execute("UPDATE sessions SET stop_ts = start_ts + duration_seconds")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Meta ---
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def has_synced(self) -> bool:
+        """True once a full sync with Firestore has completed at least once."""
+        return self.get_meta('last_full_sync') is not None
+
+    # --- Users ---
+
+    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def list_users(self) -> List[Dict[str, Any]]:
+        """Returns every user profile, ordered by username."""
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM users ORDER BY username").fetchall()
+        return [json.loads(row['data']) for row in rows]
+
+    def upsert_user(self, user_data: Dict[str, Any]):
+        """Stores a user profile (which must carry its 'id'); any legacy sessions array is dropped."""
+        profile = {key: value for key, value in user_data.items() if key != 'sessions'}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO users (id, username, data) VALUES (?, ?, ?)",
+                (profile['id'], profile.get('username', ''), json.dumps(profile)),
+            )
+            self._username_owners = None
+
+    def replace_users(self, profiles: Iterable[Dict[str, Any]]):
+        """Replaces all users with a full listing, dropping the sessions of users that no longer exist."""
+        profiles = list(profiles)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM users")
+            self._conn.executemany(
+                "INSERT INTO users (id, username, data) VALUES (?, ?, ?)",
+                [(p['id'], p.get('username', ''), json.dumps({k: v for k, v in p.items() if k != 'sessions'})) for p in profiles],
+            )
+            self._conn.execute("DELETE FROM sessions WHERE user_id NOT IN (SELECT id FROM users)")
+            self._conn.execute("DELETE FROM daily_usage WHERE user_id NOT IN (SELECT id FROM users)")
+            self._indexes.clear()
+            self._daily_usage.clear()
+            self._username_owners = None
+
+    def delete_user(self, user_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+            self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM daily_usage WHERE user_id = ?", (user_id,))
+            self._indexes.pop(user_id, None)
+            self._forget_daily_usage(user_id)
+            self._username_owners = None
+
+    def get_username_owner(self, username: str) -> Optional[str]:
+        """Returns the ID of the user with a username (case-insensitive), from an in-memory map of the stored profiles."""
+        with self._lock:
+            if self._username_owners is None:
+                rows = self._conn.execute("SELECT id, username FROM users WHERE username != ''").fetchall()
+                self._username_owners = {username_key(row['username']): row['id'] for row in rows}
+            return self._username_owners.get(username_key(username))
+
+    # --- Sessions ---
+
+    @staticmethod
+    def _session_row(user_id: str, session_id: str, document: Dict[str, Any], pending: bool = False) -> Tuple:
+        # Display strings are stored alongside the integers so reads never format them
+        entry = session_log_entry(session_record(document))
+        return (user_id, session_id, entry['start'], entry['stop'], entry['duration'], entry['duration_seconds'],
+                entry['start_ts'], entry['stop_ts'], entry['day'], int(pending))
+
+    @staticmethod
+    def _session_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+        session = {column: row[column] for column in SESSION_COLUMNS}
+        session['schema_version'] = SESSION_SCHEMA_VERSION
+        return session
+
+    def upsert_session(self, user_id: str, session_id: str, document: Dict[str, Any], pending: bool = False):
+        """
+        Stores a session document of any schema version. Pending
+        sessions have not reached Firestore yet and survive ``replace_sessions``.
+        """
+        row = self._session_row(user_id, session_id, document, pending)
+        with self._lock, self._conn:
+            old = self._conn.execute("SELECT day, duration_seconds, start_ts, stop_ts FROM sessions WHERE user_id = ? AND id = ?",
+                                     (user_id, session_id)).fetchone()
+            self._conn.execute(INSERT_SESSION_SQL, row)
+            if user_id in self._indexes:
+                self._indexes[user_id].add(session_id, row[6], row[7])
+            if old is None:
+                self._add_to_daily_usage(user_id, row[8], row[5], row[6], row[7])
+            elif tuple(old) != (row[8], row[5], row[6], row[7]):
+                # An edited session; min/max can't be taken back out of a running total
+                self._daily_usage.pop((user_id, old['day']), None)
+                self._daily_usage.pop((user_id, row[8]), None)
+
+    def mark_session_synced(self, user_id: str, session_id: str):
+        """Clears the pending flag once a session has been uploaded."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE sessions SET pending = 0 WHERE user_id = ? AND id = ?", (user_id, session_id))
+
+    def delete_session(self, user_id: str, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE user_id = ? AND id = ?", (user_id, session_id))
+            if user_id in self._indexes:
+                self._indexes[user_id].remove(session_id)
+            self._forget_daily_usage(user_id)
+
+    def delete_user_sessions(self, user_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM daily_usage WHERE user_id = ?", (user_id,))
+            self._indexes.pop(user_id, None)
+            self._forget_daily_usage(user_id)
+
+    def replace_sessions(self, sessions: Iterable[Dict[str, Any]], start_ts: Optional[int] = None):
+        """
+        Replaces the stored sessions that started at or after ``start_ts`` (all of them if None)
+        with the given ones; each session must carry 'user_id' and 'id'. Pending
+        sessions are kept until they are uploaded.
+        """
+        rows = [self._session_row(session['user_id'], session['id'], session) for session in sessions]
+        with self._lock, self._conn:
+            if start_ts is None:
+                self._conn.execute("DELETE FROM sessions WHERE pending = 0")
+            else:
+                self._conn.execute("DELETE FROM sessions WHERE start_ts >= ? AND pending = 0", (start_ts,))
+            self._conn.executemany(INSERT_SESSION_SQL, rows)
+            # Rebuilt from the table on next use
+            self._indexes.clear()
+            self._daily_usage.clear()
+
+    def get_sessions(self, user_id: str, start_day: Optional[str] = None, end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Returns a user's sessions that started between two days (inclusive), oldest first."""
+        start_ts = day_to_timestamp(start_day) if start_day else None
+        stop_ts = _end_of_day_ts(end_day) if end_day else None
+        with self._lock:
+            session_ids = self._session_index(user_id).starting_between(start_ts, stop_ts)
+            return self._get_sessions_by_id(user_id, session_ids)
+
+    def _session_index(self, user_id: str) -> SessionIntervalIndex:
+        """Returns the user's interval index, loading it from the table the first time; call with the lock held."""
+        index = self._indexes.get(user_id)
+        if index is None:
+            rows = self._conn.execute("SELECT id, start_ts, stop_ts FROM sessions WHERE user_id = ?", (user_id,)).fetchall()
+            index = SessionIntervalIndex((row['id'], row['start_ts'], row['stop_ts']) for row in rows)
+            self._indexes[user_id] = index
+        return index
+
+    def _get_sessions_by_id(self, user_id: str, session_ids: List[str]) -> List[Dict[str, Any]]:
+        """Loads sessions by ID, keeping the order of ``session_ids``; call with the lock held."""
+        by_id = {}
+        # Chunked to stay under SQLite's bound-parameter limit on long histories
+        for i in range(0, len(session_ids), SQL_PARAM_CHUNK):
+            chunk = session_ids[i:i + SQL_PARAM_CHUNK]
+            rows = self._conn.execute(
+                f"SELECT * FROM sessions WHERE user_id = ? AND id IN ({','.join('?' * len(chunk))})", [user_id, *chunk],
+            ).fetchall()
+            by_id.update((row['id'], self._session_from_row(row)) for row in rows)
+        return [by_id[session_id] for session_id in session_ids if session_id in by_id]
+
+    def find_overlapping_sessions(self, user_id: str, start_ts: int, stop_ts: int,
+                                  exclude_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Returns the user's sessions overlapping [start_ts, stop_ts), oldest first, leaving out ``exclude_id``."""
+        with self._lock:
+            session_ids = [session_id for session_id in self._session_index(user_id).overlapping(start_ts, stop_ts)
+                           if session_id != exclude_id]
+            return self._get_sessions_by_id(user_id, session_ids)
+
+    def get_sessions_page(self, user_ids: List[str], start_day: Optional[str], end_day: Optional[str], page_size: int,
+                          before: Optional[Tuple[int, str]] = None) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, str]]]:
+        """
+        Returns one page of the given users' sessions between two days (inclusive), newest first.
+
+        ``before`` is the cursor returned with the previous page; the returned
+        cursor is None after the last page.
+        """
+        if not user_ids:
+            return [], None
+        sql = f"SELECT * FROM sessions WHERE user_id IN ({','.join('?' * len(user_ids))})"
+        params: List[Any] = list(user_ids)
+        if start_day:
+            sql += " AND start_ts >= ?"
+            params.append(day_to_timestamp(start_day))
+        if end_day:
+            sql += " AND start_ts < ?"
+            params.append(_end_of_day_ts(end_day))
+        if before is not None:
+            sql += " AND (start_ts < ? OR (start_ts = ? AND id < ?))"
+            params.extend([before[0], before[0], before[1]])
+        sql += " ORDER BY start_ts DESC, id DESC LIMIT ?"
+        params.append(page_size)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        sessions = [self._session_from_row(row) for row in rows]
+        next_cursor = (sessions[-1]['start_ts'], sessions[-1]['id']) if len(sessions) == page_size else None
+        return sessions, next_cursor
+
+    # --- Daily Usage ---
+
+    def set_block_start(self, user_id: str, day: str, block_started_ts: Optional[int]):
+        """
+        Records when a user's current play block started on a day.
+
+        Block starts only move forward within a day, so a missing value or one
+        older than what is stored (e.g. a rollup snapshot from before a break
+        started offline) never replaces it.
+        """
+        if block_started_ts is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO daily_usage (user_id, day, block_started_ts) VALUES (?, ?, ?)"
+                " ON CONFLICT (user_id, day) DO UPDATE SET block_started_ts = excluded.block_started_ts"
+                " WHERE daily_usage.block_started_ts IS NULL OR excluded.block_started_ts > daily_usage.block_started_ts",
+                (user_id, day, block_started_ts))
+            # The block seconds are re-summed from the new block start on next read
+            self._daily_usage.pop((user_id, day), None)
+
+    def _forget_daily_usage(self, user_id: str):
+        """Drops a user's running totals so they are re-summed on next read; call with the lock held."""
+        for key in [key for key in self._daily_usage if key[0] == user_id]:
+            del self._daily_usage[key]
+
+    def _add_to_daily_usage(self, user_id: str, day: str, duration_seconds: int, start_ts: int, stop_ts: int):
+        """Adds a new session to its day's running totals, if they have been seeded; call with the lock held."""
+        daily_usage = self._daily_usage.get((user_id, day))
+        if daily_usage is None:
+            return
+        daily_usage['session_count'] += 1
+        daily_usage['total_seconds'] += duration_seconds
+        if start_ts >= daily_usage.get('block_started_ts', 0):
+            daily_usage['block_seconds'] += duration_seconds
+        daily_usage['first_start_ts'] = min(daily_usage.get('first_start_ts', start_ts), start_ts)
+        daily_usage['last_stop_ts'] = max(daily_usage.get('last_stop_ts', stop_ts), stop_ts)
+
+    def get_daily_usage(self, user_id: str, day: str) -> Dict[str, Any]:
+        """
+        Returns a user's usage for a YYYY-MM-DD day in the shape of a daily_usage rollup.
+
+        The first read sums the stored sessions; later reads return the running totals.
+        """
+        with self._lock:
+            daily_usage = self._daily_usage.get((user_id, day))
+            if daily_usage is None:
+                daily_usage = self._daily_usage[(user_id, day)] = self._sum_daily_usage(user_id, day)
+            return dict(daily_usage)
+
+    def _sum_daily_usage(self, user_id: str, day: str) -> Dict[str, Any]:
+        """Sums a user's usage for a day from the stored sessions; call with the lock held."""
+        daily_usage = empty_daily_usage(day)
+        block = self._conn.execute("SELECT block_started_ts FROM daily_usage WHERE user_id = ? AND day = ?",
+                                   (user_id, day)).fetchone()
+        block_started_ts = block['block_started_ts'] if block else None
+        row = self._conn.execute(
+            "SELECT COUNT(*) AS session_count, COALESCE(SUM(duration_seconds), 0) AS total_seconds,"
+            " COALESCE(SUM(CASE WHEN start_ts >= ? THEN duration_seconds ELSE 0 END), 0) AS block_seconds,"
+            " MIN(start_ts) AS first_start_ts, MAX(stop_ts) AS last_stop_ts"
+            " FROM sessions WHERE user_id = ? AND day = ?",
+            (block_started_ts or 0, user_id, day),
+        ).fetchone()
+        daily_usage.update({key: row[key] for key in ('session_count', 'total_seconds', 'block_seconds')})
+        if row['session_count']:
+            daily_usage['first_start_ts'] = row['first_start_ts']
+            daily_usage['last_stop_ts'] = row['last_stop_ts']
+        if block_started_ts is not None:
+            daily_usage['block_started_ts'] = block_started_ts
+        return daily_usage
+
+
+class LocalSync:
+    """
+    Reconciles a ``LocalStore`` with Firestore in the background.
+
+    Today's sessions and daily usage rollups of every user are followed with
+    snapshot listeners, so changes from other PCs arrive within moments. User
+    profiles are re-listed every ``poll_seconds``. The whole session history is
+    read once, on the first sync; after that, every ``resync_interval`` only
+    the sessions started since the last resync (less ``RESYNC_OVERLAP``) are
+    re-read, to pick up sessions uploaded late by other PCs.
+    Failures (e.g. no network) are logged and retried on the next round; the
+    store keeps serving the last known state meanwhile.
+    """
+    def __init__(self, store: LocalStore, db: Any, poll_seconds: int = 60, resync_interval: timedelta = timedelta(hours=24)):
+        self.store = store
+        self.db = db
+        self.poll_seconds = poll_seconds
+        self.resync_interval = resync_interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._watches: List[Any] = []
+        self._watched_day: Optional[str] = None
+
+    def start(self, on_first_sync: Optional[Callable[[], None]] = None):
+        """
+        Starts reconciling on a daemon thread.
+
+        ``on_first_sync`` runs (on that thread) after the first full sync if the
+        store had never been synced before, so the UI can repaint with real data.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(on_first_sync,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._unwatch()
+
+    def sync_users(self):
+        self.store.replace_users(list_user_profiles(self.db))
+
+    def sync_all_sessions(self):
+        """Re-reads every session from Firestore and replaces the local copies."""
+        synced_at = datetime.now().isoformat()
+        self.store.replace_sessions(query_all_sessions(self.db))
+        self.store.set_meta('last_full_sync', synced_at)
+        self.store.set_meta('last_session_sync', synced_at)
+
+    def sync_recent_sessions(self, since: datetime):
+        """Re-reads the sessions that started on or after ``since``'s day and replaces the local copies of those days."""
+        start_day = since.strftime(DAY_FORMAT)
+        synced_at = datetime.now().isoformat()
+        self.store.replace_sessions(query_all_sessions(self.db, start_day), start_ts=day_to_timestamp(start_day))
+        self.store.set_meta('last_session_sync', synced_at)
+
+    def _last_session_sync(self) -> Optional[datetime]:
+        last_sync = self.store.get_meta('last_session_sync') or self.store.get_meta('last_full_sync')
+        try:
+            return datetime.fromisoformat(last_sync) if last_sync else None
+        except ValueError:
+            return None
+
+    def _sync_sessions(self) -> bool:
+        """Runs a full sync the first time and an incremental one when a resync is due; returns whether either ran."""
+        last_sync = self._last_session_sync()
+        if last_sync is None or not self.store.has_synced():
+            self.sync_all_sessions()
+            return True
+        if datetime.now() - last_sync < self.resync_interval:
+            return False
+        self.sync_recent_sessions(last_sync - RESYNC_OVERLAP)
+        return True
+
+    def _run(self, on_first_sync: Optional[Callable[[], None]]):
+        first_sync_pending = not self.store.has_synced()
+        while not self._stop_event.is_set():
+            try:
+                self.sync_users()
+                if self._sync_sessions():
+                    # Re-attach so the listeners re-deliver anything written during the read
+                    self._unwatch()
+                    if first_sync_pending and on_first_sync is not None:
+                        first_sync_pending = False
+                        on_first_sync()
+                self._watch_today()
+            except Exception as e:
+                logger.warning(f"Could not sync the local store with Firestore, will retry: {e}")
+            self._stop_event.wait(self.poll_seconds)
+
+    def _watch_today(self):
+        """Follows today's sessions and rollups, moving the listeners over when the day changes."""
+        today = datetime.now().strftime(DAY_FORMAT)
+        if self._watched_day == today:
+            return
+        self._unwatch()
+        today_ts = day_to_timestamp(today)
+        first_snapshot = [True]
+
+        def on_sessions(doc_snapshots, changes, read_time):
+            if first_snapshot[0]:
+                # The first snapshot is the complete day, so it also clears sessions deleted while offline
+                first_snapshot[0] = False
+                self.store.replace_sessions(
+                    [dict(doc.to_dict(), id=doc.id, user_id=doc.reference.parent.parent.id) for doc in doc_snapshots],
+                    start_ts=today_ts,
+                )
+                return
+            for change in changes:
+                doc = change.document
+                user_id = doc.reference.parent.parent.id
+                if change.type.name == 'REMOVED':
+                    self.store.delete_session(user_id, doc.id)
+                else:
+                    self.store.upsert_session(user_id, doc.id, doc.to_dict())
+            logger.debug(f"Local store updated with {len(changes)} session changes")
+
+        def on_daily_usage(doc_snapshots, changes, read_time):
+            for change in changes:
+                if change.type.name == 'REMOVED':
+                    continue
+                doc = change.document
+                self.store.set_block_start(doc.reference.parent.parent.id, doc.id, doc.to_dict().get('block_started_ts'))
+
+        sessions_query = self.db.collection_group(SESSIONS_SUBCOLLECTION).where('start_ts', '>=', today_ts)
+        daily_usage_query = self.db.collection_group(DAILY_USAGE_SUBCOLLECTION).where('day', '==', today)
+        read_counter.record('local sync listeners', 2)
+        self._watches = [sessions_query.on_snapshot(on_sessions), daily_usage_query.on_snapshot(on_daily_usage)]
+        self._watched_day = today
+
+    def _unwatch(self):
+        watches, self._watches = self._watches, []
+        self._watched_day = None
+        for watch in watches:
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                logger.warning(f"Could not stop local sync listener: {e}")
@@ -0,0 +1,283 @@
+"""
+Durable local journal of kid timer sessions for Game Sentry.
+
+A running timer only lives in memory, so every start, stop and periodic
+heartbeat is appended to a JSON-lines file and fsync'd before the UI moves on.
+Play block starts (after a rest period) are journaled the same way.
+``SessionUploader`` pushes stopped sessions and block starts to Firestore from
+a background thread, in order, retrying until they land, and the journal is
+replayed on startup to resume or close a timer that was running when the app
+died.
+"""
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+from utils.lazy_import import LazyModule
+
+logger = logging.getLogger(__name__)
+
+api_exceptions = LazyModule('google.api_core.exceptions')
+
+SESSION_JOURNAL_FILE = 'session_journal.log'
+# Rewrite the journal with only unfinished entries once it grows past this size.
+COMPACT_BYTES = 64 * 1024
+
+
+class SessionJournal:
+    """
+    Append-only, fsync'd record of timer sessions.
+
+    Event lines look like ``{"type": "start" | "heartbeat" | "stop" | "uploaded" | "discarded", "session_id": ...}``,
+    plus ``{"type": "block_start", "block_id": ...}`` for play blocks.
+    Replaying them yields the sessions still running (start without stop) and
+    the stop and block start events that have not been uploaded yet.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._running: Dict[str, Dict[str, Any]] = {}  # {session_id: start event, with 'last_seen'}
+        self._pending: Dict[str, Dict[str, Any]] = {}  # {session_id or block_id: stop or block_start event}, oldest first
+        torn = self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if torn:
+            # Terminate a torn last line so the next event starts on a line of its own
+            self._file.write('\n')
+            self._file.flush()
+
+    def _load(self) -> bool:
+        """Rebuilds the running/pending state from the journal file; returns True if its last line is unterminated."""
+        if not os.path.exists(self.path):
+            return False
+        line = '\n'
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write leaves at most one torn line at the end
+                    logger.warning(f"Skipping unreadable session journal line: {line!r}")
+                    continue
+                self._apply(event)
+        return not line.endswith('\n')
+
+    def _apply(self, event: Dict[str, Any]):
+        session_id = event.get('session_id')
+        event_type = event.get('type')
+        if event_type == 'start':
+            self._running[session_id] = dict(event, last_seen=event['start'])
+        elif event_type == 'heartbeat':
+            if session_id in self._running:
+                self._running[session_id]['last_seen'] = event['at']
+        elif event_type == 'stop':
+            self._running.pop(session_id, None)
+            self._pending[session_id] = event
+        elif event_type == 'block_start':
+            self._pending[event['block_id']] = event
+        elif event_type in ('uploaded', 'discarded'):
+            self._running.pop(session_id, None)
+            self._pending.pop(session_id, None)
+
+    def _append(self, event: Dict[str, Any]):
+        with self._lock:
+            self._file.write(json.dumps(event) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._apply(event)
+
+    def record_start(self, session_id: str, user_id: str, start: str):
+        self._append({'type': 'start', 'session_id': session_id, 'user_id': user_id, 'start': start})
+
+    def record_heartbeat(self, session_id: str, at: str):
+        """Notes that a running session was still running at ``at``, bounding what a crash can lose."""
+        self._append({'type': 'heartbeat', 'session_id': session_id, 'at': at})
+
+    def record_stop(self, session_id: str, user_id: str, session_log: Dict[str, Any],
+                    block_start_ts: Optional[int] = None) -> Dict[str, Any]:
+        """Notes a finished session, with the start of the play block it was played in (None for midnight)."""
+        event = {'type': 'stop', 'session_id': session_id, 'user_id': user_id, 'session': session_log,
+                 'block_start_ts': block_start_ts}
+        self._append(event)
+        return event
+
+    def record_block_start(self, user_id: str, day: str, block_start_ts: int) -> Dict[str, Any]:
+        """Notes that a new play block started (e.g. after a rest period), to be written to the day's rollup."""
+        event = {'type': 'block_start', 'block_id': f"block-{user_id}-{block_start_ts}", 'user_id': user_id,
+                 'day': day, 'block_start_ts': block_start_ts}
+        self._append(event)
+        return event
+
+    def mark_uploaded(self, key: str):
+        """Marks a stop event (by session ID) or a block start (by block ID) as written to Firestore."""
+        self._append({'type': 'uploaded', 'session_id': key})
+        if os.path.getsize(self.path) > COMPACT_BYTES:
+            self.compact()
+
+    def discard(self, keys: Set[str]):
+        """Forgets pending events (by session or block ID) that must never be uploaded, e.g. of a deleted user."""
+        for key in keys:
+            self._append({'type': 'discarded', 'session_id': key})
+
+    def running_sessions(self) -> List[Dict[str, Any]]:
+        """Start events (with 'last_seen') of sessions that were never stopped."""
+        with self._lock:
+            return [dict(event) for event in self._running.values()]
+
+    def pending_events(self) -> List[Dict[str, Any]]:
+        """Stop and block start events that have not been uploaded yet, oldest first."""
+        with self._lock:
+            return [dict(event) for event in self._pending.values()]
+
+    def compact(self):
+        """Atomically rewrites the journal with only the still-unfinished sessions."""
+        with self._lock:
+            events = []
+            for event in self._running.values():
+                start_event = {key: value for key, value in event.items() if key != 'last_seen'}
+                events.append(start_event)
+                if event['last_seen'] != event['start']:
+                    events.append({'type': 'heartbeat', 'session_id': event['session_id'], 'at': event['last_seen']})
+            events.extend(self._pending.values())
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for event in events:
+                    f.write(json.dumps(event) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def event_key(event: Dict[str, Any]) -> str:
+    """The ID a pending journal event is tracked and marked uploaded by."""
+    return event['block_id'] if event['type'] == 'block_start' else event['session_id']
+
+
+class SessionUploader:
+    """
+    Uploads stopped sessions and play block starts to Firestore on a background thread.
+
+    Events are written in the order they were journaled, so a block start
+    never overtakes a session stopped before it.
+    ``upload(user_id, session_id, session_log, block_start_ts)`` must be
+    idempotent for a given session ID; ``block_start_ts`` is the play block
+    start recorded when the session stopped. An ``AlreadyExists`` error is treated
+    as an earlier attempt having succeeded. ``start_block(user_id, day, block_start_ts)`` writes a
+    block start to the day's rollup. Failed writes are retried with exponential
+    backoff, in order, until they succeed. ``on_uploaded(user_id, session_id)``
+    runs on the uploader thread after each session is uploaded.
+    """
+    def __init__(self, journal: SessionJournal, upload: Callable[[str, str, Dict[str, Any], Optional[int]], Any],
+                 start_block: Callable[[str, str, int], Any],
+                 on_uploaded: Optional[Callable[[str, str], None]] = None,
+                 initial_backoff: float = 5.0, max_backoff: float = 300.0):
+        self.journal = journal
+        self.upload = upload
+        self.start_block = start_block
+        self.on_uploaded = on_uploaded
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._queue: Deque[Dict[str, Any]] = deque()  # journal events
+        self._writing: Optional[str] = None  # key of the event being written right now
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Queues every event the journal still has pending (and wasn't enqueued already) and starts uploading."""
+        with self._condition:
+            queued = {event_key(event) for event in self._queue}
+        for event in self.journal.pending_events():
+            if event_key(event) not in queued:
+                self.enqueue(event)
+        self._thread.start()
+
+    def enqueue(self, event: Dict[str, Any]):
+        """Queues a stop or block start event returned by the journal."""
+        with self._condition:
+            self._queue.append(event)
+            self._condition.notify_all()
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._queue)
+
+    def discard(self, user_id: str, session_id: Optional[str] = None):
+        """
+        Drops a user's pending events (only the one session's stop if ``session_id`` is given) from the queue and the journal.
+
+        Call before deleting the sessions in Firestore, or the upload would
+        bring them back. An event being written at that moment is waited for,
+        so the delete lands after it.
+        """
+        def matches(event: Dict[str, Any]) -> bool:
+            if event.get('user_id') != user_id:
+                return False
+            return session_id is None or (event['type'] == 'stop' and event['session_id'] == session_id)
+
+        with self._condition:
+            self._condition.wait_for(lambda: self._writing is None or not any(
+                matches(event) and event_key(event) == self._writing for event in self._queue))
+            dropped = {event_key(event) for event in self._queue if matches(event)}
+            self._queue = deque(event for event in self._queue if not matches(event))
+        # Also events journaled but not queued yet (the uploader starts once Firebase is up)
+        dropped.update(event_key(event) for event in self.journal.pending_events() if matches(event))
+        self.journal.discard(dropped)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def _write(self, event: Dict[str, Any]):
+        if event['type'] == 'block_start':
+            self.start_block(event['user_id'], event['day'], event['block_start_ts'])
+            return
+        try:
+            self.upload(event['user_id'], event['session_id'], event['session'], event.get('block_start_ts'))
+        except api_exceptions.AlreadyExists:
+            logger.debug(f"Session {event['session_id']} was already uploaded")
+        if self.on_uploaded is not None:
+            try:
+                self.on_uploaded(event['user_id'], event['session_id'])
+            except Exception as e:
+                logger.error(f"Upload callback failed for session {event['session_id']}: {e}", exc_info=True)
+
+    def _run(self):
+        backoff = self.initial_backoff
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                event = self._queue[0]
+                key = self._writing = event_key(event)
+            try:
+                self._write(event)
+            except (KeyError, ValueError) as e:
+                # A malformed entry will never upload; don't let it block the queue
+                logger.error(f"Dropping unusable journal event {key} for user {event.get('user_id')}: {e}")
+            except Exception as e:
+                logger.warning(f"Could not upload {key}, retrying in {backoff:.0f}s: {e}")
+                with self._condition:
+                    self._writing = None
+                    self._condition.notify_all()
+                    self._condition.wait_for(lambda: self._stopped, backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            self.journal.mark_uploaded(key)
+            backoff = self.initial_backoff
+            with self._condition:
+                if self._queue and self._queue[0] is event:
+                    self._queue.popleft()
+                self._writing = None
+                self._condition.notify_all()
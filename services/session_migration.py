@@ -0,0 +1,212 @@
+"""
+Moves session logs from the legacy 'sessions' array on users/{user_id} into the
+users/{user_id}/sessions subcollection.
+
+Run from the project root:
+
+    python -m services.session_migration [--dry-run] [--user USER_ID] [--rebuild-usage] [--upgrade-schema] [--index-usernames]
+
+The migration is resumable: every legacy entry is written to a document whose ID
+is derived from its contents, so re-running after an interruption rewrites the
+same documents instead of duplicating them. A user's array is only removed once
+every entry has been verified in the subcollection, and only if the user
+document has not changed since it was read.
+
+The users/{user_id}/daily_usage rollups are rebuilt from the subcollection for
+every migrated user. Pass --rebuild-usage to also rebuild them for users that
+were migrated before rollups existed.
+
+Pass --index-usernames to reserve the usernames of users created before the
+usernames/{lowercased} index existed, so they are covered by its uniqueness
+check too. Clashing names are reported and have to be renamed by hand.
+
+Pass --upgrade-schema to rewrite session documents written with string times
+(schema version 1) as typed records of integers. Each rewrite is conditional on
+the document being unchanged since it was read, so it is safe to run while the
+app is in use, and re-running picks up anything that was skipped.
+"""
+import argparse
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from models.session import SESSION_SCHEMA_VERSION, session_record
+from services.firebase_service import (
+    MAX_BATCH_SIZE, SESSIONS_SUBCOLLECTION, USERS_COLLECTION, legacy_session_id, rebuild_daily_usage, reserve_existing_usernames,
+    session_document, sessions_collection,
+)
+
+SECRETS_DIR = 'secrets'
+CREDENTIALS_FILE = 'game-sentry-qcayd-firebase-adminsdk-fbsvc-da160f8409.json'
+MIGRATED_STATUSES = ('ok', 'nothing to migrate', 'dry run')
+
+
+def migrate_user_sessions(db: Any, user_snapshot: Any, batch_size: int = MAX_BATCH_SIZE, dry_run: bool = False) -> Dict[str, Any]:
+    """Migrates one user's legacy sessions array and returns a small report."""
+    user_id = user_snapshot.id
+    legacy_sessions: List[Dict[str, Any]] = user_snapshot.to_dict().get('sessions') or []
+    report = {'user_id': user_id, 'legacy': len(legacy_sessions), 'written': 0, 'duplicates': 0, 'skipped': 0, 'verified': 0, 'usage_days': 0, 'status': 'ok'}
+    if not legacy_sessions:
+        report['status'] = 'nothing to migrate'
+        return report
+
+    collection = sessions_collection(db, user_id)
+    documents: Dict[str, Dict[str, Any]] = {}
+    for session in legacy_sessions:
+        try:
+            documents[legacy_session_id(session)] = session_document(session)
+        except (KeyError, ValueError) as e:
+            print(f"  Skipping unparseable session for user {user_id}: {session} ({e})")
+            report['skipped'] += 1
+    # Identical entries map to the same document and are stored once.
+    report['duplicates'] = len(legacy_sessions) - report['skipped'] - len(documents)
+
+    if dry_run:
+        report['status'] = 'dry run'
+        report['written'] = len(documents)
+        return report
+
+    # --- Copy in batches ---
+    pending = list(documents.items())
+    for offset in range(0, len(pending), batch_size):
+        batch = db.batch()
+        for session_id, document in pending[offset:offset + batch_size]:
+            batch.set(collection.document(session_id), document)
+        batch.commit()
+        report['written'] += len(pending[offset:offset + batch_size])
+        print(f"  {user_id}: wrote {report['written']}/{len(pending)} sessions")
+
+    # --- Verify every entry landed ---
+    refs = [collection.document(session_id) for session_id in documents]
+    for offset in range(0, len(refs), batch_size):
+        report['verified'] += sum(1 for doc in db.get_all(refs[offset:offset + batch_size]) if doc.exists)
+    if report['verified'] != len(documents):
+        report['status'] = 'verification failed'
+        return report
+    report['usage_days'] = rebuild_daily_usage(db, user_id)
+    if report['skipped']:
+        # Keep the array so the unparseable entries can be fixed by hand.
+        report['status'] = 'copied, array kept because of skipped entries'
+        return report
+
+    # --- Drop the array, but only if nobody appended to it in the meantime ---
+    try:
+        user_snapshot.reference.update(
+            {'sessions': firestore.DELETE_FIELD, 'sessions_migrated': True},
+            option=db.write_option(last_update_time=user_snapshot.update_time),
+        )
+    except Exception as e:
+        report['status'] = f'user changed during migration, re-run to resume ({e})'
+    return report
+
+
+def migrate_all_sessions(db: Any, user_ids: Optional[List[str]] = None, batch_size: int = MAX_BATCH_SIZE, dry_run: bool = False,
+                         rebuild_usage: bool = False) -> List[Dict[str, Any]]:
+    """Migrates every user (or the given ones), streaming user documents one at a time."""
+    users = db.collection(USERS_COLLECTION)
+    if user_ids:
+        snapshots = (users.document(user_id).get() for user_id in user_ids)
+    else:
+        snapshots = users.stream()
+
+    reports = []
+    for snapshot in snapshots:
+        if not snapshot.exists:
+            continue
+        report = migrate_user_sessions(db, snapshot, batch_size=batch_size, dry_run=dry_run)
+        if rebuild_usage and report['status'] == 'nothing to migrate' and not dry_run:
+            report['usage_days'] = rebuild_daily_usage(db, report['user_id'])
+        print(f"{report['user_id']}: {report['legacy']} legacy, {report['written']} written, "
+              f"{report['verified']} verified, {report['duplicates']} duplicates, {report['skipped']} skipped, "
+              f"{report['usage_days']} usage days - {report['status']}")
+        reports.append(report)
+    return reports
+
+
+def upgrade_session_schema(db: Any, user_ids: Optional[List[str]] = None, batch_size: int = MAX_BATCH_SIZE,
+                           dry_run: bool = False) -> Dict[str, int]:
+    """Rewrites every session document older than the current schema version (for all users or the given ones)."""
+    if user_ids:
+        docs = (doc for user_id in user_ids for doc in sessions_collection(db, user_id).stream())
+    else:
+        docs = db.collection_group(SESSIONS_SUBCOLLECTION).stream()
+
+    report = {'scanned': 0, 'upgraded': 0, 'skipped': 0, 'failed': 0}
+    pending: List[Any] = []
+
+    def commit_pending():
+        batch = db.batch()
+        for doc, record in pending:
+            # Drop the string fields and only write if nobody changed the session since it was read
+            batch.update(doc.reference, dict(record, start=firestore.DELETE_FIELD, stop=firestore.DELETE_FIELD, duration=firestore.DELETE_FIELD),
+                         option=db.write_option(last_update_time=doc.update_time))
+        try:
+            batch.commit()
+            report['upgraded'] += len(pending)
+        except Exception as e:
+            print(f"  Could not upgrade a batch of {len(pending)} sessions, re-run to retry ({e})")
+            report['failed'] += len(pending)
+        pending.clear()
+
+    for doc in docs:
+        report['scanned'] += 1
+        data = doc.to_dict()
+        if data.get('schema_version', 1) >= SESSION_SCHEMA_VERSION:
+            continue
+        try:
+            record = session_record(data)
+        except (KeyError, ValueError) as e:
+            print(f"  Skipping unparseable session {doc.reference.path}: {data} ({e})")
+            report['skipped'] += 1
+            continue
+        if dry_run:
+            report['upgraded'] += 1
+            continue
+        pending.append((doc, record))
+        if len(pending) >= batch_size:
+            commit_pending()
+            print(f"  Upgraded {report['upgraded']} sessions so far")
+    if pending:
+        commit_pending()
+    print(f"Sessions: {report['scanned']} scanned, {report['upgraded']} upgraded, {report['skipped']} skipped, {report['failed']} failed")
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Move Game Sentry session logs into the sessions subcollection.")
+    parser.add_argument('--credentials', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), SECRETS_DIR, CREDENTIALS_FILE),
+                        help="Path to the Firebase Admin SDK JSON key.")
+    parser.add_argument('--user', action='append', dest='user_ids', help="Only migrate this user ID (repeatable).")
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help="Report what would be migrated without writing.")
+    parser.add_argument('--rebuild-usage', action='store_true', help="Also rebuild daily usage rollups for users migrated earlier.")
+    parser.add_argument('--upgrade-schema', action='store_true', help="Also rewrite sessions stored with string times as typed records.")
+    parser.add_argument('--index-usernames', action='store_true', help="Also reserve the usernames of existing users.")
+    args = parser.parse_args(argv)
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(args.credentials))
+    db = firestore.client()
+
+    reports = migrate_all_sessions(db, args.user_ids, batch_size=min(args.batch_size, MAX_BATCH_SIZE), dry_run=args.dry_run,
+                                   rebuild_usage=args.rebuild_usage)
+    failed = [r for r in reports if r['status'] not in MIGRATED_STATUSES]
+    print(f"Migrated {len(reports) - len(failed)} of {len(reports)} users.")
+    if args.upgrade_schema:
+        upgrade_report = upgrade_session_schema(db, args.user_ids, batch_size=min(args.batch_size, MAX_BATCH_SIZE), dry_run=args.dry_run)
+        if upgrade_report['failed']:
+            return 1
+    if args.index_usernames and not args.dry_run:
+        username_report = reserve_existing_usernames(db)
+        print(f"Usernames: {username_report['reserved']} reserved, {username_report['existing']} already reserved, "
+              f"{username_report['conflicts']} conflicts")
+        if username_report['conflicts']:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Persisted thumbnails of local image files, for Game Sentry's avatar gallery.
+
+A thumbnail is keyed by the file's path, modification time, byte size and
+the requested size, so replacing an avatar picture regenerates it
+automatically. Thumbnails are small PNGs under the app data folder; opening
+the gallery again only reads those instead of decoding the full-size pictures.
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from utils.image_utils import load_thumbnail, open_image
+from utils.lazy_import import LazyModule
+
+logger = logging.getLogger(__name__)
+
+Image = LazyModule('PIL.Image')
+
+GALLERY_THUMBNAIL_DIR = 'gallery_thumbnails'
+# Thumbnails decoded at once by load_async.
+THUMBNAIL_LOAD_WORKERS = 2
+
+
+class ThumbnailCache:
+    """Thumbnails of local image files on disk; safe to use from any thread."""
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def key(self, path: str, size: int) -> str:
+        """Cache key of a file's thumbnail; changes whenever the file is modified."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        # The size catches rewrites within the filesystem's timestamp granularity, or that keep the old mtime
+        return hashlib.sha256(f"{path}|{stat.st_mtime_ns}|{stat.st_size}|{size}".encode('utf-8')).hexdigest()[:32]
+
+    def _thumbnail_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def get(self, path: str, size: int) -> 'Image.Image':
+        """The image at ``path`` fitted in a ``size`` square, generated and stored on first use."""
+        thumbnail_path = self._thumbnail_path(self.key(path, size))
+        try:
+            return open_image(thumbnail_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Regenerating unreadable thumbnail {thumbnail_path}: {e}")
+        img = load_thumbnail(path, size)
+        temp_path = f"{thumbnail_path}.{threading.get_ident()}.tmp"
+        try:
+            img.save(temp_path, format='PNG')
+            os.replace(temp_path, thumbnail_path)
+        except OSError as e:
+            logger.warning(f"Could not store thumbnail of {path}: {e}")
+        return img
+
+    def load_async(self, path: str, size: int) -> 'Future[Image.Image]':
+        """Runs ``get`` on a small thread pool; cancel the future to drop a load that hasn't started."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=THUMBNAIL_LOAD_WORKERS, thread_name_prefix='thumbnail')
+            return self._executor.submit(self.get, path, size)
+
+    def prune(self, keep_keys: Iterable[str]):
+        """Deletes every stored thumbnail whose key isn't in ``keep_keys``, e.g. those of replaced or removed files."""
+        keep = {f"{key}.png" for key in keep_keys}
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith('.png') and filename not in keep:
+                try:
+                    os.remove(os.path.join(self.cache_dir, filename))
+                except OSError as e:
+                    logger.warning(f"Could not delete stale thumbnail {filename}: {e}")
@@ -1 +1,952 @@
- 
\ No newline at end of file
+import hashlib
+import http.server
+import io
+import json
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+from google.api_core import exceptions as api_exceptions
+from PIL import Image
+
+from models.session import (
+    SESSION_SCHEMA_VERSION, SESSION_TIME_FORMAT, new_session_record, parse_session_time, session_log_entry, session_record,
+)
+from models.session_index import SessionIntervalIndex
+
+from services.avatar_cache import AVATAR_CACHE_DIR, AVATAR_SIZES, AvatarCache
+from services.avatar_gc import DELETE_BATCH_SIZE, MIN_ORPHAN_AGE, DirectoryAvatarStore, find_orphans, sweep
+from services.avatar_uploads import AVATAR_UPLOAD_INDEX_FILE, AvatarUploadQueue
+from services.email_outbox import EMAIL_OUTBOX_FILE, MAX_MESSAGE_AGE, EmailDispatcher, EmailOutbox
+from services.firebase_service import day_to_timestamp, username_key
+from services.http_client import MAX_IMAGE_BYTES, ResponseTooLarge, fetch
+from services.local_store import LOCAL_STORE_FILE, LocalStore
+from services.session_journal import SESSION_JOURNAL_FILE, SessionJournal, SessionUploader, event_key
+from services.thumbnail_cache import GALLERY_THUMBNAIL_DIR, ThumbnailCache
+from utils.import_budget import IMPORT_BUDGETS_MS, check_modules
+from utils.startup_profiler import compare_reports, list_reports, load_report, print_comparison
+
+WAIT_SECONDS = 5
+
+
+def make_image(path, color):
+    Image.new('RGB', (300, 300), color).save(path, format='PNG')
+    return str(path)
+
+
+class FakeCloudinary:
+    """Stands in for upload_to_cloudinary; fails the first ``failures`` calls."""
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def __call__(self, payload, public_id):
+        self.calls.append(public_id)
+        if len(self.calls) <= self.failures:
+            raise ConnectionError("upload dropped")
+        full_id = f"avatars/{public_id}"
+        return {'secure_url': f"https://example.invalid/{full_id}.png", 'public_id': full_id}
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + WAIT_SECONDS
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def upload_and_wait(queue, image_path):
+    """Submits an avatar and returns what on_done reported."""
+    done = threading.Event()
+    result = {}
+
+    def on_done(avatar, error):
+        result.update(avatar=avatar, error=error)
+        done.set()
+    queue.submit(image_path, on_done)
+    assert done.wait(WAIT_SECONDS), "upload did not finish"
+    return result['avatar'], result['error']
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / AVATAR_UPLOAD_INDEX_FILE)
+
+
+def test_avatar_upload_reuses_identical_payload(tmp_path, index_path):
+    upload = FakeCloudinary()
+    queue = AvatarUploadQueue(upload, index_path)
+    try:
+        first, _ = upload_and_wait(queue, make_image(tmp_path / 'a.png', 'red'))
+        # The same picture under another name hashes to the same payload
+        second, error = upload_and_wait(queue, make_image(tmp_path / 'b.png', 'red'))
+    finally:
+        queue.stop()
+    assert error is None
+    assert second == first
+    assert len(upload.calls) == 1
+
+
+def test_avatar_upload_index_survives_restart(tmp_path, index_path):
+    image_path = make_image(tmp_path / 'a.png', 'blue')
+    queue = AvatarUploadQueue(FakeCloudinary(), index_path)
+    first, _ = upload_and_wait(queue, image_path)
+    queue.stop()
+
+    upload = FakeCloudinary()
+    queue = AvatarUploadQueue(upload, index_path)
+    try:
+        second, _ = upload_and_wait(queue, image_path)
+    finally:
+        queue.stop()
+    assert second == first
+    assert upload.calls == []
+
+
+def test_avatar_upload_forget_uploads_again(tmp_path, index_path):
+    image_path = make_image(tmp_path / 'a.png', 'green')
+    upload = FakeCloudinary()
+    queue = AvatarUploadQueue(upload, index_path)
+    try:
+        first, _ = upload_and_wait(queue, image_path)
+        queue.forget(first['public_id'])
+        upload_and_wait(queue, image_path)
+    finally:
+        queue.stop()
+    assert len(upload.calls) == 2
+
+
+def test_avatar_upload_retries_after_failure(tmp_path, index_path):
+    upload = FakeCloudinary(failures=2)
+    queue = AvatarUploadQueue(upload, index_path, initial_backoff=0.01)
+    try:
+        avatar, error = upload_and_wait(queue, make_image(tmp_path / 'a.png', 'red'))
+    finally:
+        queue.stop()
+    assert error is None
+    assert avatar['url'].startswith('https://')
+    # Every attempt uses the same hash-based public_id, so a retry can't leave a duplicate behind
+    assert len(upload.calls) == 3 and len(set(upload.calls)) == 1
+
+
+def test_avatar_upload_reports_error_after_last_attempt(tmp_path, index_path):
+    upload = FakeCloudinary(failures=10)
+    queue = AvatarUploadQueue(upload, index_path, max_attempts=3, initial_backoff=0.01)
+    try:
+        avatar, error = upload_and_wait(queue, make_image(tmp_path / 'a.png', 'red'))
+    finally:
+        queue.stop()
+    assert avatar is None
+    assert isinstance(error, ConnectionError)
+    assert len(upload.calls) == 3
+
+
+EMAIL_SETTINGS = {'email_enabled': True, 'email_address': 'sentry@example.invalid', 'email_password': '',
+                  'email_recipients': ['parent@example.invalid']}
+
+
+class FakeSMTP:
+    """Stands in for an SMTP connection; raises each error in ``errors`` once, then accepts mail."""
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+
+    def sendmail(self, sender, recipients, message):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(message)
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = EmailOutbox(str(tmp_path / EMAIL_OUTBOX_FILE))
+    yield outbox
+    outbox.close()
+
+
+def run_dispatcher(outbox, smtp, settings=EMAIL_SETTINGS, **kwargs):
+    dispatcher = EmailDispatcher(outbox, get_settings=lambda: settings, initial_backoff=0.01, **kwargs)
+    dispatcher._connect = lambda settings: smtp
+    dispatcher.start()
+    return dispatcher
+
+
+def iter_pending(path):
+    outbox = EmailOutbox(path)
+    try:
+        while outbox.pending_count():
+            message = outbox.next_pending()
+            outbox.mark_done(message['id'])
+            yield message
+    finally:
+        outbox.close()
+
+
+def test_outbox_keeps_unsent_messages_across_restart(tmp_path):
+    path = str(tmp_path / EMAIL_OUTBOX_FILE)
+    outbox = EmailOutbox(path)
+    sent_id = outbox.add("Session Started", "started")
+    unsent_id = outbox.add("Session Stopped", "stopped")
+    outbox.mark_done(sent_id)
+    outbox.close()
+    # A crash mid-write leaves a torn last line behind
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"type": "queued", "id": "tor')
+
+    outbox = EmailOutbox(path)
+    try:
+        assert outbox.pending_count() == 1
+        assert outbox.next_pending()['id'] == unsent_id
+        later_id = outbox.add("Daily Limit", "limit")
+    finally:
+        outbox.close()
+    assert [message['id'] for message in iter_pending(path)] == [unsent_id, later_id]
+
+
+def test_outbox_compaction_keeps_unsent_messages(outbox):
+    unsent_id = outbox.add("Session Stopped", "stopped")
+    for _ in range(3):
+        outbox.mark_done(outbox.add("Session Started", "started"))
+    outbox.compact()
+    with open(outbox.path, 'r', encoding='utf-8') as f:
+        assert [json.loads(line)['id'] for line in f] == [unsent_id]
+
+
+def test_dispatcher_sends_and_retries_temporary_failures(outbox):
+    smtp = FakeSMTP(errors=[smtplib.SMTPDataError(451, b'try again later')])
+    outbox.add("Session Started", "started")
+    dispatcher = run_dispatcher(outbox, smtp)
+    try:
+        wait_until(lambda: outbox.pending_count() == 0)
+    finally:
+        dispatcher.stop()
+    assert len(smtp.sent) == 1
+
+
+def test_dispatcher_drops_messages_the_server_rejects(outbox):
+    smtp = FakeSMTP(errors=[smtplib.SMTPDataError(554, b'message rejected')])
+    outbox.add("Session Started", "rejected")
+    outbox.add("Session Stopped", "accepted")
+    dispatcher = run_dispatcher(outbox, smtp)
+    try:
+        wait_until(lambda: outbox.pending_count() == 0)
+    finally:
+        dispatcher.stop()
+    assert len(smtp.sent) == 1
+    assert 'accepted' in smtp.sent[0]
+
+
+def test_dispatcher_holds_messages_after_rejected_login(outbox):
+    smtp = FakeSMTP(errors=[smtplib.SMTPAuthenticationError(535, b'Username and Password not accepted')])
+    settings = dict(EMAIL_SETTINGS)
+    rejected = []
+    outbox.add("Session Started", "started")
+    dispatcher = run_dispatcher(outbox, smtp, settings, on_auth_error=rejected.append)
+    try:
+        wait_until(lambda: rejected)
+        outbox.add("Session Stopped", "stopped")
+        dispatcher.wake()
+        time.sleep(0.2)  # the 0.01s backoff would have retried many times by now
+        assert smtp.sent == [] and outbox.pending_count() == 2
+        settings['email_password'] = 'new app password'
+        dispatcher.wake()
+        wait_until(lambda: outbox.pending_count() == 0)
+    finally:
+        dispatcher.stop()
+    assert len(rejected) == 1 and len(smtp.sent) == 2
+
+
+def test_dispatcher_drops_expired_messages(outbox):
+    smtp = FakeSMTP()
+    stale_at = (datetime.now() - MAX_MESSAGE_AGE * 2).isoformat()
+    outbox._append({'type': 'queued', 'id': 'stale', 'subject': "Session Started", 'text': "stale", 'html': None,
+                    'queued_at': stale_at})
+    dispatcher = run_dispatcher(outbox, smtp)
+    try:
+        wait_until(lambda: outbox.pending_count() == 0)
+    finally:
+        dispatcher.stop()
+    assert smtp.sent == []
+
+
+def test_dispatcher_drops_messages_when_notifications_are_off(outbox):
+    smtp = FakeSMTP()
+    outbox.add("Session Started", "started")
+    dispatcher = run_dispatcher(outbox, smtp, settings=dict(EMAIL_SETTINGS, email_enabled=False))
+    try:
+        wait_until(lambda: outbox.pending_count() == 0)
+    finally:
+        dispatcher.stop()
+    assert smtp.sent == []
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalStore(str(tmp_path / LOCAL_STORE_FILE))
+    yield store
+    store.close()
+
+
+def played(start, minutes):
+    """A current-version session record played for ``minutes`` from a 'YYYY-MM-DD HH:MM:SS' time."""
+    start_dt = datetime.strptime(start, SESSION_TIME_FORMAT)
+    return new_session_record(start_dt, start_dt + timedelta(minutes=minutes))
+
+
+def test_replace_sessions_keeps_pending_rows(store):
+    store.upsert_session('kid', 'synced', played('2026-10-15 10:00:00', 30))
+    store.upsert_session('kid', 'pending', played('2026-10-15 12:00:00', 30), pending=True)
+    store.replace_sessions([dict(played('2026-10-15 14:00:00', 30), user_id='kid', id='remote')])
+    assert [session['id'] for session in store.get_sessions('kid')] == ['pending', 'remote']
+
+    store.mark_session_synced('kid', 'pending')
+    store.replace_sessions([])
+    assert store.get_sessions('kid') == []
+
+
+def test_replace_sessions_only_replaces_from_start_ts(store):
+    store.upsert_session('kid', 'yesterday', played('2026-10-14 10:00:00', 30))
+    store.upsert_session('kid', 'today', played('2026-10-15 10:00:00', 30))
+    store.replace_sessions([], start_ts=day_to_timestamp('2026-10-15'))
+    assert [session['id'] for session in store.get_sessions('kid')] == ['yesterday']
+
+
+def test_set_block_start_only_moves_forward(store):
+    store.set_block_start('kid', '2026-10-15', 200)
+    store.set_block_start('kid', '2026-10-15', 100)
+    store.set_block_start('kid', '2026-10-15', None)
+    assert store.get_daily_usage('kid', '2026-10-15')['block_started_ts'] == 200
+    store.set_block_start('kid', '2026-10-15', 300)
+    assert store.get_daily_usage('kid', '2026-10-15')['block_started_ts'] == 300
+
+
+def test_get_daily_usage_sums_day_and_block(store):
+    store.upsert_session('kid', 'morning', played('2026-10-15 09:00:00', 40))
+    store.upsert_session('kid', 'afternoon', played('2026-10-15 15:00:00', 20))
+    store.upsert_session('kid', 'other day', played('2026-10-16 09:00:00', 90))
+    store.upsert_session('sibling', 'same day', played('2026-10-15 09:00:00', 90))
+    usage = store.get_daily_usage('kid', '2026-10-15')
+    assert usage['session_count'] == 2
+    assert usage['total_seconds'] == 60 * 60
+    # Without a break every session of the day is in the block
+    assert usage['block_seconds'] == 60 * 60
+
+    block_start = datetime.strptime('2026-10-15 12:00:00', SESSION_TIME_FORMAT)
+    store.set_block_start('kid', '2026-10-15', int(block_start.timestamp()))
+    usage = store.get_daily_usage('kid', '2026-10-15')
+    assert usage['total_seconds'] == 60 * 60
+    assert usage['block_seconds'] == 20 * 60
+
+
+def test_get_sessions_page_pages_newest_first(store):
+    for hour in range(10, 15):
+        store.upsert_session('kid', f"kid-{hour}", played(f"2026-10-15 {hour}:00:00", 10))
+    # Two sessions starting at the same second are told apart by ID
+    store.upsert_session('sibling', 'sibling-12', played('2026-10-15 12:00:00', 10))
+    store.upsert_session('kid', 'out of range', played('2026-10-17 12:00:00', 10))
+
+    pages, cursor = [], None
+    while True:
+        sessions, cursor = store.get_sessions_page(['kid', 'sibling'], '2026-10-15', '2026-10-16', 2, cursor)
+        pages.append([session['id'] for session in sessions])
+        if cursor is None:
+            break
+    assert pages == [['kid-14', 'kid-13'], ['sibling-12', 'kid-12'], ['kid-11', 'kid-10'], []]
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / SESSION_JOURNAL_FILE)
+
+
+class FakeFirestore:
+    """Stands in for the uploader's Firestore writes; raises each error in ``errors`` once, in order."""
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.writes = []
+
+    def _write(self, key):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.writes.append(key)
+
+    def upload(self, user_id, session_id, session_log, block_start_ts):
+        self._write(session_id)
+
+    def start_block(self, user_id, day, block_start_ts):
+        self._write(f"block@{block_start_ts}")
+
+
+def start_uploader(journal, firestore, **kwargs):
+    uploader = SessionUploader(journal, firestore.upload, firestore.start_block, initial_backoff=0.01, **kwargs)
+    uploader.start()
+    return uploader
+
+
+def test_journal_replays_running_and_pending_sessions(journal_path):
+    journal = SessionJournal(journal_path)
+    journal.record_start('running', 'kid', '2026-10-15 10:00:00')
+    journal.record_heartbeat('running', '2026-10-15 10:05:00')
+    journal.record_start('stopped', 'kid', '2026-10-15 09:00:00')
+    journal.record_stop('stopped', 'kid', {'start': '2026-10-15 09:00:00'}, block_start_ts=100)
+    journal.record_block_start('kid', '2026-10-15', 200)
+    journal.record_stop('uploaded', 'kid', {})
+    journal.mark_uploaded('uploaded')
+    journal.close()
+
+    journal = SessionJournal(journal_path)
+    try:
+        running = journal.running_sessions()
+        assert [(event['session_id'], event['last_seen']) for event in running] == [('running', '2026-10-15 10:05:00')]
+        pending = journal.pending_events()
+        assert [event_key(event) for event in pending] == ['stopped', 'block-kid-200']
+        assert pending[0]['block_start_ts'] == 100
+    finally:
+        journal.close()
+
+
+def test_journal_tolerates_torn_last_line(journal_path):
+    journal = SessionJournal(journal_path)
+    journal.record_stop('before crash', 'kid', {})
+    journal.close()
+    with open(journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"type": "stop", "session_id": "tor')
+
+    journal = SessionJournal(journal_path)
+    journal.record_stop('after crash', 'kid', {})
+    journal.close()
+    journal = SessionJournal(journal_path)
+    try:
+        assert [event_key(event) for event in journal.pending_events()] == ['before crash', 'after crash']
+    finally:
+        journal.close()
+
+
+def test_journal_compaction_keeps_unfinished_sessions(journal_path):
+    journal = SessionJournal(journal_path)
+    journal.record_start('running', 'kid', '2026-10-15 10:00:00')
+    journal.record_heartbeat('running', '2026-10-15 10:05:00')
+    journal.record_stop('pending', 'kid', {})
+    for index in range(3):
+        journal.record_stop(f"done-{index}", 'kid', {})
+        journal.mark_uploaded(f"done-{index}")
+    journal.compact()
+    journal.close()
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        assert len(f.readlines()) == 3  # start, heartbeat, stop
+
+    journal = SessionJournal(journal_path)
+    try:
+        assert journal.running_sessions()[0]['last_seen'] == '2026-10-15 10:05:00'
+        assert [event_key(event) for event in journal.pending_events()] == ['pending']
+    finally:
+        journal.close()
+
+
+def test_uploader_retries_in_order_and_counts_already_exists_as_uploaded(journal_path):
+    journal = SessionJournal(journal_path)
+    for session_id in ('first', 'second'):
+        journal.record_stop(session_id, 'kid', {})
+    journal.record_block_start('kid', '2026-10-15', 300)
+    # The first attempt fails; the retry finds the document an earlier attempt already created
+    firestore = FakeFirestore(errors=[ConnectionError("offline"), api_exceptions.AlreadyExists("exists")])
+    uploaded = []
+    uploader = start_uploader(journal, firestore, on_uploaded=lambda user_id, session_id: uploaded.append(session_id))
+    try:
+        wait_until(lambda: not journal.pending_events())
+    finally:
+        uploader.stop()
+        journal.close()
+    assert firestore.writes == ['second', 'block@300']
+    assert uploaded == ['first', 'second']
+
+
+def test_uploader_discards_a_users_pending_uploads(journal_path):
+    journal = SessionJournal(journal_path)
+    journal.record_stop('kept', 'sibling', {})
+    journal.record_stop('deleted session', 'kid', {})
+    journal.record_stop('other session', 'kid', {})
+    journal.record_block_start('kid', '2026-10-15', 300)
+    firestore = FakeFirestore()
+    uploader = SessionUploader(journal, firestore.upload, firestore.start_block, initial_backoff=0.01)
+    # Events are journaled before the uploader starts, and queued ones too
+    uploader.enqueue(journal.pending_events()[1])
+    uploader.discard('kid', 'deleted session')
+    assert [event_key(event) for event in journal.pending_events()] == ['kept', 'other session', 'block-kid-300']
+    uploader.discard('kid')
+    assert [event_key(event) for event in journal.pending_events()] == ['kept']
+    uploader.start()
+    try:
+        wait_until(lambda: not journal.pending_events())
+    finally:
+        uploader.stop()
+        journal.close()
+    assert firestore.writes == ['kept']
+    journal = SessionJournal(journal_path)
+    try:
+        assert journal.pending_events() == []
+    finally:
+        journal.close()
+
+
+def test_daily_usage_running_totals_follow_session_writes(store):
+    store.upsert_session('kid', 'morning', played('2026-10-15 09:00:00', 40))
+    assert store.get_daily_usage('kid', '2026-10-15')['total_seconds'] == 40 * 60
+
+    statements = []
+    store._conn.set_trace_callback(statements.append)
+    store.get_daily_usage('kid', '2026-10-15')
+    assert statements == []  # served from the running totals
+
+    store.upsert_session('kid', 'afternoon', played('2026-10-15 15:00:00', 20))
+    assert store.get_daily_usage('kid', '2026-10-15') == store._sum_daily_usage('kid', '2026-10-15')
+    store.upsert_session('kid', 'afternoon', played('2026-10-15 15:00:00', 30))  # edited
+    store.delete_session('kid', 'morning')
+    block_start = datetime.strptime('2026-10-15 16:00:00', SESSION_TIME_FORMAT)
+    store.set_block_start('kid', '2026-10-15', int(block_start.timestamp()))
+    store.upsert_session('kid', 'evening', played('2026-10-15 18:00:00', 10))
+    usage = store.get_daily_usage('kid', '2026-10-15')
+    assert usage == store._sum_daily_usage('kid', '2026-10-15')
+    assert (usage['total_seconds'], usage['block_seconds']) == (40 * 60, 10 * 60)
+
+
+class ImageServer:
+    """
+    A local HTTP server serving ``files`` ({path: bytes}) with ETags; ``delay`` seconds before each response.
+
+    Paths in ``streamed`` are sent without a Content-Length, ending at connection close.
+    """
+    def __init__(self):
+        self.files = {}
+        self.streamed = set()
+        self.delay = 0
+        self.requests = []  # (path, status)
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                time.sleep(server.delay)
+                body = server.files.get(self.path)
+                if body is None:
+                    status, body = 404, b''
+                etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+                if body and self.headers.get('If-None-Match') == etag:
+                    status, body = 304, b''
+                elif body:
+                    status = 200
+                server.requests.append((self.path, status))
+                self.send_response(status)
+                self.send_header('ETag', etag)
+                if self.path in server.streamed:
+                    self.send_header('Connection', 'close')
+                    self.close_connection = True
+                else:
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.httpd.server_port}{path}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def image_server():
+    server = ImageServer()
+    yield server
+    server.close()
+
+
+def png_bytes(color, size=(200, 200)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def avatar_cache(tmp_path):
+    cache = AvatarCache(str(tmp_path / AVATAR_CACHE_DIR))
+    yield cache
+    cache.close()
+
+
+def test_avatar_cache_revalidates_with_etag(avatar_cache, image_server):
+    image_server.files['/kid.png'] = png_bytes('red')
+    url = image_server.url('/kid.png')
+    assert avatar_cache.get_image(url, 64).getpixel((0, 0)) == (255, 0, 0)
+    avatar_cache.get_image(url, 64)
+    assert image_server.requests == [('/kid.png', 200)]  # fresh entries are trusted
+
+    avatar_cache._conn.execute("UPDATE avatars SET checked_at = 0")
+    assert avatar_cache.get_image(url, 64).getpixel((0, 0)) == (255, 0, 0)
+    assert image_server.requests[-1] == ('/kid.png', 304)
+
+    # A changed avatar is downloaded again, and the Tk thread's next lookup drops the old PhotoImage
+    avatar_cache._photos[(url, 64)] = object()
+    image_server.files['/kid.png'] = png_bytes('blue')
+    avatar_cache._conn.execute("UPDATE avatars SET checked_at = 0")
+    assert avatar_cache.get_image(url, 64).getpixel((0, 0)) == (0, 0, 255)
+    assert image_server.requests[-1] == ('/kid.png', 200)
+    assert (url, 64) in avatar_cache._photos
+    assert avatar_cache.cached_photo(url, 64) is None
+
+
+def test_avatar_cache_serves_stale_copy_when_offline(avatar_cache, image_server):
+    image_server.files['/kid.png'] = png_bytes('red')
+    url = image_server.url('/kid.png')
+    avatar_cache.get_image(url, 64)
+    del image_server.files['/kid.png']
+    avatar_cache._conn.execute("UPDATE avatars SET checked_at = 0")
+    assert avatar_cache.get_image(url, 64) is not None
+
+
+def test_avatar_cache_evicts_least_recently_used(tmp_path, image_server):
+    for name, color in (('a', 'red'), ('b', 'green'), ('c', 'blue')):
+        image_server.files[f"/{name}.png"] = png_bytes(color)
+    probe = AvatarCache(str(tmp_path / 'probe'))
+    probe.get_image(image_server.url('/a.png'), 64)
+    entry_bytes = probe._entry(image_server.url('/a.png'))['bytes']
+    probe.close()
+
+    cache = AvatarCache(str(tmp_path / AVATAR_CACHE_DIR), max_bytes=int(entry_bytes * 2.5))
+    try:
+        cache.get_image(image_server.url('/a.png'), 64)
+        cache.get_image(image_server.url('/b.png'), 64)
+        time.sleep(0.01)
+        cache.get_image(image_server.url('/a.png'), 64)  # 'b' is now the least recently used
+        cache.get_image(image_server.url('/c.png'), 64)
+        assert sorted(url.rsplit('/', 1)[-1] for url in cache.cached_urls()) == ['a.png', 'c.png']
+        thumbnails = [name for name in os.listdir(cache.cache_dir) if name.endswith('.png')]
+        assert len(thumbnails) == 2 * len(AVATAR_SIZES)
+    finally:
+        cache.close()
+
+
+@pytest.fixture
+def session_index():
+    # 'long' starts first and runs past the short sessions after it
+    return SessionIntervalIndex([('b', 200, 260), ('long', 100, 1000), ('a', 150, 180), ('c', 1200, 1300)])
+
+
+@pytest.mark.parametrize("start_ts, stop_ts, expected", [
+    (0, 100, []),
+    (0, 101, ['long']),
+    (170, 210, ['long', 'a', 'b']),
+    (500, 600, ['long']),  # only found through the longest-session look-back
+    (1000, 1200, []),  # intervals are half-open at both ends
+    (1250, 5000, ['c']),
+])
+def test_session_index_overlapping(session_index, start_ts, stop_ts, expected):
+    assert session_index.overlapping(start_ts, stop_ts) == expected
+
+
+@pytest.mark.parametrize("start_ts, stop_ts, expected", [
+    (100, 200, ['long', 'a']),
+    (150, 1200, ['a', 'b']),
+    (None, 150, ['long']),
+    (200, None, ['b', 'c']),
+    (None, None, ['long', 'a', 'b', 'c']),
+])
+def test_session_index_starting_between(session_index, start_ts, stop_ts, expected):
+    assert session_index.starting_between(start_ts, stop_ts) == expected
+
+
+def test_session_index_remove_and_replace(session_index):
+    session_index.remove('long')
+    session_index.remove('missing')
+    assert len(session_index) == 3
+    assert session_index.overlapping(500, 600) == []
+    session_index.add('b', 1100, 1250)  # moves 'b' instead of adding a second interval
+    assert len(session_index) == 3
+    assert session_index.overlapping(200, 260) == []
+    assert session_index.overlapping(1240, 1260) == ['b', 'c']
+    assert session_index.starting_between(None, None) == ['a', 'b', 'c']
+
+
+def test_local_store_get_sessions_uses_index(store):
+    for i in range(3):
+        store.upsert_session('kid', f"s{i}", played(f"2024-05-0{i + 1} 10:00:00", 30))
+    store.upsert_session('kid', 's1', played('2024-05-04 10:00:00', 30))  # an edit moves it to another day
+    assert [s['id'] for s in store.get_sessions('kid', '2024-05-02', '2024-05-04')] == ['s2', 's1']
+    assert [s['id'] for s in store.get_sessions('kid')] == ['s0', 's2', 's1']
+    store.delete_session('kid', 's2')
+    assert [s['id'] for s in store.get_sessions('kid', '2024-05-02')] == ['s1']
+
+
+def test_session_record_converts_legacy_strings():
+    legacy = {'start': '2024-05-01 23:50:00', 'stop': '2024-05-02 00:20:00', 'duration': '00:30:00'}
+    record = session_record(legacy)
+    start_ts = int(datetime(2024, 5, 1, 23, 50).timestamp())
+    assert record == {'schema_version': SESSION_SCHEMA_VERSION, 'start_ts': start_ts, 'stop_ts': start_ts + 1800,
+                      'duration_seconds': 1800, 'day': '2024-05-01'}
+    assert session_record(record) == record
+
+
+@pytest.mark.parametrize("stop", [None, '', 'not a time', '2024-05-01 25:00:00'])
+def test_session_record_falls_back_to_duration_without_stop(stop):
+    legacy = {'start': '2024-05-01 10:00:00', 'duration': '01:15:00'}
+    if stop is not None:
+        legacy['stop'] = stop
+    record = session_record(legacy)
+    assert record['stop_ts'] - record['start_ts'] == record['duration_seconds'] == 4500
+
+
+@pytest.mark.parametrize("legacy, error", [
+    ({'stop': '2024-05-01 10:00:00'}, KeyError),
+    ({'start': '2024/05/01 10:00'}, ValueError),
+])
+def test_session_record_rejects_bad_start(legacy, error):
+    with pytest.raises(error):
+        session_record(legacy)
+
+
+def test_session_log_entry_round_trips():
+    legacy = {'start': '2024-05-01 10:00:00', 'stop': '2024-05-01 11:30:05', 'duration': '01:30:05'}
+    entry = session_log_entry(session_record(legacy))
+    assert {key: entry[key] for key in legacy} == legacy
+    assert session_record(entry) == session_record(legacy)
+    assert session_log_entry(played('2024-05-01 10:00:00', 90))['duration'] == '01:30:00'
+
+
+@pytest.mark.parametrize("value", [
+    '2024-05-01 10:00:00',
+    '1999-12-31 23:59:59',
+    '2024-02-29 00:00:00',
+    '2024-5-1 1:02:03',  # strptime accepts single-digit fields
+    '2024-05-01 9:5:7',
+    '2024-05-01T10:00:00',
+    '2024-05-01 10:00:00+02:00',
+    '2024-05-01 10:00:00Z',
+    '2024-05-01 10:00:00.123',
+    '2024-05-01 10:00',
+    '2023-02-29 10:00:00',
+    '2024-13-01 10:00:00',
+    '2024-05-01 24:00:00',
+    '２０２４-05-01 10:00:00',  # non-ASCII digits
+    ' 2024-05-01 10:00:00',
+    '',
+])
+def test_parse_session_time_matches_strptime(value):
+    try:
+        expected = datetime.strptime(value, SESSION_TIME_FORMAT)
+    except ValueError:
+        with pytest.raises(ValueError):
+            parse_session_time(value)
+    else:
+        assert parse_session_time(value) == expected
+
+
+@pytest.mark.parametrize("username, key", [
+    ('Alice', 'alice'),
+    ('  ALICE ', 'alice'),
+    ('Straße', 'stra%C3%9Fe'),
+    ('a/b', 'a%2Fb'),
+    ('/', '%2F'),
+    ('.', '%2E'),
+    ('..', '%2E%2E'),
+    ('...', '...'),
+    ('__x__', '%5F_x__'),
+    ('__', '__'),
+    ('%2E', '%252e'),  # can't collide with the escaped '.'
+])
+def test_username_key(username, key):
+    assert username_key(username) == key
+
+
+@pytest.mark.parametrize("module", list(IMPORT_BUDGETS_MS))
+def test_import_budget(module, capsys):
+    if module == 'game_sentry':
+        pytest.importorskip('winsound')  # the app itself only imports on Windows
+    within_budget = check_modules({module: IMPORT_BUDGETS_MS[module]}, runs=3)
+    assert within_budget, capsys.readouterr().out
+
+
+@pytest.fixture
+def thumbnails(tmp_path):
+    return ThumbnailCache(str(tmp_path / GALLERY_THUMBNAIL_DIR))
+
+
+def test_thumbnail_cache_hit(thumbnails, tmp_path, monkeypatch):
+    picture = str(tmp_path / 'kid.png')
+    make_image(picture, 'red')
+    assert thumbnails.get(picture, 64).size == (64, 64)
+    stored = os.listdir(thumbnails.cache_dir)
+    assert stored == [f"{thumbnails.key(picture, 64)}.png"]
+    def no_decode(*args):
+        raise AssertionError("the stored thumbnail should have been used")
+    monkeypatch.setattr('services.thumbnail_cache.load_thumbnail', no_decode)
+    assert thumbnails.get(picture, 64).getpixel((0, 0)) == (255, 0, 0)
+
+
+def test_thumbnail_cache_invalidated_by_change(thumbnails, tmp_path):
+    picture = str(tmp_path / 'kid.png')
+    make_image(picture, 'red')
+    thumbnails.get(picture, 64)
+    old_key = thumbnails.key(picture, 64)
+    stat = os.stat(picture)
+    Image.new('RGB', (400, 300), 'blue').save(picture)
+    os.utime(picture, ns=(stat.st_atime_ns, stat.st_mtime_ns))  # same mtime, different size
+    assert thumbnails.key(picture, 64) != old_key
+    assert thumbnails.get(picture, 64).getpixel((0, 0)) == (0, 0, 255)
+    assert thumbnails.key(picture, 100) != thumbnails.key(picture, 64)
+
+
+def test_thumbnail_cache_prune(thumbnails, tmp_path):
+    pictures = [str(tmp_path / f"{name}.png") for name in ('a', 'b')]
+    for picture in pictures:
+        make_image(picture, 'red')
+        thumbnails.get(picture, 64)
+    keep = thumbnails.key(pictures[0], 64)
+    thumbnails.prune([keep])
+    assert os.listdir(thumbnails.cache_dir) == [f"{keep}.png"]
+
+
+def avatar_folder(tmp_path, names, age=timedelta(days=2)):
+    """A DirectoryAvatarStore holding ``names`` (IDs 'avatars/<name>'), last modified ``age`` ago."""
+    directory = tmp_path / 'avatar_store'
+    directory.mkdir(exist_ok=True)
+    modified = (datetime.now() - age).timestamp()
+    for name in names:
+        path = directory / f"{name}.png"
+        path.write_bytes(b'avatar')
+        os.utime(path, (modified, modified))
+    return DirectoryAvatarStore(str(directory), prefix='avatars/')
+
+
+def stored_names(store):
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(store.directory))
+
+
+def test_avatar_sweep_keeps_referenced_avatars(tmp_path):
+    store = avatar_folder(tmp_path, ['by-id', 'by-url', 'orphan'])
+    users = [{'id': 'a', 'avatar_public_id': 'avatars/by-id'},
+             {'id': 'b', 'avatar_url': 'https://res.cloudinary.com/demo/image/upload/v123/avatars/by-url.png'},
+             {'id': 'c'}]
+    report = sweep(store, users)
+    assert report['scanned'] == 3
+    assert report['deleted'] == ['avatars/orphan']
+    assert stored_names(store) == ['by-id', 'by-url']
+
+
+def test_avatar_sweep_keeps_young_avatars(tmp_path):
+    store = avatar_folder(tmp_path, ['old'])
+    avatar_folder(tmp_path, ['new'], age=MIN_ORPHAN_AGE - timedelta(minutes=5))
+    assert find_orphans(store, set()) == (2, ['avatars/old'])
+    sweep(store, [{'id': 'a'}])
+    assert stored_names(store) == ['new']
+
+
+def test_avatar_sweep_deletes_in_capped_batches(tmp_path, monkeypatch):
+    store = avatar_folder(tmp_path, [f"orphan-{i:03}" for i in range(DELETE_BATCH_SIZE * 2 + 5)])
+    batches = []
+    delete_assets = store.delete_assets
+    def record_batch(asset_ids):
+        batches.append(len(asset_ids))
+        return delete_assets(asset_ids)
+    monkeypatch.setattr(store, 'delete_assets', record_batch)
+    report = sweep(store, [{'id': 'a'}])
+    assert batches == [DELETE_BATCH_SIZE, DELETE_BATCH_SIZE, 5]
+    assert len(report['deleted']) == DELETE_BATCH_SIZE * 2 + 5
+    assert stored_names(store) == []
+
+
+def test_avatar_sweep_dry_run_deletes_nothing(tmp_path):
+    store = avatar_folder(tmp_path, ['orphan', 'other'])
+    report = sweep(store, [{'id': 'a'}], dry_run=True)
+    assert report['orphans'] == ['avatars/orphan', 'avatars/other']
+    assert report['deleted'] == []
+    assert stored_names(store) == ['orphan', 'other']
+
+
+def test_avatar_sweep_skips_avatars_reused_by_uploads(tmp_path, index_path):
+    upload = FakeCloudinary()
+    queue = AvatarUploadQueue(upload, index_path)
+    try:
+        avatar, _ = upload_and_wait(queue, make_image(tmp_path / 'a.png', 'red'))
+    finally:
+        queue.stop()
+    name = avatar['public_id'].split('/', 1)[1]
+    store = avatar_folder(tmp_path, [name, 'orphan'])
+
+    # Restarted: the index hit hands out the old image before any user references it
+    queue = AvatarUploadQueue(upload, index_path)
+    try:
+        assert queue.recently_used() == set()
+        reused, _ = upload_and_wait(queue, make_image(tmp_path / 'b.png', 'red'))
+        assert reused == avatar and len(upload.calls) == 1
+        report = sweep(store, [{'id': 'a'}], recently_used=queue.recently_used)
+    finally:
+        queue.stop()
+    assert report['skipped'] == [avatar['public_id']]
+    assert report['deleted'] == ['avatars/orphan']
+    assert stored_names(store) == [name]
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_fetch_caps_response_size(image_server, streamed):
+    image_server.files['/ok.png'] = b'x' * MAX_IMAGE_BYTES
+    image_server.files['/huge.png'] = b'x' * (MAX_IMAGE_BYTES + 1)
+    if streamed:
+        image_server.streamed.update(image_server.files)
+    response, body = fetch(image_server.url('/ok.png'))
+    assert response.status_code == 200 and len(body) == MAX_IMAGE_BYTES
+    with pytest.raises(ResponseTooLarge):
+        fetch(image_server.url('/huge.png'))
+    with pytest.raises(ResponseTooLarge):
+        fetch(image_server.url('/ok.png'), max_bytes=1024)
+
+
+def test_fetch_times_out(image_server, monkeypatch):
+    monkeypatch.setattr('services.http_client.HTTP_TIMEOUT', (1, 0.2))
+    image_server.files['/slow.png'] = b'avatar'
+    image_server.delay = 1
+    started = time.monotonic()
+    # The session's adapter retries once, after which requests reports the read timeout as a ConnectionError
+    with pytest.raises(requests.exceptions.RequestException, match='Read timed out'):
+        fetch(image_server.url('/slow.png'))
+    assert time.monotonic() - started < 1
+
+
+def write_startup_report(reports_dir, launch, total_ms, phases=(), marks=None):
+    report = {'started_at': f"2026-10-{launch:02}T08:00:00", 'total_ms': total_ms,
+              'phases': [{'name': name, 'wall_ms': wall_ms} for name, wall_ms in phases], 'marks': marks or {}}
+    (reports_dir / f"startup-202610{launch:02}-080000-000000.json").write_text(json.dumps(report))
+
+
+def test_startup_reports_compare_with_median(tmp_path, capsys):
+    for launch, total_ms, firebase_ms in ((1, 900, 100), (2, 1000, 300), (3, 5000, 200)):
+        write_startup_report(tmp_path, launch, total_ms, [('firebase_init', firebase_ms)], {'first_paint': 400})
+    (tmp_path / 'startup-20261004-000000-000000.json').write_text('{"total_ms": 1')  # torn write, skipped
+    write_startup_report(tmp_path, 5, 1200, [('firebase_init', 150), ('firebase_init', 150), ('tray', 50)],
+                         {'first_paint': 400})
+
+    reports = [report for report in map(load_report, list_reports(str(tmp_path))) if report]
+    assert len(reports) == 4
+    rows = {row['label']: row for row in compare_reports(reports[-1], reports[:-1])}
+    assert rows['total']['baseline_ms'] == 1000 and rows['total']['change_pct'] == pytest.approx(20)
+    assert rows['phase firebase_init']['latest_ms'] == 300  # repeated phases are summed
+    assert rows['phase firebase_init']['baseline_ms'] == 200 and rows['phase firebase_init']['change_pct'] == pytest.approx(50)
+    assert rows['mark first_paint']['change_pct'] == 0
+    assert rows['phase tray']['baseline_ms'] is None and rows['phase tray']['change_pct'] is None
+
+    assert print_comparison(str(tmp_path), last=3) == 0
+    flagged = [line.split()[:2] for line in capsys.readouterr().out.splitlines() if line.endswith('SLOWER')]
+    assert flagged == [['phase', 'firebase_init']]  # +20% is not over the threshold
@@ -1,8 +1,17 @@
 """Config utility functions for Game Sentry."""
 import json
+import os
 from typing import Any, Dict, List
 
 CONFIG_FILE = 'config.json'
+APP_DATA_DIR_NAME = 'GameSentry'
+
+def get_app_data_dir() -> str:
+    """Returns the per-user folder for local app data (%LOCALAPPDATA%\\GameSentry on Windows), creating it if needed."""
+    base_dir = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    app_data_dir = os.path.join(base_dir, APP_DATA_DIR_NAME)
+    os.makedirs(app_data_dir, exist_ok=True)
+    return app_data_dir
 
 def load_config() -> Dict[str, Any]:
     """Loads configuration from config.json and returns the config dict."""
@@ -1 +1,183 @@
- 
\ No newline at end of file
+"""
+Image loading and resizing for Game Sentry.
+
+Every avatar, preview and icon goes through ``open_image``: JPEGs are decoded
+at a reduced scale with Pillow's draft mode when only a small version is
+needed, EXIF orientation and colour mode are normalized once, and
+``make_thumbnails`` produces every requested size from a single decode.
+
+Compare with decoding at full resolution on a large photo:
+
+    python -m utils.image_utils
+"""
+import io
+import os
+import sys
+import time
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple, Union
+
+from utils.lazy_import import LazyModule
+
+Image = LazyModule('PIL.Image')
+ImageOps = LazyModule('PIL.ImageOps')
+
+ImageSource = Union[str, bytes, BinaryIO]
+# Formats kept as-is when re-encoding an image; anything else is written as PNG.
+WEB_FORMATS = ('JPEG', 'PNG', 'GIF')
+
+
+def resample_filter():
+    """High-quality downsampling filter (Image.LANCZOS moved to Image.Resampling in Pillow 9.1)."""
+    try:
+        return Image.Resampling.LANCZOS
+    except AttributeError:
+        return Image.LANCZOS  # type: ignore
+
+
+def open_image(source: ImageSource, max_size: Optional[int] = None) -> 'Image.Image':
+    """
+    Opens and decodes an image from a path, bytes or file object.
+
+    With ``max_size``, JPEGs are decoded at the smallest scale (1/2, 1/4 or 1/8)
+    that still covers a ``max_size`` square, so a 4000 px photo wanted at
+    150 px never exists in memory at full size. The result is upright (EXIF
+    orientation applied) and in RGB, RGBA or L mode; the source ``format``
+    (e.g. 'JPEG') is kept on it.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        source_format = img.format
+        if max_size and source_format == 'JPEG':
+            img.draft(None, (max_size, max_size))
+        img.load()
+        img = normalize(img)
+    img.format = source_format
+    return img
+
+
+def normalize(img: 'Image.Image') -> 'Image.Image':
+    """Applies EXIF orientation and converts palette, CMYK and other modes to RGB/RGBA."""
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ('RGB', 'RGBA', 'L'):
+        return img
+    if img.mode in ('LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info):
+        return img.convert('RGBA')
+    return img.convert('RGB')
+
+
+def fit(img: 'Image.Image', size: int) -> 'Image.Image':
+    """A copy of the image scaled down (never up) to fit a ``size`` square, keeping its aspect ratio."""
+    fitted = img.copy()
+    fitted.thumbnail((size, size), resample_filter())
+    return fitted
+
+
+def resize(img: 'Image.Image', size: Tuple[int, int]) -> 'Image.Image':
+    """The image resized to exactly ``size`` (width, height)."""
+    return img.resize(size, resample=resample_filter())
+
+
+def make_thumbnails(source: ImageSource, sizes: Iterable[int]) -> Dict[int, 'Image.Image']:
+    """
+    Decodes an image once and fits it to every size in ``sizes``.
+
+    Sizes are produced largest first, each from the previous one, so the
+    full-resolution image is only ever downsampled once.
+    """
+    sizes = sorted(set(sizes), reverse=True)
+    img = open_image(source, max_size=sizes[0])
+    thumbnails = {}
+    for size in sizes:
+        img = fit(img, size)
+        thumbnails[size] = img
+    return thumbnails
+
+
+def load_thumbnail(source: ImageSource, size: int) -> 'Image.Image':
+    """Opens an image already fitted to a ``size`` square."""
+    return fit(open_image(source, max_size=size), size)
+
+
+def encode(img: 'Image.Image', image_format: Optional[str] = None) -> io.BytesIO:
+    """Encodes an image into a rewound in-memory buffer, as ``image_format`` if it is a web format, else PNG."""
+    image_format = image_format if image_format in WEB_FORMATS else 'PNG'
+    if image_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format)
+    buffer.seek(0)
+    return buffer
+
+
+def _full_decode(path: str, sizes: Tuple[int, ...]) -> Tuple[int, int]:
+    """What the callers used to do: decode at full resolution, then shrink a copy per size."""
+    with Image.open(path) as img:
+        img.load()
+        for size in sizes:
+            img.copy().thumbnail((size, size))
+        return img.size
+
+
+def _draft_pipeline(path: str, sizes: Tuple[int, ...]) -> Tuple[int, int]:
+    with Image.open(path) as img:
+        img.draft(None, (max(sizes), max(sizes)))
+        decoded = img.size
+    make_thumbnails(path, sizes)
+    return decoded
+
+
+def _measure_memory(run, path: str, sizes: Tuple[int, ...]) -> Tuple[int, Optional[int]]:
+    """
+    Runs one decode in this (fresh) process and returns its peak memory in bytes:
+    the tracemalloc peak of Python allocations, and the growth of the peak
+    resident set, which also covers Pillow's pixel buffers (None where the
+    ``resource`` module is unavailable, e.g. on Windows).
+    """
+    import tracemalloc
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    Image.open  # import Pillow before taking the baselines
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+    tracemalloc.start()
+    try:
+        run(path, sizes)
+        _, traced_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if resource is None:
+        return traced_peak, None
+    # ru_maxrss is in KiB, except on macOS where it is in bytes
+    rss_unit = 1 if sys.platform == 'darwin' else 1024
+    return traced_peak, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * rss_unit
+
+
+def _benchmark(path: Optional[str] = None, rounds: int = 5):
+    """Times making the 64/100/150 px avatars from a large JPEG: full-resolution decode vs one draft-mode decode."""
+    import statistics
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), 'large.jpg')
+        Image.effect_noise((4000, 3000), 64).convert('RGB').save(path, quality=90)
+    sizes = (150, 100, 64)
+
+    for label, run in (('full-resolution decode', _full_decode), ('draft-mode pipeline', _draft_pipeline)):
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            decoded = run(path, sizes)
+            timings.append((time.perf_counter() - start) * 1000)
+        # Peak memory is measured in a fresh process, so earlier runs don't hide it under an old high-water mark
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            traced_peak, rss_peak = pool.submit(_measure_memory, run, path, sizes).result()
+        rss_text = 'n/a' if rss_peak is None else f"+{rss_peak / (1024 * 1024):.1f} MB"
+        print(f"{label:22} median {statistics.median(timings):7.1f} ms, decoded at {decoded[0]}x{decoded[1]}, "
+              f"peak memory: Python heap {traced_peak / (1024 * 1024):.1f} MB (tracemalloc), resident set {rss_text}")
+
+
+if __name__ == '__main__':
+    _benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,109 @@
+"""
+Import-time budget check for Game Sentry.
+
+Imports each module in a fresh interpreter under ``python -X importtime`` and
+fails if its cumulative import time goes over budget, or if any of the heavy
+libraries that are meant to load on first use got imported eagerly.
+
+Usage (from the project root):
+
+    python -m utils.import_budget                      # check the default modules
+    python -m utils.import_budget services.local_store --budget-ms 50
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# Cumulative import time allowed per module, in milliseconds.
+IMPORT_BUDGETS_MS = {
+    'models.session': 20,
+    'services.session_journal': 40,
+    'services.firebase_service': 60,
+    'services.local_store': 80,
+    'services.avatar_cache': 40,
+    'services.email_outbox': 40,
+    'game_sentry': 400,
+}
+# Libraries that must only be imported on first use (see utils.lazy_import).
+DEFERRED_MODULES = (
+    'firebase_admin', 'google.cloud.firestore', 'google.api_core', 'grpc', 'cloudinary',
+    'requests', 'smtplib', 'email.mime', 'pystray', 'PIL',
+)
+
+
+def measure_import(module: str) -> Tuple[float, List[str]]:
+    """Imports a module in a fresh interpreter; returns its cumulative import time in ms and every module it loaded."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise ImportError(f"Could not import {module}: {result.stderr.strip().splitlines()[-1:]}")
+    cumulative_us: Optional[int] = None
+    loaded = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|', 2)
+        if not cumulative.strip().isdigit():
+            continue  # the header line
+        loaded.append(name.strip())
+        if name.strip() == module and not name[1:].startswith(' '):
+            cumulative_us = int(cumulative)
+    if cumulative_us is None:
+        # Already imported by the interpreter itself
+        cumulative_us = 0
+    return cumulative_us / 1000, loaded
+
+
+def eager_deferred_modules(loaded: List[str]) -> List[str]:
+    """The deferred libraries (or their submodules) that appear among the loaded modules."""
+    return sorted({name for name in loaded
+                   for deferred in DEFERRED_MODULES if name == deferred or name.startswith(deferred + '.')})
+
+
+def check_modules(budgets: Dict[str, float], runs: int) -> bool:
+    """Measures each module and prints a report; returns True if every module is within budget."""
+    ok = True
+    for module, budget_ms in budgets.items():
+        try:
+            samples = []
+            for _ in range(runs):
+                elapsed_ms, loaded = measure_import(module)
+                samples.append(elapsed_ms)
+        except ImportError as e:
+            print(f"FAIL  {module}: {e}")
+            ok = False
+            continue
+        median_ms = statistics.median(samples)
+        eager = eager_deferred_modules(loaded)
+        passed = median_ms <= budget_ms and not eager
+        ok = ok and passed
+        print(f"{'ok  ' if passed else 'FAIL'}  {module}: {median_ms:.1f} ms (budget {budget_ms:.0f} ms, median of {runs})")
+        if eager:
+            print(f"      imported eagerly: {', '.join(eager)}")
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fail if module import time goes over budget.")
+    parser.add_argument('modules', nargs='*', help="Modules to check (default: all modules with a budget).")
+    parser.add_argument('--budget-ms', type=float, default=None, help="Budget for every checked module, overriding the defaults.")
+    parser.add_argument('--runs', type=int, default=5, help="Imports per module; the median is compared with the budget.")
+    args = parser.parse_args(argv)
+
+    modules = args.modules or list(IMPORT_BUDGETS_MS)
+    budgets = {}
+    for module in modules:
+        budget_ms = args.budget_ms if args.budget_ms is not None else IMPORT_BUDGETS_MS.get(module)
+        if budget_ms is None:
+            parser.error(f"No budget for {module}; pass --budget-ms")
+        budgets[module] = budget_ms
+    return 0 if check_modules(budgets, max(1, args.runs)) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
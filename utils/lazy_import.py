@@ -0,0 +1,46 @@
+"""Deferred imports for Game Sentry's heavy dependencies."""
+import importlib
+import logging
+import threading
+from types import ModuleType
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """
+    Stands in for a module and imports it on first attribute access.
+
+    ``firestore = LazyModule('firebase_admin.firestore')`` costs nothing at import
+    time; the real import happens the first time ``firestore.<name>`` is used.
+    Python's import lock makes the first access safe from any thread.
+    """
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+def preload(module_names: Iterable[str]) -> threading.Thread:
+    """Imports the given modules on a daemon thread so their first real use doesn't wait for them."""
+    def run():
+        for name in module_names:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                logger.warning(f"Could not preload {name}: {e}")
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
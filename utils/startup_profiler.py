@@ -0,0 +1,179 @@
+"""
+Startup phase profiler for Game Sentry.
+
+``StartupProfiler`` records the wall and CPU time of each named launch phase
+and the time to milestones such as the first paint, then writes one JSON
+report per launch to ``%LOCALAPPDATA%\\GameSentry\\startup_reports``.
+
+Compare the latest launch with the ones before it:
+
+    python -m utils.startup_profiler              # against the previous 10 launches
+    python -m utils.startup_profiler --last 30
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.config import get_app_data_dir
+
+logger = logging.getLogger(__name__)
+
+STARTUP_REPORTS_DIR = 'startup_reports'
+# Oldest reports are deleted once there are more than this many.
+MAX_STARTUP_REPORTS = 100
+# Phases this much slower than the previous launches' median are flagged.
+REGRESSION_THRESHOLD_PCT = 20.0
+
+
+def get_reports_dir() -> str:
+    reports_dir = os.path.join(get_app_data_dir(), STARTUP_REPORTS_DIR)
+    os.makedirs(reports_dir, exist_ok=True)
+    return reports_dir
+
+
+class StartupProfiler:
+    """
+    Collects launch timings; safe to use from several threads.
+
+    ``with profiler.phase('firebase_init'): ...`` times a phase (CPU time is that
+    of the thread running it), ``profiler.mark('first_paint')`` notes a milestone
+    relative to the launch, and ``profiler.finish()`` writes the report once.
+    """
+    def __init__(self):
+        self.started_at = datetime.now()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._lock = threading.Lock()
+        self._phases: List[Dict[str, Any]] = []
+        self._marks: Dict[str, float] = {}
+        self._finished = False
+
+    def elapsed_ms(self) -> float:
+        """Wall time since the launch started, in milliseconds."""
+        return (time.perf_counter() - self._start_wall) * 1000
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            phase = {
+                'name': name,
+                'thread': threading.current_thread().name,
+                'start_ms': round((start_wall - self._start_wall) * 1000, 2),
+                'wall_ms': round((time.perf_counter() - start_wall) * 1000, 2),
+                'cpu_ms': round((time.thread_time() - start_cpu) * 1000, 2),
+            }
+            with self._lock:
+                self._phases.append(phase)
+
+    def mark(self, name: str) -> float:
+        """Records a milestone (the first one of each name wins) and returns its time since launch in ms."""
+        elapsed = round(self.elapsed_ms(), 2)
+        with self._lock:
+            return self._marks.setdefault(name, elapsed)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'total_ms': round(self.elapsed_ms(), 2),
+                'process_cpu_ms': round((time.process_time() - self._start_cpu) * 1000, 2),
+                'phases': sorted(self._phases, key=lambda phase: phase['start_ms']),
+                'marks': dict(self._marks),
+            }
+
+    def finish(self, reports_dir: Optional[str] = None) -> Optional[str]:
+        """Writes this launch's report (only the first call does) and prunes old ones; returns the report path."""
+        with self._lock:
+            if self._finished:
+                return None
+            self._finished = True
+        try:
+            reports_dir = reports_dir or get_reports_dir()
+            path = os.path.join(reports_dir, f"startup-{self.started_at.strftime('%Y%m%d-%H%M%S-%f')}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.report(), f, indent=2)
+            for old_path in list_reports(reports_dir)[:-MAX_STARTUP_REPORTS]:
+                os.remove(old_path)
+            return path
+        except OSError as e:
+            logger.warning(f"Could not write startup report: {e}")
+            return None
+
+
+def list_reports(reports_dir: str) -> List[str]:
+    """Report paths, oldest first."""
+    return sorted(glob.glob(os.path.join(reports_dir, 'startup-*.json')))
+
+
+def load_report(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Skipping unreadable startup report {path}: {e}")
+        return None
+
+
+def report_timings(report: Dict[str, Any]) -> Dict[str, float]:
+    """Flattens a report to {label: ms}; phases that ran more than once are summed."""
+    timings: Dict[str, float] = {}
+    for phase in report.get('phases', []):
+        timings[f"phase {phase['name']}"] = timings.get(f"phase {phase['name']}", 0.0) + phase['wall_ms']
+    for name, elapsed in report.get('marks', {}).items():
+        timings[f"mark {name}"] = elapsed
+    timings['total'] = report.get('total_ms', 0.0)
+    return timings
+
+
+def compare_reports(latest: Dict[str, Any], previous: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One row per timing: the latest value, the previous launches' median and the change."""
+    previous_timings = [report_timings(report) for report in previous]
+    rows = []
+    for label, value in report_timings(latest).items():
+        history = [timings[label] for timings in previous_timings if label in timings]
+        baseline = statistics.median(history) if history else None
+        change_pct = (value - baseline) / baseline * 100 if baseline else None
+        rows.append({'label': label, 'latest_ms': value, 'baseline_ms': baseline, 'change_pct': change_pct})
+    return rows
+
+
+def print_comparison(reports_dir: str, last: int) -> int:
+    reports = [report for report in (load_report(path) for path in list_reports(reports_dir)) if report]
+    if not reports:
+        print(f"No startup reports in {reports_dir}")
+        return 1
+    latest, previous = reports[-1], reports[-1 - last:-1]
+    print(f"Launch of {latest['started_at']} compared with the median of the previous {len(previous)} launch(es)")
+    print(f"{'':32} {'latest':>10} {'median':>10} {'change':>9}")
+    for row in compare_reports(latest, previous):
+        baseline = f"{row['baseline_ms']:.1f}" if row['baseline_ms'] is not None else '-'
+        change = f"{row['change_pct']:+.0f}%" if row['change_pct'] is not None else '-'
+        flag = '  SLOWER' if row['change_pct'] is not None and row['change_pct'] > REGRESSION_THRESHOLD_PCT else ''
+        print(f"{row['label']:32} {row['latest_ms']:>10.1f} {baseline:>10} {change:>9}{flag}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the latest launch's startup timings with earlier launches.")
+    parser.add_argument('--last', type=int, default=10, help="Number of earlier launches to compare against.")
+    parser.add_argument('--dir', default=None, help="Reports folder (default: the app data folder).")
+    args = parser.parse_args(argv)
+    return print_comparison(args.dir or get_reports_dir(), max(1, args.last))
+
+
+if __name__ == '__main__':
+    sys.exit(main())